@@ -0,0 +1,94 @@
+"""
+材料汇总模块 - 多文件材料清单的哈希聚合
+"""
+import logging
+from typing import Dict, List, Any, Callable, Iterable, Iterator, Optional, Tuple
+from utils import CalculationUtils
+
+logger = logging.getLogger(__name__)
+
+
+class MaterialAggregator:
+    """按物品名聚合多个材料清单，每个文件只读取一次"""
+
+    def __init__(self, calculate: Optional[Callable[[str, int], Tuple[int, int, int]]] = None):
+        """
+        Args:
+            calculate: 可选，(名称, 数量) 换算为 (盒, 组, 个) 的函数，默认按统一堆叠数计算
+        """
+        self.calculate = calculate or (lambda name, quantity: CalculationUtils.calculate_boxes_and_groups(quantity))
+        # 物品名 -> {'quantity': 总数, 'files': 出现文件数, 'status': {状态: 数量}}
+        self.items: Dict[str, Dict[str, Any]] = {}
+        self.files = 0
+        self.rows = 0
+
+    def add_rows(self, rows: Iterable[List[Any]]) -> int:
+        """
+        将一个文件的数据行并入汇总表
+
+        Args:
+            rows: [名称, 数量, 盒, 组, 个, 状态] 格式的数据行
+
+        Returns:
+            本次并入的行数
+
+        读取中途出错时异常向上抛出，该文件已读取的行不会并入汇总表
+        """
+        # 先汇总到本文件的局部表，整个文件读完后再合并
+        local: Dict[str, Dict[str, Any]] = {}
+        count = 0
+        for row in rows:
+            try:
+                name = str(row[0]).strip()
+                quantity = int(row[1])
+            except (IndexError, ValueError, TypeError):
+                continue
+            if not name:
+                continue
+            status = row[5] if len(row) > 5 and row[5] else "未完成"
+
+            entry = local.get(name)
+            if entry is None:
+                entry = local[name] = {'quantity': 0, 'status': {}}
+            entry['quantity'] += quantity
+            entry['status'][status] = entry['status'].get(status, 0) + quantity
+            count += 1
+
+        for name, partial in local.items():
+            entry = self.items.get(name)
+            if entry is None:
+                entry = self.items[name] = {'quantity': 0, 'files': 0, 'status': {}}
+            entry['quantity'] += partial['quantity']
+            entry['files'] += 1
+            for status, quantity in partial['status'].items():
+                entry['status'][status] = entry['status'].get(status, 0) + quantity
+
+        self.files += 1
+        self.rows += count
+        return count
+
+    def _breakdown(self, name: str, quantity: int) -> Dict[str, int]:
+        """换算为盒、组、个"""
+        boxes, groups, pieces = self.calculate(name, quantity)
+        return {'quantity': quantity, 'boxes': boxes, 'groups': groups, 'pieces': pieces}
+
+    def iter_results(self) -> Iterator[Dict[str, Any]]:
+        """按总数量降序逐项输出汇总结果"""
+        for name, entry in sorted(self.items.items(), key=lambda kv: (-kv[1]['quantity'], kv[0])):
+            result = {'name': name, 'files': entry['files']}
+            result.update(self._breakdown(name, entry['quantity']))
+            result['status'] = {
+                status: self._breakdown(name, quantity)
+                for status, quantity in entry['status'].items()
+            }
+            yield result
+
+    def summary(self) -> Dict[str, Any]:
+        """汇总统计"""
+        summary = {'files': self.files, 'rows': self.rows, 'items': len(self.items),
+                   'quantity': 0, 'boxes': 0, 'groups': 0, 'pieces': 0}
+        # 各物品堆叠数不同，合计逐项累加各物品的盒/组/个，不能由总数量换算
+        for name, entry in self.items.items():
+            for field, value in self._breakdown(name, entry['quantity']).items():
+                summary[field] += value
+        return summary
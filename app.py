@@ -6,18 +6,39 @@ import os
 import json
 import logging
 import csv
+import re
+import gc
+import hmac
+import time
 from datetime import datetime
 from functools import wraps
-from flask import Flask, render_template, request, jsonify, session, send_from_directory
+from urllib.parse import quote
+from flask import Flask, Response, render_template, request, jsonify, session, send_from_directory, stream_with_context
 from flask_socketio import SocketIO, emit
 from flask_socketio import SocketIO, emit, join_room
+from room_sync import RoomSync
+from payload_cache import PayloadCache
+from aggregation import MaterialAggregator
+from search_index import ItemSearchIndex
+from chunked_upload import ChunkedUploadManager, ChunkedUploadError
+from blob_store import BlobStore
+from exporter import RowExporter
+from litematic import LitematicImporter
+from stack_sizes import StackSizeRegistry
+from backpressure import OutboundManager
+from logging_setup import configure_logging, log_stats
+from version_history import VersionHistory
+from room_store import RoomManager
+from doc_storage import DocumentStorage, open_document
+from parse_jobs import ParseJobManager, ParseJobError
+from event_trace import TraceRecorder
+from progress_summary import SummaryCatalog
+from progress_rollup import ProgressRollup
+from memory_debug import MemoryInspector
+from page_delivery import PagedDelivery
+from bulk_update import compile_predicate, match_rows, encode_selection
+from inventory import InventoryStore, InventoryReconciler, parse_snapshot_csv, validate_chests
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[logging.StreamHandler()]
-)
 logger = logging.getLogger(__name__)
 
 # 获取当前文件所在目录
@@ -31,9 +52,59 @@ class Config:
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', os.path.join(BASE_DIR, 'uploads'))
     USERS_FOLDER = os.environ.get('USERS_FOLDER', os.path.join(BASE_DIR, 'users'))
     MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))
-    ALLOWED_EXTENSIONS = {'csv', 'sti'}
+    ALLOWED_EXTENSIONS = {'csv', 'sti', 'litematic'}
     ITEMS_PER_GROUP = 64
     GROUPS_PER_BOX = 27
+    CHUNK_UPLOAD_CHUNK_SIZE = int(os.environ.get('CHUNK_UPLOAD_CHUNK_SIZE', 4 * 1024 * 1024))
+    CHUNK_UPLOAD_MAX_SIZE = int(os.environ.get('CHUNK_UPLOAD_MAX_SIZE', 1024 * 1024 * 1024))
+    CHUNK_UPLOAD_TTL = int(os.environ.get('CHUNK_UPLOAD_TTL', 24 * 3600))
+    PARSE_CACHE_SIZE = int(os.environ.get('PARSE_CACHE_SIZE', 64))
+    LITEMATIC_WORKERS = int(os.environ.get('LITEMATIC_WORKERS', os.cpu_count() or 1))
+    OUTBOUND_HIGH_WATER = int(os.environ.get('OUTBOUND_HIGH_WATER', 64))
+    OUTBOUND_LOW_WATER = int(os.environ.get('OUTBOUND_LOW_WATER', 8))
+    SLOW_CLIENT_TIMEOUT = float(os.environ.get('SLOW_CLIENT_TIMEOUT', 60))
+    OUTBOUND_FLUSH_INTERVAL = float(os.environ.get('OUTBOUND_FLUSH_INTERVAL', 0.5))
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
+    LOG_QUEUE = os.environ.get('LOG_QUEUE', 'true').lower() == 'true'
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+    # 每种事件每秒最多输出的日志条数，未列出的事件不采样
+    LOG_SAMPLE_LIMITS = os.environ.get('LOG_SAMPLE_LIMITS', 'item_updated:5,sync_file_data:5,socketio:10,engineio:10')
+    # eventlet（默认，gunicorn eventlet 工作进程或 python app.py）；asgi.py 以 threading 模式加载应用
+    SOCKETIO_ASYNC_MODE = os.environ.get('SOCKETIO_ASYNC_MODE', 'eventlet')
+    SOCKETIO_LOGGER = os.environ.get('SOCKETIO_LOGGER', 'false').lower() == 'true'
+    ENGINEIO_LOGGER = os.environ.get('ENGINEIO_LOGGER', 'false').lower() == 'true'
+    HISTORY_KEYFRAME_INTERVAL = int(os.environ.get('HISTORY_KEYFRAME_INTERVAL', 20))
+    ROOM_MEMORY_BUDGET = int(os.environ.get('ROOM_MEMORY_BUDGET', 256 * 1024 * 1024))
+    ROOM_IDLE_TTL = float(os.environ.get('ROOM_IDLE_TTL', 30 * 60))
+    ROOM_SWEEP_INTERVAL = float(os.environ.get('ROOM_SWEEP_INTERVAL', 60))
+    # .sti 存储格式：none（缩进 JSON）、gzip 或 lzma
+    STORAGE_COMPRESSION = os.environ.get('STORAGE_COMPRESSION', 'none')
+    PARSE_WORKERS = int(os.environ.get('PARSE_WORKERS', 2))
+    PARSE_MAX_JOBS = int(os.environ.get('PARSE_MAX_JOBS', 8))
+    PARSE_JOB_TTL = int(os.environ.get('PARSE_JOB_TTL', 3600))
+    TRACE_ENABLED = os.environ.get('TRACE_ENABLED', 'false').lower() == 'true'
+    TRACE_FOLDER = os.environ.get('TRACE_FOLDER', os.path.join(BASE_DIR, 'traces'))
+    TRACE_ANONYMIZE = os.environ.get('TRACE_ANONYMIZE', 'true').lower() == 'true'
+    TRACE_FLUSH_SECONDS = float(os.environ.get('TRACE_FLUSH_SECONDS', 5))
+    # gunicorn 主进程启动时预解析的最近使用文档数
+    PRELOAD_DOCUMENTS = int(os.environ.get('PRELOAD_DOCUMENTS', 16))
+    PROGRESS_ROLLUP_INTERVAL = float(os.environ.get('PROGRESS_ROLLUP_INTERVAL', 30))
+    PROGRESS_EVENT_RETENTION_DAYS = int(os.environ.get('PROGRESS_EVENT_RETENTION_DAYS', 30))
+    FILE_PAGE_ROWS = int(os.environ.get('FILE_PAGE_ROWS', 500))
+    FILE_FIRST_PAGE_ROWS = int(os.environ.get('FILE_FIRST_PAGE_ROWS', 100))
+    FILE_PAGE_WINDOW = int(os.environ.get('FILE_PAGE_WINDOW', 2))
+    # 管理接口令牌（请求头 X-Admin-Token），未设置时管理接口不可用
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+    MEMORY_SAMPLE_LIMIT = int(os.environ.get('MEMORY_SAMPLE_LIMIT', 2000))
+    MEMORY_TRACE_FRAMES = int(os.environ.get('MEMORY_TRACE_FRAMES', 0))
+    # 缓存的库存核对结果数（每个 快照 + 清单组合一份）
+    INVENTORY_RECONCILE_CACHE = int(os.environ.get('INVENTORY_RECONCILE_CACHE', 32))
+    STORAGE_COMPRESSION_LEVEL = int(os.environ['STORAGE_COMPRESSION_LEVEL']) if os.environ.get('STORAGE_COMPRESSION_LEVEL') else None
+
+# 配置日志
+configure_logging(Config.LOG_LEVEL, Config.LOG_FORMAT, Config.LOG_QUEUE,
+                  Config.LOG_SAMPLE_LIMITS, Config.LOG_QUEUE_SIZE)
 
 app.config.from_object(Config)
 
@@ -44,9 +115,9 @@ app.template_folder = os.path.join(BASE_DIR, 'templates')
 # 关键修复：正确初始化 Socket.IO
 socketio = SocketIO(app, 
                    cors_allowed_origins="*",
-                   async_mode='eventlet',
-                   logger=True,
-                   engineio_logger=True,
+                   async_mode=Config.SOCKETIO_ASYNC_MODE,
+                   logger=logging.getLogger('socketio') if Config.SOCKETIO_LOGGER else False,
+                   engineio_logger=logging.getLogger('engineio') if Config.ENGINEIO_LOGGER else False,
                    ping_timeout=60,
                    ping_interval=25)
 logger.info(f"应用初始化完成")
@@ -54,8 +125,138 @@ logger.info(f"静态文件目录: {app.static_folder}")
 logger.info(f"模板目录: {app.template_folder}")
 
 # 存储活跃状态
-active_files = {}
+active_files = RoomManager(
+    os.path.join(Config.UPLOAD_FOLDER, '.rooms'),
+    Config.ROOM_MEMORY_BUDGET,
+    Config.ROOM_IDLE_TTL,
+    Config.ROOM_SWEEP_INTERVAL
+)
 user_sessions = {}
+payload_cache = PayloadCache()
+search_index = ItemSearchIndex()
+chunked_uploads = ChunkedUploadManager(
+    os.path.join(Config.UPLOAD_FOLDER, '.partial'),
+    Config.CHUNK_UPLOAD_MAX_SIZE,
+    Config.CHUNK_UPLOAD_TTL
+)
+blob_store = BlobStore(os.path.join(Config.UPLOAD_FOLDER, '.blobs'), Config.PARSE_CACHE_SIZE)
+document_storage = DocumentStorage(Config.STORAGE_COMPRESSION, Config.STORAGE_COMPRESSION_LEVEL)
+litematic_importer = LitematicImporter(workers=Config.LITEMATIC_WORKERS)
+stack_registry = StackSizeRegistry(
+    os.path.join(Config.USERS_FOLDER, 'stack_sizes.json'),
+    Config.ITEMS_PER_GROUP,
+    Config.GROUPS_PER_BOX
+)
+version_history = VersionHistory(os.path.join(Config.UPLOAD_FOLDER, '.history'), Config.HISTORY_KEYFRAME_INTERVAL)
+parse_jobs = ParseJobManager(
+    os.path.join(Config.UPLOAD_FOLDER, '.jobs'),
+    Config.PARSE_WORKERS,
+    Config.PARSE_MAX_JOBS,
+    Config.PARSE_JOB_TTL
+)
+progress_summaries = SummaryCatalog(os.path.join(Config.UPLOAD_FOLDER, '.summaries', 'catalog.json'))
+progress_rollup = ProgressRollup(
+    os.path.join(Config.UPLOAD_FOLDER, '.progress'),
+    Config.PROGRESS_ROLLUP_INTERVAL,
+    Config.PROGRESS_EVENT_RETENTION_DAYS
+)
+page_delivery = PagedDelivery(socketio, Config.FILE_PAGE_ROWS, Config.FILE_FIRST_PAGE_ROWS, Config.FILE_PAGE_WINDOW)
+memory_inspector = MemoryInspector(Config.MEMORY_SAMPLE_LIMIT, Config.MEMORY_TRACE_FRAMES)
+inventory_store = InventoryStore(os.path.join(Config.UPLOAD_FOLDER, '.inventory'))
+inventory_reconciler = InventoryReconciler(stack_registry.calculate, Config.INVENTORY_RECONCILE_CACHE)
+trace_recorder = TraceRecorder(Config.TRACE_FOLDER, Config.TRACE_ENABLED, Config.TRACE_ANONYMIZE,
+                               Config.TRACE_FLUSH_SECONDS)
+outbound = OutboundManager(
+    socketio,
+    Config.OUTBOUND_HIGH_WATER,
+    Config.OUTBOUND_LOW_WATER,
+    Config.SLOW_CLIENT_TIMEOUT,
+    Config.OUTBOUND_FLUSH_INTERVAL
+)
+
+def room_members(filename):
+    """房间内所有连接的 sid"""
+    room = active_files.get(filename)
+    return [u['sid'] for u in room['users']] if room else []
+
+def send_document(sid, filename, room):
+    """向连接发送房间的完整文档（支持分页的客户端按页发送）"""
+    session_info = user_sessions.get(sid, {})
+    if session_info.get('paged') and page_delivery.should_page(room['data']):
+        page_delivery.start(sid, filename, room['data'], room['version'],
+                            lambda: active_files[filename]['data'] if filename in active_files else None)
+        return
+    page_delivery.cancel(sid)
+    socketio.emit('file_data', {
+        'filename': filename,
+        'version': room['version'],
+        'payload': payload_cache.get(filename, room['version'], room['data'])
+    }, to=sid)
+
+def apply_status(rows, indexes, status):
+    """将选中行改为指定状态，返回进度事件用的 [(行索引, 原状态, 新状态), ...]"""
+    changes = []
+    for index in indexes:
+        row = rows[index]
+        changes.append((index, row[5], status))
+        row[5] = status
+    return changes
+
+def bulk_update_room(filename, predicate, status, username):
+    """在房间文档上按条件批量更新状态，并以紧凑编码广播选中的行"""
+    room = active_files[filename]
+    indexes = match_rows(room['data'], predicate, status)
+    if not indexes:
+        return {'count': 0, 'version': room['version']}
+    
+    changes = apply_status(room['data'], indexes, status)
+    for index in indexes:
+        room['row_hashes'][index] = RoomSync.row_hash(room['data'][index])
+    room['version'] += 1
+    progress_rollup.record_many(FileUtils.secure_filename(filename), changes)
+    
+    # 积压的连接改为重新同步，选中的行数与文档规模无关地只占一条消息
+    outbound.broadcast('bulk_updated', {
+        'filename': filename,
+        'status': status,
+        'username': username,
+        'version': room['version'],
+        'count': len(indexes),
+        'total': len(room['data']),
+        **encode_selection(indexes, len(room['data']))
+    }, room_members(filename), kind='document')
+    logger.info("批量更新: 文件 %s 共 %d 行状态更新为 %s, 由用户 %s 修改", filename, len(indexes), status, username,
+                extra={'event': 'bulk_update'})
+    return {'count': len(indexes), 'version': room['version']}
+
+def get_active_file(filename):
+    """获取活跃文件状态，不存在时初始化"""
+    if filename not in active_files:
+        active_files[filename] = {
+            'data': [],
+            'users': [],
+            'row_hashes': [],
+            'version': 0
+        }
+    return active_files[filename]
+
+def persist_room(filename, room):
+    """房间转存前写回未保存的修改（存储中没有该文档时不创建），返回存储是否已与房间一致"""
+    stored_name = FileUtils.secure_filename(filename)
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], stored_name)
+    if not os.path.exists(filepath):
+        return False
+    
+    # 房间内容与存储一致时（刚加入未编辑、修改已自动保存）不重写文件，也不产生新的历史版本
+    stored_hashes = RoomSync.compute_row_hashes(load_document(stored_name, filepath))
+    if stored_hashes == RoomSync.compute_row_hashes(room['data']):
+        return True
+    
+    FileUtils.write_file_data(filepath, room['data'])
+    blob_store.release(stored_name)
+    document_saved(stored_name, filepath, room['data'], None)
+    logger.info("房间 %s 转存前已写回文档（版本 %d）", filename, room['version'], extra={'event': 'room_spill'})
+    return True
 
 def require_auth(f):
     """认证装饰器"""
@@ -66,29 +267,39 @@ def require_auth(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def require_admin(f):
+    """管理员认证装饰器（校验环境变量 ADMIN_TOKEN，用户名可以自行注册，不能作为管理员凭据）"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not Config.ADMIN_TOKEN:
+            return jsonify({'error': '未配置管理员令牌'}), 403
+        token = request.headers.get('X-Admin-Token', '')
+        if not hmac.compare_digest(token.encode('utf-8'), Config.ADMIN_TOKEN.encode('utf-8')):
+            return jsonify({'error': '需要管理员权限'}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+# JSON 流式解析时跳过的空白字符
+JSON_WHITESPACE = re.compile(r'\s*')
+
 # 工具函数
 class FileUtils:
     @staticmethod
     def ensure_directories():
         """确保必要的目录存在"""
-    for folder in [app.config['UPLOAD_FOLDER'], app.config['USERS_FOLDER']]:
-        try:
-            os.makedirs(folder, exist_ok=True)
-            logger.info(f"检查/创建目录: {folder}")
-            
-            # 测试写入权限
-            test_file = os.path.join(folder, 'test_write_permission.tmp')
+        for folder in [app.config['UPLOAD_FOLDER'], app.config['USERS_FOLDER']]:
             try:
-                with open(test_file, 'w') as f:
-                    f.write('test')
-                os.remove(test_file)
-                logger.info(f"目录 {folder} 写入权限正常")
-            except Exception as e:
-                logger.error(f"目录 {folder} 没有写入权限: {e}")
-                raise
+                os.makedirs(folder, exist_ok=True)
+                logger.info(f"检查/创建目录: {folder}")
                 
-        except Exception as e:
-            logger.error(f"无法创建或访问目录 {folder}: {e}")
+                # 检查写入权限（不写测试文件，避免每次启动都在共享存储上产生写入）
+                if os.access(folder, os.W_OK):
+                    logger.info(f"目录 {folder} 写入权限正常")
+                else:
+                    logger.error(f"目录 {folder} 没有写入权限")
+                    
+            except Exception as e:
+                logger.error(f"无法创建或访问目录 {folder}: {e}")
 
     @staticmethod
     def allowed_file(filename):
@@ -118,6 +329,90 @@ class FileUtils:
         except (ValueError, TypeError):
             return 0, 0, 0
 
+    @staticmethod
+    def iter_json_array(f, block_size=64 * 1024):
+        """流式解析JSON数组，逐个返回元素"""
+        decoder = json.JSONDecoder()
+        buffer, pos = '', 0
+        started = eof = False
+        while True:
+            pos = JSON_WHITESPACE.match(buffer, pos).end()
+            if pos < len(buffer):
+                char = buffer[pos]
+                if not started:
+                    if char != '[':
+                        raise ValueError('JSON根元素应该是数组')
+                    started = True
+                    pos += 1
+                    continue
+                if char == ']':
+                    return
+                if char == ',':
+                    pos += 1
+                    continue
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                else:
+                    # 元素恰好在缓冲区末尾结束时可能被截断，读入更多数据再确认
+                    if end < len(buffer) or eof:
+                        yield item
+                        pos = end
+                        continue
+            if eof:
+                raise ValueError('JSON数组不完整')
+            chunk = f.read(block_size)
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+
+    @staticmethod
+    def iter_file_rows(filepath):
+        """逐行读取文件数据（CSV和STI/JSON格式均流式解析）"""
+        # 按物品堆叠数计算盒/组/个，文件级覆盖值优先
+        overrides = stack_registry.load_overrides(filepath)
+        calculate = lambda name, quantity: stack_registry.calculate(name, quantity, overrides)
+        
+        if filepath.endswith('.litematic'):
+            # Litematica 原理图：统计方块数量后生成材料清单
+            yield from litematic_importer.iter_rows(filepath, calculate)
+            return
+        
+        # 压缩存储的文件按魔数识别并透明解压
+        with open_document(filepath) as f:
+            if filepath.endswith('.sti'):
+                yield from FileUtils.iter_json_array(f)
+                return
+            
+            # 检查文件内容是否为JSON格式
+            if f.read(64).lstrip().startswith('['):
+                f.seek(0)
+                yield from FileUtils.iter_json_array(f)
+                return
+            
+            # 否则按标准CSV格式解析
+            f.seek(0)  # 重置文件指针
+            reader = csv.reader(f)
+            header = next(reader, None)
+            for row in reader:
+                if len(row) >= 2:
+                    item_name = row[0].strip()
+                    quantity_str = row[1].strip()
+                    if item_name and quantity_str:
+                        boxes, groups, pieces = calculate(item_name, quantity_str)
+                        yield [item_name, quantity_str, boxes, groups, pieces, "未完成"]
+
+    @staticmethod
+    def load_file_data(filepath):
+        """读取并解析完整的文件数据"""
+        return list(FileUtils.iter_file_rows(filepath))
+
+    @staticmethod
+    def write_file_data(filepath, data):
+        """写入文件数据（先写临时文件再替换，不会写穿共享内容的硬链接）"""
+        document_storage.write(filepath, data)
+
 # 确保目录存在
 FileUtils.ensure_directories()
 
@@ -220,6 +515,21 @@ def check_auth():
         return jsonify({'logged_in': True, 'username': session.get('username')})
     return jsonify({'logged_in': False})
 
+def file_list_entry(filename, filepath, owner, summaries):
+    """文件列表中的一项，附带进度摘要（文件在摘要之外被改写时为 None）"""
+    stat = os.stat(filepath)
+    summary = summaries.get(filename)
+    if summary and summary.get('mtime_ns') != stat.st_mtime_ns:
+        summary = None
+    return {
+        'filename': filename,
+        'owner': owner,
+        'description': '',
+        'created_at': datetime.fromtimestamp(stat.st_ctime).isoformat(),
+        'size': stat.st_size,
+        'summary': summary
+    }
+
 @app.route('/file_list')
 @require_auth
 def get_file_list():
@@ -228,16 +538,11 @@ def get_file_list():
         files = []
         upload_folder = app.config['UPLOAD_FOLDER']
         if os.path.exists(upload_folder):
+            summaries = progress_summaries.all()
             for filename in os.listdir(upload_folder):
-                if filename.endswith(('.csv', '.sti')):
+                if FileUtils.allowed_file(filename):
                     filepath = os.path.join(upload_folder, filename)
-                    files.append({
-                        'filename': filename,
-                        'owner': session.get('username'),
-                        'description': '',
-                        'created_at': datetime.fromtimestamp(os.path.getctime(filepath)).isoformat(),
-                        'size': os.path.getsize(filepath)
-                    })
+                    files.append(file_list_entry(filename, filepath, session.get('username'), summaries))
         
         return jsonify({'files': files})
     except Exception as e:
@@ -252,22 +557,118 @@ def get_all_files():
         files = []
         upload_folder = app.config['UPLOAD_FOLDER']
         if os.path.exists(upload_folder):
+            summaries = progress_summaries.all()
             for filename in os.listdir(upload_folder):
-                if filename.endswith(('.csv', '.sti')):
+                if FileUtils.allowed_file(filename):
                     filepath = os.path.join(upload_folder, filename)
-                    files.append({
-                        'filename': filename,
-                        'owner': 'system',
-                        'description': '',
-                        'created_at': datetime.fromtimestamp(os.path.getctime(filepath)).isoformat(),
-                        'size': os.path.getsize(filepath)
-                    })
+                    files.append(file_list_entry(filename, filepath, 'system', summaries))
         
         return jsonify({'files': files})
     except Exception as e:
         logger.error(f"获取所有文件列表失败: {e}")
         return jsonify({'error': '获取文件列表时发生错误'}), 500
 
+def document_cache_key(filename, filepath):
+    """
+    解析缓存的键：上传的文件用内容哈希，保存后改写过的文件用修改时间和大小；
+    盒/组/个按堆叠数计算，键中包含全局配置版本和文件级覆盖值
+    """
+    stacks = stack_registry.overrides_key(filepath)
+    content_hash = blob_store.content_hash(filename, filepath)
+    if content_hash:
+        return f'{content_hash}:{stacks}'
+    stat = os.stat(filepath)
+    return f'stat:{filename}:{stat.st_mtime_ns}:{stat.st_size}:{stacks}'
+
+def load_document(filename, filepath):
+    """读取文件数据，内容未变的文件复用缓存的解析结果"""
+    cache_key = document_cache_key(filename, filepath)
+    data = blob_store.get_parsed(cache_key)
+    if data is None:
+        data = FileUtils.load_file_data(filepath)
+        blob_store.put_parsed(cache_key, data)
+    return data
+
+def discard_upload(filename, filepath):
+    """删除解析失败的上传文件"""
+    try:
+        os.remove(filepath)
+        blob_store.release(filename)
+    except:
+        pass
+
+def document_saved(filename, filepath, data, owner):
+    """文档写入磁盘后更新搜索索引、进度摘要和版本历史，返回版本号"""
+    search_index.update_file(filename, data)
+    progress_summaries.update(filename, filepath, data)
+    return version_history.record(filename, data, owner)
+
+def process_uploaded_file(filename, filepath, description=''):
+    """解析已写入磁盘的上传文件并返回上传结果"""
+    # 解析文件逻辑（相同内容重复上传时直接复用解析结果）
+    try:
+        data = load_document(filename, filepath)
+    except Exception as e:
+        # 删除无效文件
+        discard_upload(filename, filepath)
+        return jsonify({'error': f'文件 {filename} 解析失败: {str(e)}'}), 400
+    
+    version = document_saved(filename, filepath, data, session.get('username'))
+    
+    return jsonify({
+        'success': True,
+        'version': version,
+        'filename': filename,
+        'data': data,
+        'file_info': {
+            'filename': filename,
+            'owner': session.get('username'),
+            'description': description,
+            'created_at': datetime.now().isoformat(),
+            'size': os.path.getsize(filepath)
+        }
+    })
+
+def finish_parse_job(job, data):
+    """后台解析完成：写入解析缓存并登记文档"""
+    filename = job['filename']
+    blob_store.put_parsed(document_cache_key(filename, job['_filepath']), data)
+    return {'version': document_saved(filename, job['_filepath'], data, job['owner'])}
+
+def fail_parse_job(job):
+    """后台解析失败：删除无效文件"""
+    discard_upload(job['filename'], job['_filepath'])
+
+def submit_parse_job(filename, filepath, description='', sid=None):
+    """提交后台解析任务并立即返回任务 ID（相同内容已解析过时直接返回结果）"""
+    if blob_store.get_parsed(document_cache_key(filename, filepath)) is not None:
+        return process_uploaded_file(filename, filepath, description)
+    
+    parse_jobs.start(socketio, finish_parse_job, fail_parse_job)
+    try:
+        job = parse_jobs.submit(filename, filepath, session.get('username'), sid,
+                                FileUtils.iter_file_rows, description)
+    except ParseJobError as e:
+        discard_upload(filename, filepath)
+        return jsonify({'error': str(e)}), e.status
+    
+    return jsonify({
+        'success': True,
+        'filename': filename,
+        'job_id': job['job_id'],
+        'job': job,
+        'status_url': f"/jobs/{job['job_id']}"
+    }), 202
+
+@app.route('/jobs/<job_id>')
+@require_auth
+def get_parse_job(job_id):
+    """查询后台解析任务状态"""
+    job = parse_jobs.status(job_id)
+    if not job or job.get('owner') != session.get('username'):
+        return jsonify({'error': '任务不存在'}), 404
+    return jsonify(job)
+
 @app.route('/upload', methods=['POST'])
 @require_auth
 def upload_file():
@@ -300,73 +701,103 @@ def upload_file():
             logger.error(f"上传目录没有写入权限: {app.config['UPLOAD_FOLDER']}")
             return jsonify({'error': '服务器配置错误：上传目录没有写入权限'}), 500
         
-        # 保存文件
+        # 保存文件（按内容哈希去重，相同内容不重复写盘）
         try:
-            file.save(filepath)
-            logger.info(f"文件保存成功: {filepath}")
+            content_hash, deduped = blob_store.store_stream(file.stream, filepath)
+            logger.info(f"文件保存成功: {filepath}, sha256={content_hash}, 复用已有内容={deduped}")
         except Exception as e:
             logger.error(f"文件保存失败: {e}")
             return jsonify({'error': f'文件保存失败: {str(e)}'}), 500
         
-        # 解析文件逻辑
-        data = []
-        if filename.endswith('.sti'):
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-            except Exception as e:
-                # 删除无效文件
-                try:
-                    os.remove(filepath)
-                except:
-                    pass
-                return jsonify({'error': f'STI文件解析失败: {str(e)}'}), 400
-        else:
-            # CSV 解析逻辑 - 支持JSON格式的CSV文件
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    content = f.read().strip()
-                    if content.startswith('[') and content.endswith(']'):
-                        # 如果是JSON格式，直接解析
-                        data = json.loads(content)
-                    else:
-                        # 否则按标准CSV格式解析
-                        f.seek(0)  # 重置文件指针
-                        reader = csv.reader(f)
-                        header = next(reader, None)
-                        for row_num, row in enumerate(reader, start=2):
-                            if len(row) >= 2:
-                                item_name = row[0].strip()
-                                quantity_str = row[1].strip()
-                                
-                                if item_name and quantity_str:
-                                    boxes, groups, pieces = FileUtils.calculate_boxes_and_groups(quantity_str)
-                                    data.append([item_name, quantity_str, boxes, groups, pieces, "未完成"])
-            except Exception as e:
-                # 删除无效文件
-                try:
-                    os.remove(filepath)
-                except:
-                    pass
-                return jsonify({'error': f'CSV文件解析失败: {str(e)}'}), 400
+        # 大文件可在后台解析，进度推送到上传者的 Socket.IO 连接
+        if request.form.get('async') in ('1', 'true'):
+            return submit_parse_job(filename, filepath, description, request.form.get('sid'))
         
-        return jsonify({
-            'success': True,
-            'filename': filename,
-            'data': data,
-            'file_info': {
-                'filename': filename,
-                'owner': session.get('username'),
-                'description': description,
-                'created_at': datetime.now().isoformat(),
-                'size': os.path.getsize(filepath)
-            }
-        })
+        return process_uploaded_file(filename, filepath, description)
     
     except Exception as e:
         logger.error(f"文件上传失败: {e}")
         return jsonify({'error': f'文件上传时发生错误: {str(e)}'}), 500
 
+@app.route('/upload/chunked/init', methods=['POST'])
+@require_auth
+def chunked_upload_init():
+    """创建分块上传会话"""
+    try:
+        data = request.get_json() or {}
+        filename = FileUtils.secure_filename(data.get('filename', ''))
+        
+        if not filename:
+            return jsonify({'error': '没有选择文件'}), 400
+        
+        if not FileUtils.allowed_file(filename):
+            return jsonify({'error': '不支持的文件类型'}), 400
+        
+        try:
+            size = int(data.get('size'))
+        except (TypeError, ValueError):
+            return jsonify({'error': '文件大小无效'}), 400
+        if size <= 0:
+            return jsonify({'error': '文件大小必须大于 0'}), 400
+        
+        result = chunked_uploads.init(filename, size, data.get('sha256'), session.get('username'))
+        result['chunk_size'] = app.config['CHUNK_UPLOAD_CHUNK_SIZE']
+        return jsonify(result)
+    
+    except ChunkedUploadError as e:
+        return jsonify({'error': str(e), **e.extra}), e.status
+    except Exception as e:
+        logger.error(f"创建分块上传失败: {e}")
+        return jsonify({'error': f'创建分块上传时出错: {e}'}), 500
+
+@app.route('/upload/chunked/<upload_id>', methods=['GET'])
+@require_auth
+def chunked_upload_status(upload_id):
+    """查询分块上传进度（断点续传）"""
+    try:
+        return jsonify(chunked_uploads.status(upload_id, session.get('username')))
+    except ChunkedUploadError as e:
+        return jsonify({'error': str(e), **e.extra}), e.status
+
+@app.route('/upload/chunked/<upload_id>', methods=['PUT'])
+@require_auth
+def chunked_upload_put(upload_id):
+    """上传一个分块，请求体为原始字节，offset 为分块起始位置"""
+    try:
+        offset = int(request.args.get('offset', -1))
+        received = chunked_uploads.put_chunk(upload_id, offset, request.stream, session.get('username'))
+        return jsonify({'upload_id': upload_id, 'offset': received})
+    except ChunkedUploadError as e:
+        return jsonify({'error': str(e), **e.extra}), e.status
+    except ValueError:
+        return jsonify({'error': 'offset 参数无效'}), 400
+    except Exception as e:
+        logger.error(f"写入分块失败: {e}")
+        return jsonify({'error': f'写入分块时出错: {e}'}), 500
+
+@app.route('/upload/chunked/<upload_id>/finalize', methods=['POST'])
+@require_auth
+def chunked_upload_finalize(upload_id):
+    """校验并完成分块上传，随后解析文件"""
+    try:
+        data = request.get_json(silent=True) or {}
+        meta = chunked_uploads.status(upload_id, session.get('username'))
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], meta['filename'])
+        result = chunked_uploads.finalize(
+            upload_id,
+            lambda part_path, content_hash: blob_store.store_file(part_path, content_hash, filepath),
+            session.get('username'),
+            data.get('sha256')
+        )
+        if data.get('async'):
+            return submit_parse_job(result['filename'], filepath, data.get('description', '').strip(), data.get('sid'))
+        return process_uploaded_file(result['filename'], filepath, data.get('description', '').strip())
+    except ChunkedUploadError as e:
+        return jsonify({'error': str(e), **e.extra}), e.status
+    except Exception as e:
+        logger.error(f"完成分块上传失败: {e}")
+        return jsonify({'error': f'完成分块上传时出错: {e}'}), 500
+
 @app.route('/save', methods=['POST'])
 @require_auth
 def save_file():
@@ -383,13 +814,17 @@ def save_file():
         if not filename.endswith('.sti'):
             filename += '.sti'
         
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], FileUtils.secure_filename(filename))
+        stored_name = FileUtils.secure_filename(filename)
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], stored_name)
+        
+        FileUtils.write_file_data(filepath, file_data)
+        blob_store.release(stored_name)
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(file_data, f, ensure_ascii=False, indent=4)
+        version = document_saved(stored_name, filepath, file_data, session.get('username'))
         
         return jsonify({
             'message': f'文件成功保存: {filename}',
+            'version': version,
             'file_info': {
                 'filename': filename,
                 'owner': session.get('username'),
@@ -406,50 +841,125 @@ def save_file():
 @app.route('/open_file/<filename>')
 @require_auth
 def open_file(filename):
-    """打开文件"""
+    """打开文件（可通过 ?version= 打开历史版本）"""
     try:
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], FileUtils.secure_filename(filename))
+        stored_name = FileUtils.secure_filename(filename)
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], stored_name)
         
         if not os.path.exists(filepath):
             return jsonify({'error': '文件不存在'}), 404
         
-        if filename.endswith('.sti'):
-            with open(filepath, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+        version = request.args.get('version', type=int)
+        if version is not None:
+            data = version_history.load_version(stored_name, version)
+            if data is None:
+                return jsonify({'error': f'版本不存在: {version}'}), 404
         else:
-            # 对于CSV文件，重新解析
-            data = []
-            with open(filepath, 'r', encoding='utf-8') as f:
-                # 检查文件内容是否为JSON格式
-                content = f.read().strip()
-                if content.startswith('[') and content.endswith(']'):
-                    # 如果是JSON格式，直接解析
-                    data = json.loads(content)
-                else:
-                    # 否则按标准CSV格式解析
-                    f.seek(0)  # 重置文件指针
-                    reader = csv.reader(f)
-                    header = next(reader, None)
-                    for row in reader:
-                        if len(row) >= 2:
-                            item_name = row[0].strip()
-                            quantity_str = row[1].strip()
-                            if item_name and quantity_str:
-                                boxes, groups, pieces = FileUtils.calculate_boxes_and_groups(quantity_str)
-                                data.append([item_name, quantity_str, boxes, groups, pieces, "未完成"])
+            data = load_document(stored_name, filepath)
         
-        return jsonify({
+        # 堆叠数配置可能在解析后发生变化，按当前配置重算盒/组/个
+        overrides = stack_registry.load_overrides(filepath)
+        data = stack_registry.apply(data, stack_registry.recompute(data, overrides))
+        
+        result = {
             'filename': filename,
             'data': data
-        })
+        }
+        if version is not None:
+            result['version'] = version
+        return jsonify(result)
     
     except Exception as e:
         logger.error(f"打开文件失败: {e}")
         return jsonify({'error': f'读取文件时出错: {e}'}), 500
+
+@app.route('/history/<filename>')
+@require_auth
+def file_history(filename):
+    """文件的版本历史"""
+    try:
+        stored_name = FileUtils.secure_filename(filename)
+        versions = version_history.list_versions(stored_name)
+        if not versions and not os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], stored_name)):
+            return jsonify({'error': '文件不存在'}), 404
+        
+        return jsonify({
+            'filename': filename,
+            'current_version': versions[0]['version'] if versions else 0,
+            'versions': versions,
+            'storage': version_history.stats(stored_name)
+        })
     
     except Exception as e:
-        logger.error(f"打开文件失败: {e}")
-        return jsonify({'error': f'读取文件时出错: {e}'}), 500
+        logger.error(f"读取版本历史失败: {e}")
+        return jsonify({'error': f'读取版本历史时出错: {e}'}), 500
+
+@app.route('/bulk_update', methods=['POST'])
+@require_auth
+def bulk_update():
+    """
+    按条件批量更新状态
+
+    文件正在协作编辑时更新房间文档并广播给房间成员，否则直接更新已保存的文档。
+    """
+    try:
+        data = request.get_json() or {}
+        filename = data.get('filename')
+        status = data.get('status')
+        if not filename or not status:
+            return jsonify({'error': '文件名和状态不能为空'}), 400
+        predicate = compile_predicate(data.get('predicate'))
+        username = session.get('username')
+        
+        if filename in active_files:
+            return jsonify(bulk_update_room(filename, predicate, status, username))
+        
+        stored_name = FileUtils.secure_filename(filename)
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], stored_name)
+        if not os.path.exists(filepath):
+            return jsonify({'error': '文件不存在'}), 404
+        
+        # 解析缓存中的数据行是共享的，复制后再修改
+        rows = [list(row) for row in load_document(stored_name, filepath)]
+        indexes = match_rows(rows, predicate, status)
+        if not indexes:
+            return jsonify({'count': 0, 'version': None})
+        changes = apply_status(rows, indexes, status)
+        FileUtils.write_file_data(filepath, rows)
+        blob_store.release(stored_name)
+        version = document_saved(stored_name, filepath, rows, username)
+        progress_rollup.record_many(stored_name, changes)
+        logger.info("批量更新: 文件 %s 共 %d 行状态更新为 %s, 由用户 %s 修改", stored_name, len(indexes), status, username,
+                    extra={'event': 'bulk_update'})
+        return jsonify({'count': len(indexes), 'version': version})
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"批量更新失败: {e}")
+        return jsonify({'error': f'批量更新时出错: {e}'}), 500
+
+@app.route('/progress/<filename>')
+@require_auth
+def file_progress(filename):
+    """文件的进度时间序列（只读取汇总数据，汇总有 PROGRESS_ROLLUP_INTERVAL 秒左右的延迟）"""
+    try:
+        stored_name = FileUtils.secure_filename(filename)
+        resolution = request.args.get('resolution', 'hour')
+        since = request.args.get('since', type=int)
+        until = request.args.get('until', type=int)
+        result = progress_rollup.query(stored_name, resolution, since, until)
+        
+        # 当前各状态行数，配合各桶的净变化可以倒推出任意时刻的完成情况
+        summary = progress_summaries.all().get(stored_name)
+        result['current'] = summary['status'] if summary else None
+        return jsonify(result)
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"读取进度时间序列失败: {e}")
+        return jsonify({'error': f'读取进度时出错: {e}'}), 500
 
 @app.route('/delete_file/<filename>', methods=['DELETE'])
 @require_auth
@@ -462,6 +972,12 @@ def delete_file(filename):
             return jsonify({'error': '文件不存在'}), 404
         
         os.remove(filepath)
+        stack_registry.save_overrides(filepath, {})
+        blob_store.release(FileUtils.secure_filename(filename))
+        search_index.remove_file(FileUtils.secure_filename(filename))
+        version_history.remove(FileUtils.secure_filename(filename))
+        progress_summaries.remove(FileUtils.secure_filename(filename))
+        progress_rollup.remove(FileUtils.secure_filename(filename))
         logger.info(f"用户 {session.get('username')} 删除了文件 {filename}")
         
         return jsonify({'message': f'文件已删除: {filename}'})
@@ -482,17 +998,357 @@ def auto_save():
         if not filename or not file_data:
             return jsonify({'error': '缺少必要参数'}), 400
         
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], FileUtils.secure_filename(filename))
+        stored_name = FileUtils.secure_filename(filename)
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], stored_name)
+        
+        FileUtils.write_file_data(filepath, file_data)
+        blob_store.release(stored_name)
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(file_data, f, ensure_ascii=False, indent=4)
+        version = document_saved(stored_name, filepath, file_data, session.get('username'))
         
-        return jsonify({'success': True, 'message': '自动保存成功'})
+        return jsonify({'success': True, 'message': '自动保存成功', 'version': version})
     
     except Exception as e:
         logger.error(f"自动保存失败: {e}")
         return jsonify({'error': f'自动保存时出错: {e}'}), 500
 
+@app.route('/aggregate', methods=['GET', 'POST'])
+@require_auth
+def aggregate_files():
+    """汇总多个文件的材料总量（JSON Lines 流式输出）"""
+    try:
+        if request.method == 'POST':
+            filenames = (request.get_json(silent=True) or {}).get('filenames') or []
+        else:
+            filenames = request.args.getlist('files')
+        
+        upload_folder = app.config['UPLOAD_FOLDER']
+        if not filenames:
+            filenames = sorted(f for f in os.listdir(upload_folder) if FileUtils.allowed_file(f))
+        filenames = list(dict.fromkeys(filenames))
+    except Exception as e:
+        logger.error(f"汇总请求解析失败: {e}")
+        return jsonify({'error': f'汇总请求无效: {e}'}), 400
+    
+    def generate():
+        aggregator = MaterialAggregator(stack_registry.calculate)
+        missing = []
+        errors = []
+        
+        # 逐个文件读取并聚合，内存中只保留按物品名的汇总表
+        for filename in filenames:
+            source = material_source(filename)
+            if source is None:
+                missing.append(filename)
+                continue
+            try:
+                aggregator.add_rows(source[1]())
+            except Exception as e:
+                logger.warning(f"汇总时解析文件 {filename} 失败: {e}")
+                errors.append({'filename': filename, 'error': str(e)})
+        
+        for item in aggregator.iter_results():
+            yield json.dumps(item, ensure_ascii=False) + '\n'
+        
+        summary = aggregator.summary()
+        summary['missing'] = missing
+        summary['errors'] = errors
+        logger.info(f"材料汇总完成: {summary['files']} 个文件, {summary['items']} 种物品")
+        yield json.dumps({'summary': summary}, ensure_ascii=False) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def material_source(filename):
+    """
+    材料清单的数据来源
+    
+    Returns:
+        (内容版本, 返回数据行的函数)，文件不存在时返回 None
+    """
+    room = active_files.get(filename)
+    if room and room['data']:
+        # 优先使用房间内的实时数据
+        return ('room', id(room), room['version']), lambda: room['data']
+    
+    stored_name = FileUtils.secure_filename(filename)
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], stored_name)
+    if not os.path.exists(filepath):
+        return None
+    cache_key = document_cache_key(stored_name, filepath)
+    
+    def rows():
+        # 有缓存的解析结果时直接使用，否则流式读取且不写入缓存
+        cached = blob_store.get_parsed(cache_key)
+        return cached if cached is not None else FileUtils.iter_file_rows(filepath)
+    return cache_key, rows
+
+@app.route('/inventory')
+@require_auth
+def list_inventories():
+    """列出库存快照"""
+    return jsonify({'snapshots': inventory_store.list()})
+
+@app.route('/inventory/<name>', methods=['GET', 'POST', 'DELETE'])
+@require_auth
+def inventory_snapshot(name):
+    """
+    查询、上传或删除库存快照
+    
+    POST 接受 CSV 文件（file 字段，物品名,数量 或 箱子,物品名,数量）或 JSON
+    {'chests': {箱子: {物品名: 数量}}}；merge=1 时只替换提交的箱子
+    """
+    snapshot_name = FileUtils.secure_filename(name)
+    if not snapshot_name:
+        return jsonify({'error': '快照名称无效'}), 400
+    
+    try:
+        if request.method == 'POST':
+            if 'file' in request.files:
+                chests = parse_snapshot_csv(request.files['file'].read())
+                merge = request.form.get('merge') in ('1', 'true')
+            else:
+                data = request.get_json(silent=True) or {}
+                chests = validate_chests(data.get('chests'))
+                merge = bool(data.get('merge'))
+            result = inventory_store.update(snapshot_name, chests, replace=not merge,
+                                            username=session.get('username'))
+            result['name'] = snapshot_name
+            return jsonify(result)
+        
+        if request.method == 'DELETE':
+            if not inventory_store.delete(snapshot_name):
+                return jsonify({'error': '快照不存在'}), 404
+            logger.info(f"用户 {session.get('username')} 删除了库存快照 {snapshot_name}")
+            return jsonify({'success': True})
+        
+        current = inventory_store.get(snapshot_name)
+        if current is None:
+            return jsonify({'error': '快照不存在'}), 404
+        snapshot, totals = current
+        return jsonify({
+            'name': snapshot_name,
+            'revision': snapshot['revision'],
+            'updated_at': snapshot.get('updated_at'),
+            'updated_by': snapshot.get('updated_by'),
+            'chests': snapshot['chests'],
+            'items': len(totals)
+        })
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"处理库存快照 {snapshot_name} 失败: {e}")
+        return jsonify({'error': f'处理库存快照时出错: {e}'}), 500
+
+@app.route('/inventory/<name>/reconcile', methods=['GET', 'POST'])
+@require_auth
+def reconcile_inventory(name):
+    """按物品核对库存快照与一个或多个材料清单，返回仍需收集的数量"""
+    snapshot_name = FileUtils.secure_filename(name)
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        filenames = data.get('filenames') or []
+        pending_only = bool(data.get('pending_only'))
+    else:
+        filenames = request.args.getlist('files')
+        pending_only = request.args.get('pending_only') in ('1', 'true')
+    filenames = tuple(dict.fromkeys(str(filename) for filename in filenames))
+    if not filenames:
+        return jsonify({'error': '请指定材料清单'}), 400
+    
+    try:
+        current = inventory_store.get(snapshot_name) if snapshot_name else None
+        if current is None:
+            return jsonify({'error': '快照不存在'}), 404
+        
+        sources = {}
+        for filename in filenames:
+            source = material_source(filename)
+            if source is None:
+                return jsonify({'error': f'文件不存在: {filename}'}), 404
+            sources[filename] = source
+        # 清单内容或堆叠数变化时整体重算
+        list_version = tuple(version for version, _ in sources.values()) + (stack_registry.version,)
+        
+        snapshot, totals = current
+        result = inventory_reconciler.reconcile(
+            snapshot_name, snapshot, totals, filenames, list_version,
+            lambda: (rows() for _, rows in sources.values()), pending_only
+        )
+        result['summary']['files'] = list(filenames)
+        logger.info(f"库存核对 {snapshot_name}: {len(filenames)} 个清单, "
+                    f"{result['summary']['short']} 种物品不足（{result['summary']['mode']}）")
+        return jsonify(result)
+    
+    except Exception as e:
+        logger.error(f"库存核对失败: {e}")
+        return jsonify({'error': f'库存核对时出错: {e}'}), 500
+
+def apply_room_changes(filename, changed_rows):
+    """将变更行写入房间文档并向房间内所有用户广播增量"""
+    room = active_files.get(filename)
+    if not room or not changed_rows:
+        return
+    
+    for index, row in changed_rows:
+        room['data'][index] = row
+        room['row_hashes'][index] = RoomSync.row_hash(row)
+    room['version'] += 1
+    
+    outbound.broadcast('file_data_patch', {
+        'filename': filename,
+        'length': len(room['data']),
+        'rows': changed_rows,
+        'version': room['version']
+    }, room_members(filename), kind='document')
+
+@app.route('/stack_sizes', methods=['GET', 'PUT'])
+@require_auth
+def global_stack_sizes():
+    """查询或更新全局物品堆叠数，更新后重算所有活跃文档"""
+    try:
+        if request.method == 'PUT':
+            data = request.get_json() or {}
+            stack_registry.update(data.get('items', {}))
+            
+            for filename, room in list(active_files.items()):
+                filepath = os.path.join(app.config['UPLOAD_FOLDER'], FileUtils.secure_filename(filename))
+                overrides = stack_registry.load_overrides(filepath)
+                apply_room_changes(filename, stack_registry.recompute(room['data'], overrides))
+            
+            logger.info(f"用户 {session.get('username')} 更新了全局堆叠数量配置")
+        
+        return jsonify({
+            'default': stack_registry.default_stack,
+            'items': stack_registry.custom
+        })
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"更新堆叠数量配置失败: {e}")
+        return jsonify({'error': f'更新堆叠数量配置时出错: {e}'}), 500
+
+@app.route('/stack_sizes/<filename>', methods=['GET', 'PUT'])
+@require_auth
+def file_stack_sizes(filename):
+    """查询或替换文件级的物品堆叠数覆盖值"""
+    try:
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], FileUtils.secure_filename(filename))
+        
+        if not os.path.exists(filepath):
+            return jsonify({'error': '文件不存在'}), 404
+        
+        changed = 0
+        if request.method == 'PUT':
+            data = request.get_json() or {}
+            overrides = StackSizeRegistry.validate(data.get('items', {}))
+            stack_registry.save_overrides(filepath, overrides)
+            
+            room = active_files.get(filename)
+            if room:
+                changed_rows = stack_registry.recompute(room['data'], overrides)
+                apply_room_changes(filename, changed_rows)
+                changed = len(changed_rows)
+        
+        return jsonify({
+            'filename': filename,
+            'items': stack_registry.load_overrides(filepath),
+            'changed_rows': changed
+        })
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"更新文件堆叠数量失败: {e}")
+        return jsonify({'error': f'更新文件堆叠数量时出错: {e}'}), 500
+
+@app.route('/export/<filename>')
+@require_auth
+def export_file(filename):
+    """流式导出当前文档（CSV 或 JSON Lines），支持按状态和最小数量过滤"""
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in ('csv', 'jsonl'):
+        return jsonify({'error': '不支持的导出格式'}), 400
+    
+    statuses = set(request.args.getlist('status')) or None
+    try:
+        min_quantity = request.args.get('min_quantity')
+        min_quantity = int(min_quantity) if min_quantity not in (None, '') else None
+    except ValueError:
+        return jsonify({'error': 'min_quantity 参数无效'}), 400
+    
+    # 文件正在协作编辑时导出房间内的实时状态，否则读取存储的文件
+    room = active_files.get(filename)
+    if room and room['data']:
+        rows = room['data']
+    else:
+        stored_name = FileUtils.secure_filename(filename)
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], stored_name)
+        if not os.path.exists(filepath):
+            return jsonify({'error': '文件不存在'}), 404
+        rows = blob_store.get_parsed(document_cache_key(stored_name, filepath))
+        if rows is None:
+            rows = FileUtils.iter_file_rows(filepath)
+    
+    rows = RowExporter.filter_rows(rows, statuses, min_quantity)
+    if export_format == 'csv':
+        chunks, mimetype = RowExporter.iter_csv(rows), 'text/csv; charset=utf-8'
+    else:
+        chunks, mimetype = RowExporter.iter_jsonl(rows), 'application/x-ndjson; charset=utf-8'
+    
+    def generate():
+        try:
+            yield from chunks
+        except Exception as e:
+            logger.error(f"导出文件 {filename} 失败: {e}")
+            raise
+    
+    export_name = f"{filename.rsplit('.', 1)[0]}.{export_format}"
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(export_name)}"
+    return response
+
+@app.route('/search')
+@require_auth
+def search_items():
+    """按物品名搜索所有已上传的清单"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': '搜索关键字不能为空'}), 400
+    
+    try:
+        limit = min(int(request.args.get('limit', 200)), 1000)
+    except ValueError:
+        return jsonify({'error': 'limit 参数无效'}), 400
+    
+    try:
+        if not search_index.built:
+            search_index.build(app.config['UPLOAD_FOLDER'],
+                               lambda path: load_document(os.path.basename(path), path),
+                               FileUtils.allowed_file)
+        
+        def live_status(filename, row_index):
+            # 文件正在协作编辑时使用房间内的实时状态
+            room = active_files.get(filename)
+            if room and row_index < len(room['data']):
+                return room['data'][row_index][5]
+            return None
+        
+        start = time.perf_counter()
+        results = search_index.search(query, limit=limit, live_status=live_status)
+        elapsed = (time.perf_counter() - start) * 1000
+        
+        return jsonify({
+            'query': query,
+            'results': results,
+            'total': sum(len(r['matches']) for r in results),
+            'elapsed_ms': round(elapsed, 3)
+        })
+    except Exception as e:
+        logger.error(f"搜索失败: {e}")
+        return jsonify({'error': f'搜索时出错: {e}'}), 500
+
 @app.after_request
 def after_request(response):
     """添加响应头"""
@@ -510,10 +1366,23 @@ def after_request(response):
     return response
 
 # Socket.IO 事件处理
+def traced(handler):
+    """录制入站事件（TRACE_ENABLED 开启时），用于回放性能测试"""
+    @wraps(handler)
+    def wrapper(*args):
+        trace_recorder.record(request.sid, request.event['message'], args[0] if args else None)
+        return handler(*args)
+    return wrapper
+
 @socketio.on('connect')
 def handle_connect():
     """处理客户端连接"""
-    logger.info(f"客户端连接: {request.sid}")
+    # 连接处理函数会被以不同参数重试调用，不使用 traced 装饰器
+    trace_recorder.record(request.sid, 'connect')
+    logger.info("客户端连接: %s", request.sid, extra={'event': 'connect'})
+    outbound.start()
+    active_files.start(socketio, on_evict=payload_cache.invalidate, persist=persist_room)
+    progress_rollup.start(socketio)
     user_sessions[request.sid] = {
         'sid': request.sid,
         'username': '未登录用户',
@@ -527,9 +1396,12 @@ def handle_connect():
     })
 
 @socketio.on('disconnect')
+@traced
 def handle_disconnect():
     """处理客户端断开连接"""
     sid = request.sid
+    outbound.forget(sid)
+    page_delivery.cancel(sid)
     if sid in user_sessions:
         username = user_sessions[sid]['username']
         current_file = user_sessions[sid].get('current_file')
@@ -544,6 +1416,7 @@ def handle_disconnect():
             # 如果文件没有用户了，清理文件数据
             if not active_files[current_file]['users']:
                 del active_files[current_file]
+                payload_cache.invalidate(current_file)
             else:
                 # 广播用户离开事件
                 emit('user_left', {
@@ -552,28 +1425,26 @@ def handle_disconnect():
                 }, room=current_file)
         
         del user_sessions[sid]
-        logger.info(f"客户端断开: {sid}, 用户: {username}")
+        logger.info("客户端断开: %s, 用户: %s", sid, username, extra={'event': 'disconnect'})
 
 
 @socketio.on('join_file')
+@traced
 def handle_join_file(data):
     """处理加入文件编辑"""
     filename = data.get('filename')
     username = data.get('username', '未登录用户')
     
-    logger.info(f"用户 {username} 请求加入文件 {filename}")
+    logger.debug("用户 %s 请求加入文件 %s", username, filename, extra={'event': 'join_file'})
     
     # 更新用户会话
     if request.sid in user_sessions:
         user_sessions[request.sid]['current_file'] = filename
         user_sessions[request.sid]['username'] = username
+        user_sessions[request.sid]['paged'] = bool(data.get('paged'))
     
     # 初始化文件数据
-    if filename not in active_files:
-        active_files[filename] = {
-            'data': [],
-            'users': []
-        }
+    get_active_file(filename)
     
     # 添加用户到文件（确保不重复）
     existing_user = next((u for u in active_files[filename]['users'] if u['sid'] == request.sid), None)
@@ -586,14 +1457,13 @@ def handle_join_file(data):
     # 将用户加入房间
     join_room(filename)
     
-    logger.info(f"用户 {username} 加入了文件 {filename}, 当前用户数: {len(active_files[filename]['users'])}")
+    logger.info("用户 %s 加入了文件 %s, 当前用户数: %d", username, filename,
+                len(active_files[filename]['users']), extra={'event': 'join_file'})
     
     # 发送当前文件数据（如果有）
-    if active_files[filename]['data']:
-        emit('file_data', {
-            'filename': filename,
-            'data': active_files[filename]['data']
-        }, room=request.sid)
+    room = active_files[filename]
+    if room['data']:
+        send_document(request.sid, filename, room)
     
     # 广播用户加入事件给房间内所有用户
     emit('user_joined', {
@@ -603,22 +1473,23 @@ def handle_join_file(data):
     }, room=filename)
 
 @socketio.on('file_loaded')
+@traced
 def handle_file_loaded(data):
     """处理文件加载完成"""
     filename = data.get('filename')
     file_data = data.get('data', [])
     
-    logger.info(f"文件 {filename} 数据已加载，共{len(file_data)}项")
-    
-    if filename not in active_files:
-        active_files[filename] = {
-            'data': [],
-            'users': []
-        }
+    logger.info("文件 %s 数据已加载，共%d项", filename, len(file_data), extra={'event': 'file_loaded'})
     
-    active_files[filename]['data'] = file_data
+    room = get_active_file(filename)
+    room['data'] = file_data
+    room['row_hashes'] = RoomSync.compute_row_hashes(file_data)
+    room['version'] += 1
+    # 刚加载的文档与存储的内容一致，之后的修改才需要在转存前写回
+    room['saved_version'] = room['version']
 
 @socketio.on('item_updated')
+@traced
 def handle_item_updated(data):
     """处理项目更新"""
     filename = data.get('filename')
@@ -626,46 +1497,160 @@ def handle_item_updated(data):
     new_status = data.get('status')
     username = data.get('username', '未知用户')
     
-    logger.info(f"收到项目更新: 文件 {filename}, 行 {row_index}, 状态 {new_status}, 用户 {username}")
-    
     if filename in active_files and 0 <= row_index < len(active_files[filename]['data']):
         # 更新服务器端数据
-        active_files[filename]['data'][row_index][5] = new_status
+        room = active_files[filename]
+        old_status = room['data'][row_index][5]
+        room['data'][row_index][5] = new_status
+        if old_status != new_status:
+            progress_rollup.record(FileUtils.secure_filename(filename), row_index, old_status, new_status)
+        room['row_hashes'][row_index] = RoomSync.row_hash(room['data'][row_index])
+        room['version'] += 1
         
         # 广播更新给所有在同一个文件的用户（不包括发送者）
-        emit('item_updated', {
+        outbound.broadcast('item_updated', {
             'rowIndex': row_index,
             'status': new_status,
             'filename': filename,
             'username': username
-        }, room=filename, include_self=False)
+        }, room_members(filename), skip_sid=request.sid, kind='row')
         
-        logger.info(f"广播更新: 文件 {filename} 第{row_index}行状态更新为: {new_status}, 由用户 {username} 修改")
+        logger.info("项目更新: 文件 %s 第%s行状态更新为: %s, 由用户 %s 修改", filename, row_index, new_status, username,
+                    extra={'event': 'item_updated'})
     else:
-        logger.warning(f"无法更新项目: 文件 {filename} 不存在或行索引 {row_index} 无效")
+        logger.warning("无法更新项目: 文件 %s 不存在或行索引 %s 无效", filename, row_index, extra={'event': 'item_updated'})
+
+@socketio.on('bulk_update')
+@traced
+def handle_bulk_update(data):
+    """按条件批量更新状态，确认回调返回更新的行数"""
+    filename = data.get('filename')
+    status = data.get('status')
+    username = data.get('username', '未知用户')
+    
+    if not status or filename not in active_files:
+        return {'error': '文件不存在或未指定状态'}
+    try:
+        predicate = compile_predicate(data.get('predicate'))
+    except ValueError as e:
+        return {'error': str(e)}
+    return bulk_update_room(filename, predicate, status, username)
 
 @socketio.on('sync_file_data')
+@traced
 def handle_sync_file_data(data):
-    """同步文件数据"""
+    """同步文件数据（仅广播与房间状态不同的行）"""
     filename = data.get('filename')
     file_data = data.get('data', [])
     
-    logger.info(f"收到文件数据同步: 文件 {filename}, 数据长度 {len(file_data)}")
+    logger.debug("收到文件数据同步: 文件 %s, 数据长度 %d", filename, len(file_data), extra={'event': 'sync_file_data'})
     
-    if filename not in active_files:
-        active_files[filename] = {
-            'data': [],
-            'users': []
-        }
+    room = get_active_file(filename)
+    old_length = len(room['data'])
+    changed_rows, new_hashes = RoomSync.diff_rows(room['row_hashes'], file_data)
+    
+    if not changed_rows and len(file_data) == old_length:
+        logger.debug("文件 %s 数据无变化，跳过广播", filename, extra={'event': 'sync_file_data'})
+        return
     
     # 更新服务器端数据
-    active_files[filename]['data'] = file_data
+    room['data'] = file_data
+    room['row_hashes'] = new_hashes
+    room['version'] += 1
+    
+    # 变更行数接近全量时直接发送完整文档
+    if len(changed_rows) * 2 >= len(file_data) and file_data:
+        outbound.broadcast('file_data_updated', {
+            'filename': filename,
+            'version': room['version'],
+            'payload': payload_cache.get(filename, room['version'], file_data)
+        }, room_members(filename), skip_sid=request.sid, kind='document')
+        return
     
-    # 广播给房间内其他用户
-    emit('file_data_updated', {
+    # 广播增量给房间内其他用户
+    outbound.broadcast('file_data_patch', {
         'filename': filename,
-        'data': file_data
-    }, room=filename, include_self=False)
+        'length': len(file_data),
+        'rows': changed_rows,
+        'version': room['version']
+    }, room_members(filename), skip_sid=request.sid, kind='document')
+    logger.info("广播增量: 文件 %s 变更 %d 行, 总行数 %d", filename, len(changed_rows), len(file_data),
+                extra={'event': 'sync_file_data'})
+
+@socketio.on('resync_file')
+@traced
+def handle_resync_file(data):
+    """客户端收到 resync_required 后请求当前完整文档"""
+    filename = data.get('filename')
+    room = active_files.get(filename)
+    
+    if room and room['data']:
+        send_document(request.sid, filename, room)
+
+@app.route('/metrics')
+@require_auth
+def get_metrics():
+    """运行指标"""
+    return jsonify({
+        'active_files': len(active_files),
+        'rooms': active_files.stats(),
+        'storage': document_storage.stats(),
+        'parse_jobs': parse_jobs.stats(),
+        'trace': trace_recorder.stats(),
+        'progress_events': progress_rollup.stats(),
+        'page_delivery': page_delivery.stats(),
+        'inventory': inventory_reconciler.stats(),
+        'user_sessions': len(user_sessions),
+        'payload_cache': payload_cache.stats(),
+        'search_index': search_index.stats(),
+        'blob_store': blob_store.stats(),
+        'outbound': outbound.stats(list(user_sessions)),
+        'logging': log_stats()
+    })
+
+@app.route('/debug/memory', methods=['GET', 'POST'])
+@require_admin
+def debug_memory():
+    """
+    当前工作进程的内存诊断
+
+    参数:
+        trace=start|stop  开启/关闭 tracemalloc（仅 POST）
+        snapshot=1        返回结果后记录新的基准快照（仅 POST）
+        top=N             附带与基准快照相比增长最多的 N 个代码位置
+    """
+    try:
+        trace = request.args.get('trace')
+        if (trace or request.args.get('snapshot')) and request.method != 'POST':
+            return jsonify({'error': 'trace 和 snapshot 会改变诊断状态，请使用 POST'}), 405
+        if trace == 'start':
+            memory_inspector.start_tracing()
+        elif trace == 'stop':
+            memory_inspector.stop_tracing()
+        elif trace:
+            return jsonify({'error': 'trace 应为 start 或 stop'}), 400
+        
+        server = socketio.server
+        result = memory_inspector.report(active_files, {
+            'user_sessions': user_sessions,
+            'payload_cache': payload_cache,
+            'search_index': search_index,
+            'blob_store': blob_store,
+            'chunked_uploads': chunked_uploads,
+            'outbound': outbound,
+            'socketio_rooms': server.manager.rooms
+        }, top=request.args.get('top', 0, type=int))
+        result['socketio'] = {
+            'connections': len(server.eio.sockets),
+            'queued_packets': sum(sock.queue.qsize() for sock in list(server.eio.sockets.values()))
+        }
+        if request.args.get('snapshot'):
+            result['tracemalloc'].update(tracing=True, baseline_at=memory_inspector.snapshot())
+        return jsonify(result)
+    
+    except Exception as e:
+        logger.error(f"内存诊断失败: {e}")
+        return jsonify({'error': f'内存诊断出错: {e}'}), 500
 
 # 添加 Socket.IO 测试路由
 @app.route('/socketio-test')
@@ -673,6 +1658,106 @@ def socketio_test():
     """Socket.IO 测试路由"""
     return jsonify({'message': 'Socket.IO 路由正常'})
 
+# 预热时的文件目录（文件名 -> 修改时间），工作进程 fork 后据此补齐之后发生的变化
+warm_catalog = None
+
+def scan_catalog():
+    """上传目录中支持的文件，按最近使用时间降序"""
+    entries = [
+        entry for entry in os.scandir(app.config['UPLOAD_FOLDER'])
+        if entry.is_file() and FileUtils.allowed_file(entry.name)
+    ]
+    entries.sort(key=lambda entry: max(entry.stat().st_atime, entry.stat().st_mtime), reverse=True)
+    return entries
+
+def warm_caches():
+    """
+    预热文件目录、最近使用文档的解析缓存和物品搜索索引
+
+    在 gunicorn 主进程中（preload_app）于 fork 工作进程之前调用，工作进程以写时复制方式共享这些数据。
+    """
+    global warm_catalog
+    timings = {}
+    started = phase = time.perf_counter()
+    
+    catalog = scan_catalog()
+    warm_catalog = {entry.name: entry.stat().st_mtime_ns for entry in catalog}
+    timings['catalog'] = time.perf_counter() - phase
+    
+    phase = time.perf_counter()
+    for entry in catalog[:Config.PRELOAD_DOCUMENTS]:
+        try:
+            load_document(entry.name, entry.path)
+        except Exception as e:
+            logger.warning(f"预解析文件 {entry.name} 失败: {e}")
+    timings['documents'] = time.perf_counter() - phase
+    
+    phase = time.perf_counter()
+    search_index.build(app.config['UPLOAD_FOLDER'],
+                       lambda path: load_document(os.path.basename(path), path),
+                       FileUtils.allowed_file)
+    timings['search_index'] = time.perf_counter() - phase
+    
+    # 补齐缺失或过期的进度摘要（文档已在上一阶段解析并缓存）
+    phase = time.perf_counter()
+    summaries = progress_summaries.all()
+    stale = []
+    for entry in catalog:
+        if not SummaryCatalog.is_current(summaries.get(entry.name), entry.path):
+            try:
+                stale.append((entry.name, entry.path, load_document(entry.name, entry.path)))
+            except Exception as e:
+                logger.warning(f"生成文件 {entry.name} 的进度摘要失败: {e}")
+    progress_summaries.update_many(stale)
+    timings['summaries'] = time.perf_counter() - phase
+    
+    # 预热的对象移出垃圾回收的跟踪范围，避免工作进程中的回收扫描触发写时复制
+    phase = time.perf_counter()
+    gc.collect()
+    gc.freeze()
+    timings['gc_freeze'] = time.perf_counter() - phase
+    
+    logger.info("缓存预热完成: %d 个文件, 预解析 %d 个, 总耗时 %.1fms (%s)",
+                len(catalog), min(len(catalog), Config.PRELOAD_DOCUMENTS),
+                (time.perf_counter() - started) * 1000,
+                ', '.join(f'{name} {seconds * 1000:.1f}ms' for name, seconds in timings.items()))
+
+def refresh_after_fork():
+    """工作进程启动时补齐预热之后的文件变化（工作进程被回收重启时主进程的预热数据可能已过期）"""
+    if warm_catalog is None or not search_index.built:
+        return
+    started = time.perf_counter()
+    current = {entry.name: entry for entry in scan_catalog()}
+    for filename in set(search_index.files()) - set(current):
+        search_index.remove_file(filename)
+    changed = 0
+    for filename, entry in current.items():
+        if warm_catalog.get(filename) != entry.stat().st_mtime_ns:
+            try:
+                search_index.update_file(filename, load_document(filename, entry.path))
+                changed += 1
+            except Exception as e:
+                logger.warning(f"更新文件 {filename} 的索引失败: {e}")
+    logger.info("工作进程 %d 启动: 预热后变化的文件 %d 个, 耗时 %.1fms",
+                os.getpid(), changed, (time.perf_counter() - started) * 1000)
+
+# 每个工作进程记录首个请求的耗时，用于观察预热效果
+first_request_pending = True
+
+@app.before_request
+def start_first_request_timer():
+    if first_request_pending:
+        request.environ['smv.request_started'] = time.perf_counter()
+
+@app.after_request
+def log_first_request(response):
+    global first_request_pending
+    if first_request_pending and 'smv.request_started' in request.environ:
+        first_request_pending = False
+        logger.info("工作进程 %d 首个请求 %s 耗时 %.1fms", os.getpid(), request.path,
+                    (time.perf_counter() - request.environ['smv.request_started']) * 1000)
+    return response
+
 if __name__ == '__main__':
     logger.info("原理图材料列表查看器启动中...")
     logger.info(f"环境: {os.environ.get('FLASK_ENV', 'development')}")
@@ -698,6 +1783,8 @@ if __name__ == '__main__':
         except Exception as e:
             logger.error(f"上传目录没有写入权限: {e}")
     
+    warm_caches()
+    
     # 移除不支持的参数
     debug_mode = os.environ.get('FLASK_ENV') == 'development'
     socketio.run(app, 
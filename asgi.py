@@ -0,0 +1,264 @@
+"""
+ASGI 部署入口 - python-socketio 的 AsyncServer 运行在 asyncio 事件循环上，复用 app.py 中的路由和事件处理函数
+
+启动:
+    uvicorn asgi:application --host 0.0.0.0 --port 5000 --workers 2
+
+- 连接、心跳和收发都在事件循环中完成，不需要 eventlet 猴子补丁
+- HTTP 路由经 WSGI 适配器在线程中执行，Socket.IO 事件处理函数在线程池中执行
+- 应用代码与 eventlet 模式一样同一时间只有一段在运行（协作锁），socketio.sleep 期间让出，
+  原有的共享状态无需额外加锁
+"""
+import os
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+# 必须在导入 app 之前设置，应用中的 Flask-SocketIO 实例只用于注册处理函数和线程模式的后台任务
+os.environ['SOCKETIO_ASYNC_MODE'] = 'threading'
+
+import socketio  # noqa: E402
+from asgiref.sync import sync_to_async  # noqa: E402
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance  # noqa: E402
+import app as flask_module  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+HANDLER_THREADS = int(os.environ.get('ASGI_HANDLER_THREADS', 16))
+
+
+class CooperativeLock:
+    """
+    应用代码的协作锁
+
+    持有锁的线程独占执行应用代码；同一线程可重入；后台任务在 sleep 期间释放锁，
+    与 eventlet 模式下只在让出点切换的调度方式一致。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def __enter__(self):
+        depth = getattr(self._local, 'depth', 0)
+        if depth == 0:
+            self._lock.acquire()
+        self._local.depth = depth + 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self._local.depth -= 1
+        if self._local.depth == 0:
+            self._lock.release()
+
+    def sleep(self, seconds: float) -> None:
+        """睡眠期间让出锁"""
+        depth = getattr(self._local, 'depth', 0)
+        if depth:
+            self._local.depth = 0
+            self._lock.release()
+        try:
+            time.sleep(seconds)
+        finally:
+            if depth:
+                self._lock.acquire()
+                self._local.depth = depth
+
+
+class AsyncServerBridge:
+    """
+    替换 Flask-SocketIO 实例的 server 属性，把应用线程中的同步调用转交给 AsyncServer
+
+    emit、进出房间、断开连接按调用顺序放入一个队列，由事件循环中的任务依次执行，
+    同一连接收到的消息顺序与调用顺序一致。
+    """
+
+    def __init__(self, sio: socketio.AsyncServer, lock: CooperativeLock):
+        self.sio = sio
+        self.lock = lock
+        self.async_mode = 'asgi'
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.executor = ThreadPoolExecutor(HANDLER_THREADS, thread_name_prefix='socketio-handler')
+        self._outbox: Optional[asyncio.Queue] = None
+        self.dropped = 0
+
+    @property
+    def manager(self):
+        return self.sio.manager
+
+    @property
+    def eio(self):
+        return self.sio.eio
+
+    def bind(self) -> None:
+        """在事件循环中调用，记录事件循环并启动发送任务"""
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+            self._outbox = asyncio.Queue()
+            self.loop.create_task(self._drain())
+
+    async def _drain(self) -> None:
+        while True:
+            operation, args, kwargs = await self._outbox.get()
+            try:
+                result = operation(*args, **kwargs)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Socket.IO 操作失败: {e}")
+
+    def _submit(self, operation: Callable, *args, **kwargs) -> None:
+        if self.loop is None:
+            self.dropped += 1
+            return
+        self.loop.call_soon_threadsafe(self._outbox.put_nowait, (operation, args, kwargs))
+
+    def run_sync(self, function: Callable, *args) -> 'asyncio.Future':
+        """在线程池中持协作锁执行同步函数"""
+        def locked():
+            with self.lock:
+                return function(*args)
+        return self.loop.run_in_executor(self.executor, locked)
+
+    # Flask-SocketIO 使用的 socketio.Server 接口
+    def emit(self, event, data=None, to=None, room=None, skip_sid=None, namespace=None,
+             callback=None, **kwargs):
+        if callback is not None:
+            original = callback
+            # 确认回调在事件循环中被调用，转回线程池执行应用代码
+            callback = lambda *args: self.run_sync(original, *args)  # noqa: E731
+        kwargs.pop('ignore_queue', None)
+        self._submit(self.sio.emit, event, data, to=to or room, skip_sid=skip_sid,
+                     namespace=namespace, callback=callback)
+
+    def send(self, data, to=None, room=None, skip_sid=None, namespace=None, callback=None, **kwargs):
+        self.emit('message', data, to=to, room=room, skip_sid=skip_sid, namespace=namespace,
+                  callback=callback)
+
+    def enter_room(self, sid, room, namespace=None):
+        self._submit(self.sio.enter_room, sid, room, namespace=namespace)
+
+    def leave_room(self, sid, room, namespace=None):
+        self._submit(self.sio.leave_room, sid, room, namespace=namespace)
+
+    def close_room(self, room, namespace=None):
+        self._submit(self.sio.close_room, room, namespace=namespace)
+
+    def rooms(self, sid, namespace=None):
+        return self.sio.rooms(sid, namespace=namespace)
+
+    def disconnect(self, sid, namespace=None, ignore_queue=False):
+        self._submit(self.sio.disconnect, sid, namespace=namespace)
+
+    def get_environ(self, sid, namespace=None):
+        return self.sio.get_environ(sid, namespace=namespace)
+
+    def start_background_task(self, target: Callable, *args, **kwargs) -> threading.Thread:
+        def run():
+            with self.lock:
+                target(*args, **kwargs)
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def sleep(self, seconds: float = 0) -> None:
+        self.lock.sleep(seconds)
+
+
+def register_handlers(flask_socketio, sio: socketio.AsyncServer, bridge: AsyncServerBridge) -> int:
+    """把 Flask-SocketIO 上注册的事件处理函数逐个挂到 AsyncServer 上，返回处理函数数"""
+    flask_app = flask_module.app
+    count = 0
+    for namespace, handlers in flask_socketio.server.handlers.items():
+        for event, handler in handlers.items():
+            count += 1
+            if event == 'connect':
+                async def on_connect(sid, environ, auth=None, handler=handler):
+                    # Flask-SocketIO 按 environ 建立请求上下文并读取会话
+                    environ['flask.app'] = flask_app
+                    environ.setdefault('wsgi.url_scheme', 'http')
+                    environ.setdefault('SERVER_NAME', 'localhost')
+                    environ.setdefault('SERVER_PORT', '80')
+                    return await bridge.run_sync(handler, sid, environ, auth)
+                sio.on('connect', on_connect, namespace=namespace)
+            else:
+                async def on_event(sid, *args, handler=handler):
+                    return await bridge.run_sync(handler, sid, *args)
+                sio.on(event, on_event, namespace=namespace)
+    return count
+
+
+def locked_wsgi(wsgi_app: Callable, lock: CooperativeLock) -> Callable:
+    """WSGI 应用持协作锁执行，流式响应逐块持锁生成"""
+    def wrapper(environ: Dict[str, Any], start_response: Callable):
+        with lock:
+            result = wsgi_app(environ, start_response)
+
+        def iterate():
+            iterator = iter(result)
+            try:
+                while True:
+                    with lock:
+                        try:
+                            chunk = next(iterator)
+                        except StopIteration:
+                            return
+                    yield chunk
+            finally:
+                if hasattr(result, 'close'):
+                    with lock:
+                        result.close()
+        return iterate()
+    return wrapper
+
+
+class ThreadPoolWsgiToAsgi(WsgiToAsgi):
+    """
+    在线程池中执行 WSGI 应用
+
+    asgiref 默认把所有请求放到同一个“线程敏感”执行器中，执行器状态会随上下文变量
+    带到其他请求里，偶发 “CurrentThreadExecutor already quit”；这里改用独立线程池。
+    """
+
+    def __init__(self, wsgi_application: Callable, executor: ThreadPoolExecutor):
+        super().__init__(wsgi_application)
+
+        class Instance(WsgiToAsgiInstance):
+            run_wsgi_app = sync_to_async(WsgiToAsgiInstance.__dict__['run_wsgi_app'].func,
+                                         thread_sensitive=False, executor=executor)
+        self.instance_class = Instance
+
+    async def __call__(self, scope, receive, send):
+        await self.instance_class(self.wsgi_application, self.duplicate_header_limit)(scope, receive, send)
+
+
+def create_application():
+    """创建 ASGI 应用"""
+    flask_socketio = flask_module.socketio
+    options = dict(flask_socketio.server_options)
+    options.pop('async_mode', None)
+    sio = socketio.AsyncServer(async_mode='asgi', **options)
+
+    lock = CooperativeLock()
+    bridge = AsyncServerBridge(sio, lock)
+    handlers = register_handlers(flask_socketio, sio, bridge)
+    flask_socketio.server = bridge
+
+    with lock:
+        flask_module.warm_caches()
+    http_executor = ThreadPoolExecutor(HANDLER_THREADS, thread_name_prefix='http-handler')
+    asgi_app = socketio.ASGIApp(sio, ThreadPoolWsgiToAsgi(locked_wsgi(flask_module.app, lock), http_executor))
+    logger.info("ASGI 模式: 已注册 %d 个 Socket.IO 事件处理函数", handlers)
+
+    async def application(scope, receive, send):
+        bridge.bind()
+        await asgi_app(scope, receive, send)
+
+    application.bridge = bridge
+    return application
+
+
+application = create_application()
@@ -0,0 +1,137 @@
+"""
+出站背压模块 - 按连接统计发送队列深度，处理慢速客户端
+"""
+import time
+import logging
+from typing import Dict, Any, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class OutboundManager:
+    """
+    按连接的出站队列管理
+
+    队列深度低于高水位时直接发送；超过高水位后：
+    - 同一行的状态更新只保留最新一条，等队列回落后再发送
+    - 整文档/增量文档推送替换为一个 resync_required 标记
+    - 持续积压超过 slow_timeout 秒的客户端被断开
+    """
+
+    def __init__(self, socketio, high_water: int, low_water: int, slow_timeout: float, flush_interval: float):
+        self.socketio = socketio
+        self.high_water = high_water
+        self.low_water = low_water
+        self.slow_timeout = slow_timeout
+        self.flush_interval = flush_interval
+        # sid -> {'rows': {(文件名, 行索引): (事件, 数据)}, 'resync': {文件名}, 'since': 开始积压的时间}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._started = False
+        self.coalesced = 0
+        self.resyncs = 0
+        self.disconnects = 0
+
+    def queue_depth(self, sid: str) -> int:
+        """连接在 Engine.IO 层尚未发出的数据包数"""
+        server = self.socketio.server
+        try:
+            eio_sid = server.manager.eio_sid_from_sid(sid, '/')
+            socket = server.eio.sockets.get(eio_sid)
+            return socket.queue.qsize() if socket else 0
+        except Exception:
+            return 0
+
+    def start(self) -> None:
+        """启动后台刷新任务（在工作进程中首次连接时调用）"""
+        if not self._started:
+            self._started = True
+            self.socketio.start_background_task(self._run)
+
+    def _run(self) -> None:
+        while True:
+            self.socketio.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"出站队列刷新失败: {e}")
+
+    def broadcast(self, event: str, payload: Dict[str, Any], members: Iterable[str],
+                  skip_sid: Optional[str] = None, kind: str = 'event') -> None:
+        """
+        向房间成员逐个发送
+
+        Args:
+            event: 事件名
+            payload: 事件数据
+            members: 房间成员的 sid
+            skip_sid: 不发送的 sid（通常是发起者）
+            kind: 'row' 单行更新（可合并），'document' 文档推送（积压时改为重新同步），'event' 其他小消息
+        """
+        for sid in list(members):
+            if sid != skip_sid:
+                self.send(sid, event, payload, kind)
+
+    def send(self, sid: str, event: str, payload: Dict[str, Any], kind: str = 'event') -> None:
+        """向单个连接发送，队列积压时合并或降级"""
+        pending = self._pending.get(sid)
+        if pending is None:
+            if kind == 'event' or self.queue_depth(sid) < self.high_water:
+                self.socketio.emit(event, payload, to=sid)
+                return
+            pending = self._pending[sid] = {'rows': {}, 'resync': set(), 'since': time.time()}
+            logger.warning(f"客户端 {sid} 发送队列超过高水位 {self.high_water}，开始合并推送")
+
+        filename = payload.get('filename')
+        if kind == 'document':
+            # 文档推送被一次重新同步取代，该文件已排队的行更新也不再需要
+            if filename not in pending['resync']:
+                pending['resync'].add(filename)
+                self.resyncs += 1
+            for key in [k for k in pending['rows'] if k[0] == filename]:
+                del pending['rows'][key]
+        elif kind == 'row':
+            if filename in pending['resync']:
+                self.coalesced += 1
+                return
+            key = (filename, payload.get('rowIndex'))
+            if key in pending['rows']:
+                self.coalesced += 1
+            pending['rows'][key] = (event, payload)
+        else:
+            self.socketio.emit(event, payload, to=sid)
+
+    def flush(self) -> None:
+        """队列回落到低水位的连接补发合并后的消息，长期积压的连接被断开"""
+        now = time.time()
+        for sid, pending in list(self._pending.items()):
+            if self.queue_depth(sid) > self.low_water:
+                if now - pending['since'] > self.slow_timeout:
+                    logger.warning(f"客户端 {sid} 持续积压超过 {self.slow_timeout} 秒，断开连接")
+                    self._pending.pop(sid, None)
+                    self.disconnects += 1
+                    self.socketio.server.disconnect(sid)
+                continue
+
+            del self._pending[sid]
+            for filename in pending['resync']:
+                self.socketio.emit('resync_required', {'filename': filename}, to=sid)
+            for event, payload in pending['rows'].values():
+                self.socketio.emit(event, payload, to=sid)
+
+    def forget(self, sid: str) -> None:
+        """连接断开时清理"""
+        self._pending.pop(sid, None)
+
+    def stats(self, sids: Iterable[str]) -> Dict[str, Any]:
+        """出站队列统计信息"""
+        depths = [self.queue_depth(sid) for sid in sids]
+        return {
+            'high_water': self.high_water,
+            'queued_packets': sum(depths),
+            'max_queue_depth': max(depths, default=0),
+            'backlogged_clients': len(self._pending),
+            'pending_rows': sum(len(p['rows']) for p in self._pending.values()),
+            'coalesced': self.coalesced,
+            'resyncs': self.resyncs,
+            'slow_disconnects': self.disconnects
+        }
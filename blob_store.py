@@ -0,0 +1,207 @@
+"""
+内容寻址存储模块 - 按 SHA-256 去重的上传文件存储与解析结果复用
+"""
+import os
+import json
+import fcntl
+import shutil
+import hashlib
+import logging
+import tempfile
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, BinaryIO, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 单次读取的字节数
+READ_BLOCK_SIZE = 64 * 1024
+
+# mkstemp 创建的文件权限为 0600，改为与普通 open() 一致的按 umask 计算的权限
+_umask = os.umask(0)
+os.umask(_umask)
+FILE_MODE = 0o666 & ~_umask
+
+
+class BlobStore:
+    """
+    内容寻址存储
+
+    上传内容按 SHA-256 存放在 blobs 目录中，上传目录中的文件名只是指向 blob 的
+    硬链接（文件系统不支持时退化为复制）。refs.json 记录 文件名 -> 内容哈希 的引用，
+    最后一个引用被释放时删除 blob。
+    """
+
+    def __init__(self, root: str, parse_cache_size: int = 64):
+        self.root = root
+        self.refs_path = os.path.join(root, 'refs.json')
+        self.lock_path = os.path.join(root, '.lock')
+        self.parse_cache_size = parse_cache_size
+        # 解析缓存键（以内容哈希开头）-> 解析后的数据（LRU）
+        self._parsed: 'OrderedDict[str, List[List[Any]]]' = OrderedDict()
+        self.dedup_hits = 0
+        self.dedup_bytes = 0
+        self.parse_hits = 0
+        self.parse_misses = 0
+
+    def blob_path(self, sha256: str) -> str:
+        """blob 文件路径"""
+        return os.path.join(self.root, sha256[:2], sha256)
+
+    @contextmanager
+    def _refs(self, write: bool = False):
+        """在文件锁保护下读取（和写回）引用表，多个工作进程共享"""
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.lock_path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX if write else fcntl.LOCK_SH)
+            try:
+                try:
+                    with open(self.refs_path, 'r', encoding='utf-8') as f:
+                        refs = json.load(f)
+                except (FileNotFoundError, json.JSONDecodeError):
+                    refs = {}
+                yield refs
+                if write:
+                    tmp_path = self.refs_path + '.tmp'
+                    with open(tmp_path, 'w', encoding='utf-8') as f:
+                        json.dump(refs, f, ensure_ascii=False)
+                    os.replace(tmp_path, self.refs_path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    @staticmethod
+    def hash_stream(stream: BinaryIO) -> str:
+        """计算数据流的 SHA-256"""
+        hasher = hashlib.sha256()
+        for block in iter(lambda: stream.read(READ_BLOCK_SIZE), b''):
+            hasher.update(block)
+        return hasher.hexdigest()
+
+    def store_stream(self, stream: BinaryIO, target_path: str) -> Tuple[str, bool]:
+        """
+        存储上传数据流并在目标位置建立引用
+
+        Args:
+            stream: 可 seek 的上传数据流
+            target_path: 上传目录中的文件路径
+
+        Returns:
+            (内容哈希, 是否命中已有内容)
+        """
+        sha256 = self.hash_stream(stream)
+        blob = self.blob_path(sha256)
+        deduped = os.path.exists(blob)
+        if not deduped:
+            stream.seek(0)
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            # 临时文件名唯一，多个工作进程同时写入相同内容时互不覆盖
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(blob), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                shutil.copyfileobj(stream, f, READ_BLOCK_SIZE)
+            os.chmod(tmp_path, FILE_MODE)
+            os.replace(tmp_path, blob)
+        self._link(sha256, target_path, deduped)
+        return sha256, deduped
+
+    def store_file(self, src_path: str, sha256: str, target_path: str) -> bool:
+        """存储已在磁盘上且哈希已知的文件（源文件会被移走或删除），返回是否命中已有内容"""
+        blob = self.blob_path(sha256)
+        deduped = os.path.exists(blob)
+        if deduped:
+            os.remove(src_path)
+        else:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            os.replace(src_path, blob)
+        self._link(sha256, target_path, deduped)
+        return deduped
+
+    def _link(self, sha256: str, target_path: str, deduped: bool) -> None:
+        """在上传目录中创建指向 blob 的文件名并登记引用"""
+        blob = self.blob_path(sha256)
+        filename = os.path.basename(target_path)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target_path), suffix='.link.tmp')
+        os.close(fd)
+        try:
+            # 硬链接不能覆盖已存在的路径，先删除占位文件（文件名唯一，不会与其他进程冲突）
+            os.remove(tmp_path)
+            os.link(blob, tmp_path)
+        except OSError:
+            shutil.copyfile(blob, tmp_path)
+            os.chmod(tmp_path, FILE_MODE)
+        os.replace(tmp_path, target_path)
+
+        with self._refs(write=True) as refs:
+            old = refs.get(filename)
+            refs[filename] = {'sha256': sha256, 'mtime_ns': os.stat(target_path).st_mtime_ns}
+            if old and old['sha256'] != sha256:
+                self._collect(old['sha256'], refs)
+
+        if deduped:
+            self.dedup_hits += 1
+            self.dedup_bytes += os.path.getsize(blob)
+            logger.info(f"上传内容已存在，复用 blob {sha256[:12]}: {filename}")
+
+    def _collect(self, sha256: str, refs: Dict[str, Any]) -> None:
+        """没有引用时删除 blob（调用方需持有写锁）"""
+        if any(ref['sha256'] == sha256 for ref in refs.values()):
+            return
+        try:
+            os.remove(self.blob_path(sha256))
+            logger.info(f"删除无引用的 blob {sha256[:12]}")
+        except FileNotFoundError:
+            pass
+        for key in [key for key in self._parsed if key.split(':', 1)[0] == sha256]:
+            del self._parsed[key]
+
+    def release(self, filename: str) -> None:
+        """释放文件名对 blob 的引用（文件被删除或被改写时调用）"""
+        with self._refs(write=True) as refs:
+            old = refs.pop(filename, None)
+            if old:
+                self._collect(old['sha256'], refs)
+
+    def content_hash(self, filename: str, filepath: str) -> Optional[str]:
+        """返回文件名当前引用的内容哈希，文件已被改写时返回 None"""
+        with self._refs() as refs:
+            ref = refs.get(filename)
+        if not ref:
+            return None
+        try:
+            if os.stat(filepath).st_mtime_ns != ref['mtime_ns']:
+                return None
+        except OSError:
+            return None
+        return ref['sha256']
+
+    def get_parsed(self, key: Optional[str]) -> Optional[List[List[Any]]]:
+        """获取缓存的解析结果（调用方不得修改返回的数据）"""
+        if key and key in self._parsed:
+            self._parsed.move_to_end(key)
+            self.parse_hits += 1
+            return self._parsed[key]
+        self.parse_misses += 1
+        return None
+
+    def put_parsed(self, key: Optional[str], data: List[List[Any]]) -> None:
+        """缓存解析结果，键以内容哈希开头，后接影响解析结果的配置标识"""
+        if not key or self.parse_cache_size <= 0:
+            return
+        self._parsed[key] = data
+        self._parsed.move_to_end(key)
+        while len(self._parsed) > self.parse_cache_size:
+            self._parsed.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """存储统计信息"""
+        with self._refs() as refs:
+            blobs = len({ref['sha256'] for ref in refs.values()})
+            references = len(refs)
+        return {
+            'blobs': blobs,
+            'references': references,
+            'dedup_hits': self.dedup_hits,
+            'dedup_bytes': self.dedup_bytes,
+            'parsed_cached': len(self._parsed),
+            'parse_hits': self.parse_hits,
+            'parse_misses': self.parse_misses
+        }
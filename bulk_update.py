@@ -0,0 +1,155 @@
+"""
+批量状态更新模块 - 按条件一次选出文档中的行，并以游程/位图紧凑编码广播选中的行
+"""
+import base64
+import logging
+from typing import Dict, List, Any, Optional
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 为可选依赖，缺失时使用纯 Python 实现
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# 支持的条件字段
+PREDICATE_FIELDS = ('name', 'pattern', 'status', 'min_quantity', 'max_quantity')
+# 通配符模式长度上限
+MAX_PATTERN_LENGTH = 200
+
+
+def compile_predicate(spec: Any) -> Dict[str, Any]:
+    """
+    校验并编译筛选条件
+
+    Args:
+        spec: {'name': 名称包含的文字（忽略大小写）, 'pattern': 名称匹配的通配符模式（* 匹配任意文字，忽略大小写）,
+               'status': 当前状态（字符串或列表）, 'min_quantity': 最小数量, 'max_quantity': 最大数量}
+            至少给出一项，多项之间为“且”
+
+    Raises:
+        ValueError: 条件无效
+    """
+    if not isinstance(spec, dict):
+        raise ValueError('筛选条件应为对象')
+    unknown = set(spec) - set(PREDICATE_FIELDS)
+    if unknown:
+        raise ValueError(f'不支持的筛选条件: {", ".join(sorted(unknown))}')
+
+    predicate: Dict[str, Any] = {}
+    if spec.get('name'):
+        predicate['name'] = str(spec['name']).casefold()
+    if spec.get('pattern'):
+        if len(str(spec['pattern'])) > MAX_PATTERN_LENGTH:
+            raise ValueError(f'模式过长（上限 {MAX_PATTERN_LENGTH} 个字符）')
+        # 不接受客户端正则（回溯可能耗尽 CPU），模式按 * 拆成依次查找的文字片段
+        predicate['pattern'] = str(spec['pattern']).casefold().split('*')
+    if spec.get('status'):
+        statuses = spec['status'] if isinstance(spec['status'], list) else [spec['status']]
+        predicate['status'] = {str(status) for status in statuses}
+    for key in ('min_quantity', 'max_quantity'):
+        if spec.get(key) is not None:
+            try:
+                predicate[key] = int(spec[key])
+            except (ValueError, TypeError):
+                raise ValueError(f'{key} 应为整数')
+    if not predicate:
+        raise ValueError('至少需要一个筛选条件')
+    return predicate
+
+
+def _status(row: List[Any]) -> str:
+    return row[5] if len(row) > 5 and row[5] else '未完成'
+
+
+def _quantity(row: List[Any]) -> Optional[int]:
+    try:
+        return int(row[1])
+    except (IndexError, ValueError, TypeError):
+        return None
+
+
+def _match_pattern(parts: List[str], name: str) -> bool:
+    """名称是否匹配按 * 拆分的模式（整体匹配，从左到右依次查找，耗时与名称长度成正比）"""
+    if len(parts) == 1:
+        return name == parts[0]
+    head, tail = parts[0], parts[-1]
+    if len(name) < len(head) + len(tail) or not name.startswith(head) or not name.endswith(tail):
+        return False
+    position, end = len(head), len(name) - len(tail)
+    for part in parts[1:-1]:
+        position = name.find(part, position, end)
+        if position < 0:
+            return False
+        position += len(part)
+    return True
+
+
+def match_rows(rows: List[List[Any]], predicate: Dict[str, Any], new_status: str) -> List[int]:
+    """
+    选出满足条件且状态需要改变的行
+
+    Args:
+        rows: [名称, 数量, 盒, 组, 个, 状态] 格式的数据行
+        predicate: compile_predicate 的结果
+        new_status: 目标状态，已是该状态的行不计入
+
+    Returns:
+        按顺序排列的行索引
+    """
+    # 行数据是 Python 列表，逐列构造 NumPy 数组的开销超过掩码运算节省的时间，
+    # 所以在一次遍历中按由廉价到昂贵的顺序检查条件
+    name_part = predicate.get('name')
+    pattern = predicate.get('pattern')
+    statuses = predicate.get('status')
+    min_quantity = predicate.get('min_quantity')
+    max_quantity = predicate.get('max_quantity')
+    check_quantity = min_quantity is not None or max_quantity is not None
+
+    indexes = []
+    for index, row in enumerate(rows):
+        status = _status(row)
+        if status == new_status or (statuses is not None and status not in statuses):
+            continue
+        if check_quantity:
+            quantity = _quantity(row)
+            if quantity is None or (min_quantity is not None and quantity < min_quantity) or \
+                    (max_quantity is not None and quantity > max_quantity):
+                continue
+        if name_part is not None or pattern is not None:
+            name = (str(row[0]) if row else '').casefold()
+            if (name_part is not None and name_part not in name) or \
+                    (pattern is not None and not _match_pattern(pattern, name)):
+                continue
+        indexes.append(index)
+    return indexes
+
+
+def encode_selection(indexes: List[int], total: int) -> Dict[str, Any]:
+    """
+    行索引的紧凑编码，取两种方式中较短的一种
+
+    Returns:
+        {'runs': [[起始行, 行数], ...]} 或 {'bitmap': base64 位图（第 i 行对应第 i // 8 字节的第 i % 8 位）}
+    """
+    runs: List[List[int]] = []
+    for index in indexes:
+        if runs and runs[-1][0] + runs[-1][1] == index:
+            runs[-1][1] += 1
+        else:
+            runs.append([index, 1])
+
+    # 游程按 JSON 中每段约 12 个字符估算，位图按 base64 后的长度计算
+    if len(runs) * 12 <= (total + 7) // 8 * 4 // 3 + 4:
+        return {'runs': runs}
+    if np is not None:
+        mask = np.zeros(total, dtype=bool)
+        mask[indexes] = True
+        bitmap = np.packbits(mask, bitorder='little').tobytes()
+    else:
+        buffer = bytearray((total + 7) // 8)
+        for index in indexes:
+            buffer[index >> 3] |= 1 << (index & 7)
+        bitmap = bytes(buffer)
+    return {'bitmap': base64.b64encode(bitmap).decode('ascii')}
+
@@ -0,0 +1,231 @@
+"""
+分块上传模块 - 可断点续传、流式写盘的上传协议
+"""
+import os
+import json
+import time
+import uuid
+import fcntl
+import hashlib
+import logging
+from contextlib import contextmanager
+from typing import Dict, Any, BinaryIO, Callable, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 单次从请求流读取的字节数
+READ_BLOCK_SIZE = 64 * 1024
+
+
+class ChunkedUploadError(Exception):
+    """分块上传错误，附带 HTTP 状态码"""
+
+    def __init__(self, message: str, status: int = 400, **extra):
+        super().__init__(message)
+        self.status = status
+        self.extra = extra
+
+
+class ChunkedUploadManager:
+    """分块上传管理器：init -> put chunk (offset) -> finalize"""
+
+    def __init__(self, temp_folder: str, max_size: int, ttl: int):
+        self.temp_folder = temp_folder
+        self.max_size = max_size
+        self.ttl = ttl
+        # upload_id -> (运行中的 SHA-256 对象, 已计入哈希的字节数)；进程内缓存，
+        # 分块可能落在不同工作进程上，与临时文件大小不一致时从文件补算
+        self._hashers: Dict[str, Tuple[Any, int]] = {}
+
+    def _paths(self, upload_id: str) -> Tuple[str, str]:
+        """临时数据文件和元数据文件路径"""
+        if not upload_id or not all(c in '0123456789abcdef' for c in upload_id):
+            raise ChunkedUploadError('上传ID无效', 404)
+        base = os.path.join(self.temp_folder, upload_id)
+        return base + '.part', base + '.json'
+
+    def _load_meta(self, upload_id: str, owner: Optional[str]) -> Dict[str, Any]:
+        _, meta_path = self._paths(upload_id)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            raise ChunkedUploadError('上传会话不存在或已过期', 404)
+        if meta.get('owner') != owner:
+            raise ChunkedUploadError('无权访问该上传会话', 403)
+        return meta
+
+    def _save_meta(self, upload_id: str, meta: Dict[str, Any]) -> None:
+        _, meta_path = self._paths(upload_id)
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+    @contextmanager
+    def _locked_part(self, part_path: str) -> Iterator[BinaryIO]:
+        """
+        独占打开临时数据文件（非阻塞文件锁，跨工作进程有效）
+
+        偏移量检查、写入和哈希状态更新都在锁内完成；客户端重试与仍在写入的同一
+        会话请求重叠时，后到的请求返回 423，由客户端稍后重试
+        """
+        try:
+            f = open(part_path, 'r+b')
+        except FileNotFoundError:
+            raise ChunkedUploadError('上传会话不存在或已过期', 404)
+        try:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise ChunkedUploadError('该上传会话有分块正在写入，请稍后重试', 423)
+            yield f
+        finally:
+            f.close()
+
+    def _hasher(self, upload_id: str, part_path: str):
+        """
+        获取覆盖整个临时文件的哈希对象
+
+        其他工作进程追加过分块时只补算缓存之后的部分；没有缓存或文件被截断时从头计算
+        """
+        size = os.path.getsize(part_path)
+        hasher, hashed = self._hashers.get(upload_id, (None, 0))
+        if hasher is None or hashed > size:
+            hasher, hashed = hashlib.sha256(), 0
+        if hashed < size:
+            with open(part_path, 'rb') as f:
+                f.seek(hashed)
+                for block in iter(lambda: f.read(READ_BLOCK_SIZE), b''):
+                    hasher.update(block)
+                    hashed += len(block)
+        self._hashers[upload_id] = (hasher, hashed)
+        return hasher
+
+    def cleanup_expired(self) -> int:
+        """删除超过有效期的上传会话"""
+        removed = 0
+        if not os.path.exists(self.temp_folder):
+            return removed
+        now = time.time()
+        for name in os.listdir(self.temp_folder):
+            path = os.path.join(self.temp_folder, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl:
+                    os.remove(path)
+                    self._hashers.pop(name.rsplit('.', 1)[0], None)
+                    removed += 1
+            except OSError:
+                continue
+        if removed:
+            logger.info(f"清理过期分块上传文件 {removed} 个")
+        return removed
+
+    def init(self, filename: str, size: int, sha256: Optional[str], owner: Optional[str]) -> Dict[str, Any]:
+        """创建上传会话"""
+        if size < 0 or size > self.max_size:
+            raise ChunkedUploadError(f'文件大小超出限制 ({self.max_size} 字节)', 413)
+
+        os.makedirs(self.temp_folder, exist_ok=True)
+        self.cleanup_expired()
+
+        upload_id = uuid.uuid4().hex
+        part_path, _ = self._paths(upload_id)
+        open(part_path, 'wb').close()
+        meta = {
+            'filename': filename,
+            'size': size,
+            'sha256': (sha256 or '').lower() or None,
+            'owner': owner,
+            'created_at': time.time()
+        }
+        self._save_meta(upload_id, meta)
+        self._hashers[upload_id] = (hashlib.sha256(), 0)
+        logger.info(f"创建分块上传会话 {upload_id}: {filename}, {size} 字节")
+        return {'upload_id': upload_id, 'offset': 0, 'size': size}
+
+    def status(self, upload_id: str, owner: Optional[str]) -> Dict[str, Any]:
+        """查询已接收的字节数，用于断点续传（只有创建者可以访问）"""
+        meta = self._load_meta(upload_id, owner)
+        part_path, _ = self._paths(upload_id)
+        return {
+            'upload_id': upload_id,
+            'filename': meta['filename'],
+            'offset': os.path.getsize(part_path),
+            'size': meta['size']
+        }
+
+    def put_chunk(self, upload_id: str, offset: int, stream: BinaryIO, owner: Optional[str]) -> int:
+        """
+        追加一个分块
+
+        Args:
+            upload_id: 上传会话ID
+            offset: 该分块在文件中的起始位置，必须等于已接收的字节数
+            stream: 请求体数据流
+            owner: 当前用户，必须是会话的创建者
+
+        Returns:
+            追加后的已接收字节数
+        """
+        meta = self._load_meta(upload_id, owner)
+        part_path, meta_path = self._paths(upload_id)
+        with self._locked_part(part_path) as f:
+            received = os.fstat(f.fileno()).st_size
+            if offset != received:
+                raise ChunkedUploadError('分块偏移量不匹配', 409, offset=received)
+
+            hasher = self._hasher(upload_id, part_path)
+            f.seek(received)
+            for block in iter(lambda: stream.read(READ_BLOCK_SIZE), b''):
+                received += len(block)
+                if received > meta['size']:
+                    # 截断到写入前的位置，并丢弃已被污染的哈希状态
+                    f.truncate(offset)
+                    self._hashers.pop(upload_id, None)
+                    raise ChunkedUploadError('分块数据超出声明的文件大小', 413, offset=offset)
+                f.write(block)
+                hasher.update(block)
+            f.flush()
+            self._hashers[upload_id] = (hasher, received)
+        # 刷新会话时间，避免进行中的上传被当作过期清理
+        os.utime(part_path)
+        os.utime(meta_path)
+        return received
+
+    def finalize(self, upload_id: str, store: Callable[[str, str], Any], owner: Optional[str],
+                 sha256: Optional[str] = None) -> Dict[str, Any]:
+        """
+        校验大小和哈希后交付文件
+
+        Args:
+            upload_id: 上传会话ID
+            store: 接收已校验文件的函数 (临时文件路径, SHA-256)，负责移走该文件
+            owner: 当前用户，必须是会话的创建者
+            sha256: 可选，客户端在完成时提供的期望哈希
+        """
+        meta = self._load_meta(upload_id, owner)
+        part_path, meta_path = self._paths(upload_id)
+        with self._locked_part(part_path) as f:
+            received = os.fstat(f.fileno()).st_size
+            if received != meta['size']:
+                raise ChunkedUploadError('文件尚未上传完整', 409, offset=received)
+            digest = self._hasher(upload_id, part_path).hexdigest()
+
+        expected = (sha256 or '').lower() or meta.get('sha256')
+        if expected and expected != digest:
+            self.abort(upload_id)
+            raise ChunkedUploadError('文件校验失败，SHA-256 不匹配', 422, sha256=digest)
+
+        store(part_path, digest)
+        os.remove(meta_path)
+        self._hashers.pop(upload_id, None)
+        logger.info(f"分块上传完成 {upload_id}: {meta['filename']}, {received} 字节, sha256={digest}")
+        return {'filename': meta['filename'], 'size': received, 'sha256': digest}
+
+    def abort(self, upload_id: str) -> None:
+        """放弃上传会话"""
+        self._hashers.pop(upload_id, None)
+        for path in self._paths(upload_id):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
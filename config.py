@@ -14,7 +14,7 @@ class Config:
     MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))
     
     # 文件配置
-    ALLOWED_EXTENSIONS = {'csv', 'sti'}
+    ALLOWED_EXTENSIONS = {'csv', 'sti', 'litematic'}
     SUPPORTED_ENCODINGS = ['utf-8', 'gbk', 'gb2312', 'utf-16', 'latin-1']
     
     # 业务逻辑配置
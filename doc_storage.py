@@ -0,0 +1,169 @@
+"""
+文档存储模块 - 可选 gzip/lzma 压缩的 .sti 写入与按魔数识别格式的读取
+
+批量迁移已有文件:
+    python doc_storage.py migrate [上传目录] --mode gzip
+"""
+import io
+import os
+import sys
+import gzip
+import lzma
+import json
+import time
+import logging
+import argparse
+from typing import Dict, List, Any, Optional, TextIO
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_MODES = ('none', 'gzip', 'lzma')
+
+GZIP_MAGIC = b'\x1f\x8b'
+LZMA_MAGIC = b'\xfd7zXZ\x00'
+
+
+def detect_compression(filepath: str) -> Optional[str]:
+    """按文件头魔数识别压缩格式，未压缩时返回 None"""
+    with open(filepath, 'rb') as f:
+        head = f.read(len(LZMA_MAGIC))
+    if head.startswith(GZIP_MAGIC):
+        return 'gzip'
+    if head.startswith(LZMA_MAGIC):
+        return 'lzma'
+    return None
+
+
+def open_document(filepath: str, encoding: str = 'utf-8', newline: Optional[str] = None) -> TextIO:
+    """以文本方式打开文档，压缩文件透明解压"""
+    compression = detect_compression(filepath)
+    if compression == 'gzip':
+        return io.TextIOWrapper(gzip.open(filepath, 'rb'), encoding=encoding, newline=newline)
+    if compression == 'lzma':
+        return io.TextIOWrapper(lzma.open(filepath, 'rb'), encoding=encoding, newline=newline)
+    return open(filepath, 'r', encoding=encoding, newline=newline)
+
+
+class DocumentStorage:
+    """材料清单文档写入器"""
+
+    def __init__(self, mode: str = 'none', level: Optional[int] = None):
+        """
+        Args:
+            mode: 'none' 保持原有的缩进 JSON，'gzip' 或 'lzma' 压缩紧凑 JSON
+            level: 压缩级别，默认 gzip 为 6、lzma 为 preset 6
+        """
+        if mode not in COMPRESSION_MODES:
+            raise ValueError(f'不支持的压缩模式: {mode}')
+        self.mode = mode
+        self.level = level
+        self.writes = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        self.compress_ms = 0.0
+
+    def encode(self, data: List[List[Any]]) -> bytes:
+        """将数据行编码为存储格式的字节"""
+        if self.mode == 'none':
+            return json.dumps(data, ensure_ascii=False, indent=4).encode('utf-8')
+
+        raw = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        started = time.perf_counter()
+        if self.mode == 'gzip':
+            encoded = gzip.compress(raw, compresslevel=6 if self.level is None else self.level, mtime=0)
+        else:
+            encoded = lzma.compress(raw, preset=6 if self.level is None else self.level)
+        self.compress_ms += (time.perf_counter() - started) * 1000
+        self.raw_bytes += len(raw)
+        self.stored_bytes += len(encoded)
+        return encoded
+
+    def write(self, filepath: str, data: List[List[Any]]) -> int:
+        """
+        写入文件数据（先写临时文件再替换，不会写穿共享内容的硬链接）
+
+        Returns:
+            写入的字节数
+        """
+        encoded = self.encode(data)
+        tmp_path = filepath + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(encoded)
+        os.replace(tmp_path, filepath)
+        self.writes += 1
+        return len(encoded)
+
+    def stats(self) -> Dict[str, Any]:
+        """压缩统计信息（仅统计压缩模式的写入）"""
+        return {
+            'mode': self.mode,
+            'writes': self.writes,
+            'raw_bytes': self.raw_bytes,
+            'stored_bytes': self.stored_bytes,
+            'bytes_saved': self.raw_bytes - self.stored_bytes,
+            'compress_ms': round(self.compress_ms, 1)
+        }
+
+
+def migrate_folder(folder: str, storage: DocumentStorage, on_rewrite=None) -> Dict[str, int]:
+    """
+    将目录中的 .sti 文件改写为指定的存储格式
+
+    Args:
+        folder: 上传目录
+        storage: 目标格式的写入器
+        on_rewrite: 可选，每个文件改写后以文件名调用（用于释放内容寻址引用等）
+
+    Returns:
+        迁移统计
+    """
+    target = None if storage.mode == 'none' else storage.mode
+    result = {'migrated': 0, 'skipped': 0, 'failed': 0, 'bytes_before': 0, 'bytes_after': 0}
+    for filename in sorted(os.listdir(folder)):
+        filepath = os.path.join(folder, filename)
+        if not filename.endswith('.sti') or not os.path.isfile(filepath):
+            continue
+        try:
+            if detect_compression(filepath) == target:
+                result['skipped'] += 1
+                continue
+            with open_document(filepath) as f:
+                data = json.load(f)
+            size_before = os.path.getsize(filepath)
+            size_after = storage.write(filepath, data)
+        except (OSError, ValueError, EOFError, lzma.LZMAError) as e:
+            logger.error("迁移文件 %s 失败: %s", filename, e)
+            result['failed'] += 1
+            continue
+        if on_rewrite:
+            on_rewrite(filename)
+        result['migrated'] += 1
+        result['bytes_before'] += size_before
+        result['bytes_after'] += size_after
+        logger.info("迁移 %s: %d -> %d 字节", filename, size_before, size_after)
+    return result
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='材料清单文档存储工具')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    migrate = subparsers.add_parser('migrate', help='将已有的 .sti 文件改写为指定的存储格式')
+    migrate.add_argument('folder', nargs='?', default=os.environ.get('UPLOAD_FOLDER', 'uploads'))
+    migrate.add_argument('--mode', choices=COMPRESSION_MODES,
+                         default=os.environ.get('STORAGE_COMPRESSION', 'gzip'))
+    migrate.add_argument('--level', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    from blob_store import BlobStore
+    blob_store = BlobStore(os.path.join(args.folder, '.blobs'))
+
+    storage = DocumentStorage(args.mode, args.level)
+    result = migrate_folder(args.folder, storage, blob_store.release)
+    result.update(compress_ms=round(storage.compress_ms, 1))
+    print(json.dumps(result, ensure_ascii=False))
+    return 1 if result['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
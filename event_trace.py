@@ -0,0 +1,326 @@
+"""
+Socket.IO 事件追踪模块 - 录制真实协作中的入站事件，并在本地服务器上按原节奏回放
+
+录制: 设置 TRACE_ENABLED=true，每个工作进程在 TRACE_FOLDER 下写一个 .jsonl.gz 追踪文件
+回放:
+    python event_trace.py replay 追踪文件 [--url http://localhost:5000] [--speed 4]
+    python event_trace.py info 追踪文件
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import atexit
+import logging
+import argparse
+import threading
+from typing import Dict, List, Any, Iterator, Optional
+
+from logging_setup import original_module
+
+logger = logging.getLogger(__name__)
+
+# 会被匿名化的字段
+ANONYMIZED_FIELDS = ('username', 'filename')
+
+
+class TraceRecorder:
+    """
+    入站事件录制器
+
+    每行一个事件: {"t": 相对开始的秒数, "c": 连接序号, "e": 事件名, "d": 事件数据}。
+    连接 ID 按出现顺序映射为整数；开启匿名化时用户名和文件名替换为稳定的编号。
+
+    事件经队列交给系统线程写出，不在 eventlet 事件循环里压缩和写盘；写线程每隔
+    flush_interval 秒把积累的事件作为一个完整的 gzip 成员追加到文件并关闭，
+    工作进程被强制结束时最多丢失最后一个周期的事件，已写出的部分仍可读取。
+    """
+
+    def __init__(self, folder: str, enabled: bool = False, anonymize: bool = True,
+                 flush_interval: float = 5.0, queue_size: int = 10000):
+        self.folder = folder
+        self.enabled = enabled
+        self.anonymize = anonymize
+        self.flush_interval = max(0.1, flush_interval)
+        self.queue_size = queue_size
+        self.path = None
+        self._queue = None
+        self._writer = None
+        self._started = 0.0
+        self._clients: Dict[str, int] = {}
+        self._next_client = 0
+        self._aliases: Dict[str, Dict[str, str]] = {field: {} for field in ANONYMIZED_FIELDS}
+        self.events = 0
+        self.dropped = 0
+        self.written = 0
+
+    def _open(self) -> None:
+        os.makedirs(self.folder, exist_ok=True)
+        name = f"trace-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.jsonl.gz"
+        self.path = os.path.join(self.folder, name)
+        self._started = time.monotonic()
+        self._queue = original_module('queue').Queue(self.queue_size)
+        native_threading = original_module('threading')
+        self._writer = native_threading.Thread(target=self._write_loop, name='trace-writer', daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+        logger.info("开始录制 Socket.IO 事件: %s", self.path)
+
+    def _write_loop(self) -> None:
+        """写线程: 按周期把队列中的事件追加为一个 gzip 成员，收到 None 时写出剩余事件后退出"""
+        empty = original_module('queue').Empty
+        pending: List[str] = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                line = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except empty:
+                line = ''
+            if line is None:
+                self._flush(pending)
+                return
+            if line:
+                pending.append(line)
+            if time.monotonic() >= deadline:
+                self._flush(pending)
+                pending = []
+                deadline = time.monotonic() + self.flush_interval
+
+    def _flush(self, lines: List[str]) -> None:
+        if not lines:
+            return
+        try:
+            with gzip.open(self.path, 'at', encoding='utf-8') as f:
+                f.write(''.join(lines))
+            self.written += len(lines)
+        except OSError as e:
+            logger.error("写入追踪文件失败: %s", e)
+
+    def _alias(self, field: str, value: Any) -> Any:
+        if not isinstance(value, str):
+            return value
+        aliases = self._aliases[field]
+        if value not in aliases:
+            aliases[value] = f'{field}{len(aliases) + 1}'
+            # 保留扩展名，回放时服务器按扩展名处理文件
+            if field == 'filename' and '.' in value:
+                aliases[value] += value[value.rindex('.'):]
+        return aliases[value]
+
+    def record(self, sid: str, event: str, data: Any = None) -> None:
+        """记录一个入站事件（只入队，不阻塞调用方）"""
+        if not self.enabled:
+            return
+        if self._queue is None:
+            self._open()
+
+        client = self._clients.get(sid)
+        if client is None:
+            self._next_client += 1
+            client = self._clients[sid] = self._next_client
+        if self.anonymize and isinstance(data, dict):
+            data = {key: self._alias(key, value) if key in ANONYMIZED_FIELDS else value
+                    for key, value in data.items()}
+
+        entry = {'t': round(time.monotonic() - self._started, 4), 'c': client, 'e': event}
+        if data is not None:
+            entry['d'] = data
+        try:
+            self._queue.put_nowait(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n')
+            self.events += 1
+        except original_module('queue').Full:
+            self.dropped += 1
+        if event == 'disconnect':
+            self._clients.pop(sid, None)
+
+    def close(self) -> None:
+        """结束录制，等待写线程写出剩余事件"""
+        self.enabled = False
+        if self._queue is not None:
+            self._queue.put(None)
+            self._writer.join(self.flush_interval + 5)
+            self._queue = None
+            self._writer = None
+
+    def stats(self) -> Dict[str, Any]:
+        """录制统计信息"""
+        return {
+            'enabled': self.enabled,
+            'events': self.events,
+            'written': self.written,
+            'dropped': self.dropped,
+            'path': self.path
+        }
+
+
+def load_trace(path: str) -> List[Dict[str, Any]]:
+    """读取追踪文件（按时间排序）"""
+    opener = gzip.open if path.endswith('.gz') else open
+    events = []
+    with opener(path, 'rt', encoding='utf-8') as f:
+        try:
+            for line in f:
+                if line.strip():
+                    events.append(json.loads(line))
+        except (EOFError, ValueError) as e:
+            # 工作进程被强制结束时最后一个 gzip 成员可能不完整，保留之前已完整写出的事件
+            logger.warning("追踪文件末尾不完整，已读取 %d 个事件: %s", len(events), e)
+    events.sort(key=lambda entry: entry['t'])
+    return events
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """已排序列表的分位数"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def summarize(events: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """追踪文件概况"""
+    counts: Dict[str, int] = {}
+    for entry in events:
+        counts[entry['e']] = counts.get(entry['e'], 0) + 1
+    return {
+        'events': len(events),
+        'clients': len({entry['c'] for entry in events}),
+        'duration': events[-1]['t'] if events else 0,
+        'by_event': counts
+    }
+
+
+class TraceReplayer:
+    """
+    按追踪文件的时间线驱动本地服务器
+
+    每个录制的连接对应一个 Socket.IO 客户端线程，连接内的事件严格按录制顺序发送；
+    事件以带确认的方式发送，延迟为发出到服务器处理完成的往返时间。
+    """
+
+    def __init__(self, url: str, speed: float = 1.0, timeout: float = 30):
+        self.url = url
+        self.speed = speed
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {}
+        self.lag: List[float] = []
+        self.errors: Dict[str, int] = {}
+
+    def _client_events(self, events: List[Dict[str, Any]]) -> Iterator[List[Dict[str, Any]]]:
+        """按连接拆分事件，同一序号的连接断开后再出现视为新连接"""
+        sessions: Dict[int, List[Dict[str, Any]]] = {}
+        for entry in events:
+            sessions.setdefault(entry['c'], []).append(entry)
+            if entry['e'] == 'disconnect':
+                yield sessions.pop(entry['c'])
+        yield from sessions.values()
+
+    def _run_client(self, entries: List[Dict[str, Any]], started: float) -> None:
+        import socketio
+
+        client = socketio.Client(reconnection=False)
+        try:
+            for entry in entries:
+                delay = started + entry['t'] / self.speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                self._add('lag', None, max(0.0, -delay))
+
+                event = entry['e']
+                began = time.monotonic()
+                try:
+                    if event == 'connect':
+                        client.connect(self.url, wait_timeout=self.timeout)
+                    elif event == 'disconnect':
+                        client.disconnect()
+                    else:
+                        # 录制开始前已建立的连接没有 connect 事件
+                        if not client.connected:
+                            client.connect(self.url, wait_timeout=self.timeout)
+                        client.call(event, entry.get('d'), timeout=self.timeout)
+                except Exception as e:
+                    self._add('error', event, 0)
+                    logger.debug("回放事件 %s 失败: %s", event, e)
+                    continue
+                self._add('latency', event, time.monotonic() - began)
+        finally:
+            if client.connected:
+                client.disconnect()
+
+    def _add(self, kind: str, event: Optional[str], value: float) -> None:
+        with self._lock:
+            if kind == 'lag':
+                self.lag.append(value)
+            elif kind == 'error':
+                self.errors[event] = self.errors.get(event, 0) + 1
+            else:
+                self.latencies.setdefault(event, []).append(value)
+
+    def replay(self, events: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """回放并返回吞吐量与延迟报告"""
+        started = time.monotonic() + 0.5
+        threads = [
+            threading.Thread(target=self._run_client, args=(entries, started), daemon=True)
+            for entries in self._client_events(events)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        report = {
+            'url': self.url,
+            'speed': self.speed,
+            'clients': len(threads),
+            'events': sum(len(values) for values in self.latencies.values()),
+            'errors': dict(self.errors),
+            'elapsed': round(elapsed, 3),
+            'throughput': round(sum(len(v) for v in self.latencies.values()) / elapsed, 1) if elapsed > 0 else 0,
+            'schedule_lag_p95_ms': round(percentile(sorted(self.lag), 0.95) * 1000, 2),
+            'latency_ms': {}
+        }
+        for event, values in sorted(self.latencies.items()):
+            values.sort()
+            report['latency_ms'][event] = {
+                'count': len(values),
+                'p50': round(percentile(values, 0.5) * 1000, 2),
+                'p95': round(percentile(values, 0.95) * 1000, 2),
+                'p99': round(percentile(values, 0.99) * 1000, 2),
+                'max': round(values[-1] * 1000, 2)
+            }
+        return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Socket.IO 事件追踪工具')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    info = subparsers.add_parser('info', help='查看追踪文件概况')
+    info.add_argument('trace')
+    replay = subparsers.add_parser('replay', help='在本地服务器上回放追踪文件')
+    replay.add_argument('trace')
+    replay.add_argument('--url', default='http://localhost:5000')
+    replay.add_argument('--speed', type=float, default=1.0, help='回放倍速，例如 4 表示 4 倍速')
+    replay.add_argument('--timeout', type=float, default=30)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    events = load_trace(args.trace)
+    if args.command == 'info':
+        print(json.dumps(summarize(events), ensure_ascii=False, indent=2))
+        return 0
+
+    try:
+        import socketio  # noqa: F401
+        import requests  # noqa: F401
+    except ImportError:
+        print('回放需要 Socket.IO 客户端: pip install "python-socketio[client]"', file=sys.stderr)
+        return 2
+    report = TraceReplayer(args.url, args.speed, args.timeout).replay(events)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 1 if report['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
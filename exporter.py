@@ -0,0 +1,72 @@
+"""
+数据导出模块 - 材料清单的流式 CSV / JSON Lines 导出
+"""
+import io
+import csv
+import json
+from typing import List, Any, Iterable, Iterator, Optional, Set
+
+# 导出 CSV 的表头
+CSV_HEADER = ['名称', '数量', '盒', '组', '个', '状态']
+
+# 单次输出的缓冲字节数
+FLUSH_SIZE = 64 * 1024
+
+
+class RowExporter:
+    """材料清单导出工具类"""
+
+    @staticmethod
+    def filter_rows(rows: Iterable[List[Any]], statuses: Optional[Set[str]] = None,
+                    min_quantity: Optional[int] = None) -> Iterator[List[Any]]:
+        """按状态和最小数量逐行过滤"""
+        for row in rows:
+            if statuses and (len(row) < 6 or row[5] not in statuses):
+                continue
+            if min_quantity is not None:
+                try:
+                    if int(row[1]) < min_quantity:
+                        continue
+                except (IndexError, ValueError, TypeError):
+                    continue
+            yield row
+
+    @staticmethod
+    def iter_csv(rows: Iterable[List[Any]]) -> Iterator[str]:
+        """生成 CSV 文本块（带 BOM，便于表格软件识别 UTF-8）"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        buffer.write('\ufeff')
+        writer.writerow(CSV_HEADER)
+        # 表头立即发送，让客户端尽快收到首个字节
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+        for row in rows:
+            writer.writerow(row)
+            if buffer.tell() >= FLUSH_SIZE:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    @staticmethod
+    def iter_jsonl(rows: Iterable[List[Any]]) -> Iterator[str]:
+        """生成 JSON Lines 文本块，每行一个数据项"""
+        chunk = []
+        size = 0
+        # 第一行立即发送，之后按缓冲大小批量发送
+        flush_size = 0
+        for row in rows:
+            line = json.dumps(row, ensure_ascii=False, separators=(',', ':')) + '\n'
+            chunk.append(line)
+            size += len(line)
+            if size >= flush_size:
+                yield ''.join(chunk)
+                chunk = []
+                size = 0
+                flush_size = FLUSH_SIZE
+        if chunk:
+            yield ''.join(chunk)
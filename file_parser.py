@@ -7,6 +7,7 @@ import logging
 from typing import List, Dict, Any
 from utils import CalculationUtils, FileUtils, ValidationUtils
 from config import Config
+from doc_storage import open_document
 
 logger = logging.getLogger(__name__)
 
@@ -98,7 +99,8 @@ class FileParser:
             解析后的数据列表
         """
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
+            # 压缩存储的文件按魔数识别并透明解压
+            with open_document(filepath) as f:
                 data = json.load(f)
             
             # 验证数据格式
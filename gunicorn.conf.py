@@ -35,7 +35,16 @@ raw_env = [
 
 # 服务器钩子
 def when_ready(server):
+    # preload_app 时应用已在主进程中加载，fork 工作进程前预热缓存，工作进程以写时复制方式共享
+    if server.cfg.preload_app:
+        from app import warm_caches
+        warm_caches()
     server.log.info("Server is ready. Serving requests...")
 
+def post_fork(server, worker):
+    if server.cfg.preload_app:
+        from app import refresh_after_fork
+        refresh_after_fork()
+
 def on_exit(server):
     server.log.info("Server is shutting down...")
@@ -0,0 +1,411 @@
+"""
+库存核对模块 - 箱子库存快照与材料清单按物品名哈希连接，计算每种物品仍需收集的数量
+"""
+import io
+import os
+import csv
+import json
+import uuid
+import fcntl
+import logging
+from datetime import datetime
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Any, Callable, Iterable, Optional, Set, Tuple
+
+import chardet
+
+from aggregation import MaterialAggregator
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+COMPLETED_STATUS = '已完成'
+# 每个快照保留的变更记录数，落后更多修订的核对结果整体重算
+MAX_CHANGE_LOG = 64
+
+
+def item_key(name: Any) -> str:
+    """连接键：忽略大小写、首尾空白和 minecraft: 命名空间"""
+    key = str(name).strip().casefold()
+    return key[len('minecraft:'):] if key.startswith('minecraft:') else key
+
+
+def _decode(raw: bytes) -> str:
+    if raw.startswith(b'\xef\xbb\xbf'):
+        return raw[3:].decode('utf-8')
+    detected = chardet.detect(raw[:1024]).get('encoding') or 'utf-8'
+    encodings = [detected] + [enc for enc in Config.SUPPORTED_ENCODINGS if enc != detected]
+    for encoding in encodings:
+        try:
+            return raw.decode(encoding)
+        except (UnicodeDecodeError, LookupError):
+            continue
+    raise ValueError('无法识别库存文件的编码')
+
+
+def parse_snapshot_csv(raw: bytes) -> Dict[str, Dict[str, int]]:
+    """
+    解析库存 CSV
+
+    两列时为 物品名,数量；三列及以上时为 箱子,物品名,数量。第一行数量不是整数时视为表头。
+    同一箱子中重复出现的物品数量相加。
+
+    Returns:
+        {箱子: {物品名: 数量}}，两列格式的箱子名为空字符串
+
+    Raises:
+        ValueError: 文件无法解析或没有有效行
+    """
+    chests: Dict[str, Dict[str, int]] = {}
+    rows = 0
+    for line, row in enumerate(csv.reader(io.StringIO(_decode(raw))), start=1):
+        if len(row) < 2:
+            continue
+        chest, name, count = ('', row[0], row[1]) if len(row) == 2 else (row[0], row[1], row[2])
+        name = name.strip()
+        try:
+            count = int(count.strip())
+        except ValueError:
+            if line > 1:
+                logger.warning(f"库存第{line}行数量格式错误: {count}")
+            continue
+        if not name or count < 0:
+            continue
+        items = chests.setdefault(chest.strip(), {})
+        items[name] = items.get(name, 0) + count
+        rows += 1
+    if not rows:
+        raise ValueError('库存文件中没有有效的 物品名,数量 行')
+    return chests
+
+
+def validate_chests(chests: Any) -> Dict[str, Dict[str, int]]:
+    """校验 JSON 提交的 {箱子: {物品名: 数量}}"""
+    if not isinstance(chests, dict):
+        raise ValueError('库存必须是 {箱子: {物品名: 数量}} 格式')
+    result = {}
+    for chest, items in chests.items():
+        if not isinstance(items, dict):
+            raise ValueError(f'箱子 {chest} 的库存必须是 {{物品名: 数量}} 格式')
+        counted = {}
+        for name, count in items.items():
+            try:
+                count = int(count)
+            except (TypeError, ValueError):
+                raise ValueError(f'物品 {name} 的数量无效')
+            if count < 0:
+                raise ValueError(f'物品 {name} 的数量不能为负数')
+            if str(name).strip():
+                counted[str(name).strip()] = count
+        result[str(chest).strip()] = counted
+    return result
+
+
+def snapshot_totals(chests: Dict[str, Dict[str, int]]) -> Dict[str, Dict[str, Any]]:
+    """按连接键合计所有箱子: {键: {'name': 首次出现的物品名, 'count': 数量}}"""
+    totals: Dict[str, Dict[str, Any]] = {}
+    for items in chests.values():
+        for name, count in items.items():
+            entry = totals.get(item_key(name))
+            if entry is None:
+                totals[item_key(name)] = {'name': name, 'count': count}
+            else:
+                entry['count'] += count
+    return totals
+
+
+class InventoryStore:
+    """
+    库存快照存储
+
+    每个快照一个 JSON 文件: {'chests': {箱子: {物品名: 数量}}, 'id': 创建时生成的标识,
+    'revision': 修订号, 'changes': [[修订号, [变化的连接键]], ...]}。在文件锁保护下由多个工作进程共享，
+    按文件的 inode 与修改时间复用已加载的内容。
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.lock_path = os.path.join(folder, '.lock')
+        # 快照名 -> (文件标识, 快照, 合计)
+        self._cache: Dict[str, Tuple[Tuple[int, int], Dict[str, Any], Dict[str, Dict[str, Any]]]] = {}
+
+    @contextmanager
+    def _locked(self, write: bool = False):
+        os.makedirs(self.folder, exist_ok=True)
+        with open(self.lock_path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX if write else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.folder, name + '.json')
+
+    def _read(self, name: str) -> Optional[Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]]:
+        try:
+            stat = os.stat(self._path(name))
+        except FileNotFoundError:
+            self._cache.pop(name, None)
+            return None
+        mtime = (stat.st_ino, stat.st_mtime_ns)
+        cached = self._cache.get(name)
+        if cached is None or cached[0] != mtime:
+            with open(self._path(name), 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            cached = self._cache[name] = (mtime, snapshot, snapshot_totals(snapshot['chests']))
+        return cached[1], cached[2]
+
+    def get(self, name: str) -> Optional[Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]]:
+        """返回 (快照, 按连接键的合计)，不存在时返回 None（调用方不得修改返回的数据）"""
+        with self._locked():
+            return self._read(name)
+
+    def update(self, name: str, chests: Dict[str, Dict[str, int]], replace: bool = True,
+               username: Optional[str] = None) -> Dict[str, Any]:
+        """
+        写入快照
+
+        Args:
+            chests: {箱子: {物品名: 数量}}
+            replace: True 时整体替换；False 时只替换给出的箱子，其余箱子保留
+
+        Returns:
+            {'revision': 修订号, 'chests': 箱子数, 'items': 物品种类数, 'changed': 数量变化的物品数}
+        """
+        with self._locked(write=True):
+            current = self._read(name)
+            if current is None:
+                snapshot: Dict[str, Any] = {'chests': {}, 'id': uuid.uuid4().hex, 'revision': 0, 'changes': []}
+                old_totals: Dict[str, Dict[str, Any]] = {}
+            else:
+                snapshot, old_totals = current
+
+            merged = dict(chests) if replace else dict(snapshot['chests'], **chests)
+            new_totals = snapshot_totals(merged)
+            changed = sorted(
+                key for key in set(old_totals) | set(new_totals)
+                if old_totals.get(key, {}).get('count') != new_totals.get(key, {}).get('count')
+            )
+
+            revision = snapshot['revision'] + 1
+            changes = snapshot['changes'][-(MAX_CHANGE_LOG - 1):] + [[revision, changed]]
+            snapshot = {
+                'chests': merged,
+                'id': snapshot['id'],
+                'revision': revision,
+                'changes': changes,
+                'updated_at': datetime.now().isoformat(),
+                'updated_by': username
+            }
+            tmp_path = self._path(name) + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, self._path(name))
+            stat = os.stat(self._path(name))
+            self._cache[name] = ((stat.st_ino, stat.st_mtime_ns), snapshot, new_totals)
+
+        logger.info(f"库存快照 {name} 已更新到修订 {revision}: {len(merged)} 个箱子, {len(changed)} 种物品数量变化")
+        return {'revision': revision, 'chests': len(merged), 'items': len(new_totals), 'changed': len(changed)}
+
+    @staticmethod
+    def changed_since(snapshot: Dict[str, Any], snapshot_id: str, revision: int) -> Optional[Set[str]]:
+        """自某修订以来数量变化的连接键，快照已被重建或变更记录不足时返回 None"""
+        changes = snapshot['changes']
+        if snapshot_id != snapshot['id'] or revision > snapshot['revision']:
+            return None
+        if revision == snapshot['revision']:
+            return set()
+        if not changes or changes[0][0] > revision + 1:
+            return None
+        keys: Set[str] = set()
+        for change_revision, changed in changes:
+            if change_revision > revision:
+                keys.update(changed)
+        return keys
+
+    def delete(self, name: str) -> bool:
+        """删除快照"""
+        with self._locked(write=True):
+            self._cache.pop(name, None)
+            try:
+                os.remove(self._path(name))
+                return True
+            except FileNotFoundError:
+                return False
+
+    def list(self) -> List[Dict[str, Any]]:
+        """所有快照的概况"""
+        result = []
+        if not os.path.isdir(self.folder):
+            return result
+        with self._locked():
+            for filename in sorted(os.listdir(self.folder)):
+                if not filename.endswith('.json'):
+                    continue
+                name = filename[:-len('.json')]
+                current = self._read(name)
+                if current is None:
+                    continue
+                snapshot, totals = current
+                result.append({
+                    'name': name,
+                    'revision': snapshot['revision'],
+                    'chests': len(snapshot['chests']),
+                    'items': len(totals),
+                    'updated_at': snapshot.get('updated_at'),
+                    'updated_by': snapshot.get('updated_by')
+                })
+        return result
+
+
+class InventoryReconciler:
+    """
+    库存与材料清单的哈希连接
+
+    构建侧是材料清单按连接键汇总的需求量（MaterialAggregator 的汇总表），探测侧是库存合计。
+    结果按（快照名, 清单版本）缓存：清单不变而快照更新时，只对变更记录中的物品重新连接并
+    增量修正合计；清单或堆叠数变化时整体重算。
+    """
+
+    def __init__(self, calculate: Callable[[str, int], Tuple[int, int, int]], max_entries: int = 32):
+        """
+        Args:
+            calculate: (名称, 数量) 换算为 (盒, 组, 个) 的函数
+            max_entries: 缓存的核对结果数上限
+        """
+        self.calculate = calculate
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Tuple[str, Tuple[str, ...], bool], Dict[str, Any]]' = OrderedDict()
+        self.full_joins = 0
+        self.incremental_joins = 0
+        self.rejoined_items = 0
+        self.cache_hits = 0
+
+    def _breakdown(self, name: str, quantity: int) -> Dict[str, int]:
+        boxes, groups, pieces = self.calculate(name, quantity)
+        return {'quantity': quantity, 'boxes': boxes, 'groups': groups, 'pieces': pieces}
+
+    def _build(self, sources: Iterable[Iterable[List[Any]]], pending_only: bool) -> Dict[str, Dict[str, Any]]:
+        """材料清单按连接键汇总需求量"""
+        aggregator = MaterialAggregator()
+        for rows in sources:
+            aggregator.add_rows(rows)
+        needed: Dict[str, Dict[str, Any]] = {}
+        for name, entry in aggregator.items.items():
+            quantity = entry['quantity']
+            if pending_only:
+                quantity -= entry['status'].get(COMPLETED_STATUS, 0)
+            if quantity <= 0:
+                continue
+            slot = needed.get(item_key(name))
+            if slot is None:
+                needed[item_key(name)] = {'name': name, 'quantity': quantity}
+            else:
+                slot['quantity'] += quantity
+        return needed
+
+    def _join_item(self, entry: Dict[str, Any], key: str, totals: Dict[str, Dict[str, Any]]) -> None:
+        """重新连接一个物品并修正合计"""
+        old = entry['results'].pop(key, None)
+        if old is not None:
+            for field, value in old['remaining'].items():
+                entry['remaining'][field] -= value
+            entry['short'] -= old['remaining']['quantity'] > 0
+
+        stock = totals.get(key)
+        need = entry['needed'].get(key)
+        if need is None:
+            if stock is not None:
+                entry['unmatched'].add(key)
+            else:
+                entry['unmatched'].discard(key)
+            return
+
+        have = stock['count'] if stock is not None else 0
+        remaining = self._breakdown(need['name'], max(0, need['quantity'] - have))
+        entry['results'][key] = {
+            'name': need['name'],
+            'needed': need['quantity'],
+            'have': have,
+            'surplus': max(0, have - need['quantity']),
+            'remaining': remaining
+        }
+        # 各物品堆叠数不同，合计逐项累加各物品的盒/组/个，不能由总数量换算
+        for field, value in remaining.items():
+            entry['remaining'][field] += value
+        entry['short'] += remaining['quantity'] > 0
+
+    def reconcile(self, snapshot_name: str, snapshot: Dict[str, Any], totals: Dict[str, Dict[str, Any]],
+                  filenames: Tuple[str, ...], list_version: Tuple,
+                  sources: Callable[[], Iterable[Iterable[List[Any]]]], pending_only: bool = False) -> Dict[str, Any]:
+        """
+        核对库存快照与材料清单
+
+        Args:
+            snapshot_name: 快照名
+            snapshot, totals: InventoryStore.get 的结果
+            filenames: 所选清单
+            list_version: 各清单内容版本（及堆叠数版本）组成的元组，变化时重建构建侧
+            sources: 返回各清单数据行的函数，只在需要重建时调用
+            pending_only: 只统计未标记为已完成的行
+
+        Returns:
+            {'items': [...按剩余数量降序], 'summary': {...}}
+        """
+        cache_key = (snapshot_name, filenames, pending_only)
+        entry = self._entries.get(cache_key)
+        if entry is None or entry['lists'] != list_version:
+            entry = {'lists': list_version, 'needed': self._build(sources(), pending_only)}
+            changed = None
+        else:
+            self._entries.move_to_end(cache_key)
+            changed = InventoryStore.changed_since(snapshot, entry['snapshot_id'], entry['revision'])
+
+        if changed is None:
+            entry.update({'results': {}, 'unmatched': set(), 'short': 0,
+                          'remaining': {'quantity': 0, 'boxes': 0, 'groups': 0, 'pieces': 0}})
+            for key in set(entry['needed']) | set(totals):
+                self._join_item(entry, key, totals)
+            mode = 'full'
+            self.full_joins += 1
+        elif changed:
+            for key in changed:
+                self._join_item(entry, key, totals)
+            mode = 'incremental'
+            self.incremental_joins += 1
+            self.rejoined_items += len(changed)
+        else:
+            mode = 'cached'
+            self.cache_hits += 1
+        entry['snapshot_id'] = snapshot['id']
+        entry['revision'] = snapshot['revision']
+
+        self._entries[cache_key] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+        items = sorted(entry['results'].values(), key=lambda item: (-item['remaining']['quantity'], item['name']))
+        summary = {
+            'snapshot': snapshot_name,
+            'revision': snapshot['revision'],
+            'mode': mode,
+            'rejoined': len(changed) if changed else (len(entry['results']) if mode == 'full' else 0),
+            'items': len(entry['results']),
+            'short': entry['short'],
+            'satisfied': len(entry['results']) - entry['short'],
+            'unmatched': len(entry['unmatched']),
+            'remaining': dict(entry['remaining'])
+        }
+        return {'items': items, 'summary': summary}
+
+    def stats(self) -> Dict[str, Any]:
+        """核对缓存统计信息"""
+        return {
+            'entries': len(self._entries),
+            'full_joins': self.full_joins,
+            'incremental_joins': self.incremental_joins,
+            'rejoined_items': self.rejoined_items,
+            'cache_hits': self.cache_hits
+        }
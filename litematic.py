@@ -0,0 +1,274 @@
+"""
+Litematica 原理图导入模块 - 解析 .litematic (gzip 压缩的 NBT) 并统计方块数量
+"""
+import gzip
+import struct
+import logging
+import multiprocessing
+from typing import Dict, List, Any, BinaryIO, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 为可选依赖，缺失时使用纯 Python 实现
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# NBT 标签类型
+TAG_END, TAG_BYTE, TAG_SHORT, TAG_INT, TAG_LONG, TAG_FLOAT, TAG_DOUBLE = range(7)
+TAG_BYTE_ARRAY, TAG_STRING, TAG_LIST, TAG_COMPOUND, TAG_INT_ARRAY, TAG_LONG_ARRAY = range(7, 13)
+
+_SCALARS = {
+    TAG_BYTE: struct.Struct('>b'),
+    TAG_SHORT: struct.Struct('>h'),
+    TAG_INT: struct.Struct('>i'),
+    TAG_LONG: struct.Struct('>q'),
+    TAG_FLOAT: struct.Struct('>f'),
+    TAG_DOUBLE: struct.Struct('>d'),
+}
+_ARRAY_ITEM_SIZE = {TAG_BYTE_ARRAY: 1, TAG_INT_ARRAY: 4, TAG_LONG_ARRAY: 8}
+
+# 不计入材料的方块
+IGNORED_BLOCKS = {'minecraft:air', 'minecraft:cave_air', 'minecraft:void_air', 'minecraft:structure_void'}
+
+# NumPy 解包时每批处理的方块数，限制中间数组的内存占用
+UNPACK_BATCH = 1 << 22
+
+
+class NBTReader:
+    """从二进制流中按顺序读取 NBT，数组类标签保留为原始字节以节省内存"""
+
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+
+    def _read(self, size: int) -> bytes:
+        data = self.stream.read(size)
+        if len(data) != size:
+            raise ValueError('NBT数据不完整')
+        return data
+
+    def _read_string(self) -> str:
+        length = struct.unpack('>H', self._read(2))[0]
+        return self._read(length).decode('utf-8', errors='replace')
+
+    def read_root(self) -> Dict[str, Any]:
+        """读取根复合标签"""
+        tag_type = self._read(1)[0]
+        if tag_type != TAG_COMPOUND:
+            raise ValueError('NBT根标签应该是复合标签')
+        self._read_string()
+        return self._read_payload(TAG_COMPOUND)
+
+    def _read_payload(self, tag_type: int) -> Any:
+        scalar = _SCALARS.get(tag_type)
+        if scalar:
+            return scalar.unpack(self._read(scalar.size))[0]
+        if tag_type == TAG_STRING:
+            return self._read_string()
+        if tag_type in _ARRAY_ITEM_SIZE:
+            length = struct.unpack('>i', self._read(4))[0]
+            return self._read(length * _ARRAY_ITEM_SIZE[tag_type])
+        if tag_type == TAG_LIST:
+            item_type = self._read(1)[0]
+            length = struct.unpack('>i', self._read(4))[0]
+            return [self._read_payload(item_type) for _ in range(length)]
+        if tag_type == TAG_COMPOUND:
+            result = {}
+            while True:
+                child_type = self._read(1)[0]
+                if child_type == TAG_END:
+                    return result
+                name = self._read_string()
+                result[name] = self._read_payload(child_type)
+        raise ValueError(f'未知的NBT标签类型: {tag_type}')
+
+
+def bits_per_entry(palette_size: int) -> int:
+    """Litematica 方块状态数组每项的位数（最少2位）"""
+    return max(2, (palette_size - 1).bit_length())
+
+
+def count_packed_indices(packed: bytes, bits: int, volume: int, palette_size: int) -> List[int]:
+    """
+    统计打包长整型数组中每个调色板索引出现的次数
+
+    Litematica 的数组按位紧密排列，条目可以跨越两个长整型。
+
+    Args:
+        packed: 大端序 int64 数组的原始字节
+        bits: 每项位数
+        volume: 方块总数
+        palette_size: 调色板大小
+
+    Returns:
+        按调色板索引排列的计数
+    """
+    if np is not None:
+        return _count_numpy(packed, bits, volume, palette_size)
+    return _count_python(packed, bits, volume, palette_size)
+
+
+def _count_numpy(packed: bytes, bits: int, volume: int, palette_size: int) -> List[int]:
+    # 末尾补一个 0，跨越最后一个长整型的读取不会越界
+    longs = np.append(np.frombuffer(packed, dtype='>u8').astype(np.uint64), np.uint64(0))
+    mask = np.uint64((1 << bits) - 1)
+    counts = np.zeros(max(palette_size, 1 << bits), dtype=np.int64)
+    for start in range(0, volume, UNPACK_BATCH):
+        bit_index = np.arange(start, min(start + UNPACK_BATCH, volume), dtype=np.uint64) * np.uint64(bits)
+        long_index = (bit_index >> np.uint64(6)).astype(np.intp)
+        offset = bit_index & np.uint64(63)
+        values = longs[long_index] >> offset
+        # 跨越两个长整型的条目需要拼接下一个长整型的低位
+        spans = offset + np.uint64(bits) > np.uint64(64)
+        if spans.any():
+            values[spans] |= longs[long_index[spans] + 1] << (np.uint64(64) - offset[spans])
+        counts += np.bincount((values & mask).astype(np.intp), minlength=counts.size)
+    return counts[:palette_size].tolist()
+
+
+def _count_python(packed: bytes, bits: int, volume: int, palette_size: int) -> List[int]:
+    longs = struct.unpack(f'>{len(packed) // 8}Q', packed) + (0,)
+    mask = (1 << bits) - 1
+    counts = [0] * max(palette_size, 1 << bits)
+    for index in range(volume):
+        bit_index = index * bits
+        long_index = bit_index >> 6
+        offset = bit_index & 63
+        value = longs[long_index] >> offset
+        if offset + bits > 64:
+            value |= longs[long_index + 1] << (64 - offset)
+        counts[value & mask] += 1
+    return counts[:palette_size]
+
+
+def _region_task(region: Dict[str, Any]) -> Tuple[bytes, int, int, int]:
+    """提取区域的计数参数"""
+    size = region.get('Size', {})
+    volume = abs(size.get('x', 0) * size.get('y', 0) * size.get('z', 0))
+    palette = region.get('BlockStatePalette', [])
+    return region.get('BlockStates', b''), bits_per_entry(len(palette)), volume, len(palette)
+
+
+def _count_region(args: Tuple[bytes, int, int, int]) -> List[int]:
+    """单区域计数"""
+    return count_packed_indices(*args)
+
+
+def _count_regions_child(connection, indexed_tasks: List[Tuple[int, Tuple[bytes, int, int, int]]]) -> None:
+    """子进程入口：统计分到的区域并通过管道发回 [(区域序号, 计数), ...]"""
+    try:
+        connection.send([(index, list(_count_region(task))) for index, task in indexed_tasks])
+    finally:
+        connection.close()
+
+
+def count_regions_in_processes(tasks: List[Tuple[bytes, int, int, int]], workers: int) -> List[List[int]]:
+    """
+    在 workers 个子进程中统计各区域
+
+    不使用 ProcessPoolExecutor：它依赖管理线程和线程锁，在 eventlet 猴子补丁后的进程中
+    会变成绿色线程。这里每个子进程只通过一个管道返回结果，父进程不创建任何线程。
+    """
+    context = multiprocessing.get_context('fork')
+    # 按区域体积从大到小轮流分配，使各子进程的工作量接近
+    order = sorted(range(len(tasks)), key=lambda index: -tasks[index][2])
+    buckets = [[(index, tasks[index]) for index in order[start::workers]] for start in range(workers)]
+
+    children = []
+    for bucket in buckets:
+        if not bucket:
+            continue
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=_count_regions_child, args=(sender, bucket), daemon=True)
+        process.start()
+        sender.close()
+        children.append((process, receiver))
+
+    results: List[List[int]] = [[] for _ in tasks]
+    try:
+        for process, receiver in children:
+            for index, counts in receiver.recv():
+                results[index] = counts
+    finally:
+        for process, receiver in children:
+            receiver.close()
+            process.join(1)
+            if process.is_alive():
+                process.terminate()
+    return results
+
+
+def block_item_multiplier(entry: Dict[str, Any]) -> int:
+    """方块状态换算为物品数量的倍数（双层台阶算2个，门、床等多方块结构只计一次）"""
+    properties = entry.get('Properties', {})
+    if properties.get('type') == 'double' and entry.get('Name', '').endswith('_slab'):
+        return 2
+    if properties.get('half') == 'upper' or properties.get('part') == 'head':
+        return 0
+    return 1
+
+
+class LitematicImporter:
+    """Litematica 原理图导入器"""
+
+    def __init__(self, workers: int = 0, parallel_threshold: int = 1 << 20):
+        """
+        Args:
+            workers: 子进程数，0 表示在当前进程内逐个处理区域
+            parallel_threshold: 方块总数超过该值时才启用子进程
+        """
+        self.workers = workers
+        self.parallel_threshold = parallel_threshold
+
+    @staticmethod
+    def read_regions(filepath: str) -> Dict[str, Dict[str, Any]]:
+        """读取原理图中的所有区域"""
+        with gzip.open(filepath, 'rb') as f:
+            root = NBTReader(f).read_root()
+        regions = root.get('Regions')
+        if not isinstance(regions, dict):
+            raise ValueError('不是有效的 Litematica 原理图：缺少 Regions')
+        return regions
+
+    def count_blocks(self, filepath: str) -> Dict[str, int]:
+        """统计原理图中每种方块的数量（按方块 ID 合并）"""
+        regions = list(self.read_regions(filepath).values())
+        tasks = [_region_task(region) for region in regions]
+        total_volume = sum(task[2] for task in tasks)
+
+        results = None
+        if self.workers > 0 and len(tasks) > 1 and total_volume >= self.parallel_threshold:
+            try:
+                results = count_regions_in_processes(tasks, min(self.workers, len(tasks)))
+            except Exception as e:
+                logger.warning(f"子进程统计方块失败，改为逐个区域处理: {e}")
+        if results is None:
+            results = [_count_region(task) for task in tasks]
+
+        totals: Dict[str, int] = {}
+        for region, counts in zip(regions, results):
+            for entry, count in zip(region.get('BlockStatePalette', []), counts):
+                name = entry.get('Name', '')
+                if not count or name in IGNORED_BLOCKS:
+                    continue
+                quantity = count * block_item_multiplier(entry)
+                if quantity:
+                    totals[name] = totals.get(name, 0) + quantity
+        logger.info(f"原理图 {filepath} 共 {len(regions)} 个区域, {total_volume} 个位置, {len(totals)} 种方块")
+        return totals
+
+    def iter_rows(self, filepath: str, calculate) -> List[List[Any]]:
+        """
+        生成 [名称, 数量, 盒, 组, 个, 状态] 格式的数据行
+
+        Args:
+            filepath: .litematic 文件路径
+            calculate: (名称, 数量) 换算为 (盒, 组, 个) 的函数
+        """
+        rows = []
+        totals = self.count_blocks(filepath)
+        for name, quantity in sorted(totals.items(), key=lambda kv: (-kv[1], kv[0])):
+            display_name = name.split(':', 1)[1] if name.startswith('minecraft:') else name
+            boxes, groups, pieces = calculate(display_name, quantity)
+            rows.append([display_name, str(quantity), boxes, groups, pieces, "未完成"])
+        return rows
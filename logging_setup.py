@@ -0,0 +1,187 @@
+"""
+日志配置模块 - 队列化的非阻塞日志输出、热点事件采样和结构化 JSON 格式
+"""
+import os
+import sys
+import json
+import time
+import queue
+import logging
+import importlib
+import logging.handlers
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+try:
+    from eventlet import patcher as eventlet_patcher
+except ImportError:  # 未安装 eventlet 时直接使用标准库
+    eventlet_patcher = None
+
+# LogRecord 自带的属性，JSON 输出时不作为额外字段
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+def original_module(module_name: str):
+    """获取未被 eventlet 猴子补丁替换的标准库模块，写日志的线程必须是真正的系统线程"""
+    if eventlet_patcher is not None:
+        return eventlet_patcher.original(module_name)
+    return importlib.import_module(module_name)
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    按事件类型限流采样
+
+    事件类型取日志的 event 额外字段，没有时取日志器名称（如 engineio 的心跳日志）。
+    每种事件每秒最多放行 limits 中配置的条数，WARNING 及以上级别不采样。
+    """
+
+    def __init__(self, limits: Dict[str, float]):
+        super().__init__()
+        self.limits = limits
+        # 事件类型 -> [当前窗口开始时间, 窗口内已放行条数]
+        self._windows: Dict[str, list] = {}
+        self.dropped: Dict[str, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        event = getattr(record, 'event', None) or record.name.split('.', 1)[0]
+        limit = self.limits.get(event)
+        if limit is None:
+            return True
+
+        now = time.monotonic()
+        window = self._windows.get(event)
+        if window is None or now - window[0] >= 1.0:
+            window = self._windows[event] = [now, 0]
+        if window[1] < limit:
+            window[1] += 1
+            return True
+        self.dropped[event] = self.dropped.get(event, 0) + 1
+        return False
+
+
+class QueueFullSafeHandler(logging.handlers.QueueHandler):
+    """队列满时丢弃日志并计数，绝不阻塞调用方"""
+
+    dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            QueueFullSafeHandler.dropped += 1
+
+
+class NativeQueueListener(logging.handlers.QueueListener):
+    """使用系统线程消费日志队列，不占用 eventlet 事件循环"""
+
+    def start(self) -> None:
+        native_threading = original_module('threading')
+        self._thread = thread = native_threading.Thread(target=self._monitor, name='log-writer', daemon=True)
+        thread.start()
+
+
+def parse_sample_limits(spec: str) -> Dict[str, float]:
+    """解析 'item_updated:5,engineio:1' 格式的采样配置"""
+    limits = {}
+    for part in (spec or '').split(','):
+        if ':' not in part:
+            continue
+        event, limit = part.split(':', 1)
+        try:
+            limits[event.strip()] = float(limit)
+        except ValueError:
+            continue
+    return limits
+
+
+_listener: Optional[NativeQueueListener] = None
+# 最近一次 configure_logging 的参数，fork 后在子进程中按相同配置重建
+_settings: Optional[Dict[str, Any]] = None
+_sampler: Optional[SamplingFilter] = None
+_queue = None
+
+
+def configure_logging(level: str = 'INFO', fmt: str = 'text', use_queue: bool = True,
+                      sample_limits: str = '', queue_size: int = 10000) -> None:
+    """
+    配置根日志器
+
+    Args:
+        level: 日志级别
+        fmt: 'text' 文本格式或 'json' 结构化格式
+        use_queue: 是否通过队列由后台线程写出
+        sample_limits: 按事件类型的每秒条数上限
+        queue_size: 队列容量，满时丢弃新日志而不阻塞请求
+    """
+    global _listener, _sampler, _queue, _settings
+    _settings = dict(level=level, fmt=fmt, use_queue=use_queue, sample_limits=sample_limits, queue_size=queue_size)
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if fmt == 'json':
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(level.upper())
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+    if use_queue:
+        _queue = original_module('queue').Queue(queue_size)
+        handler = QueueFullSafeHandler(_queue)
+        _listener = NativeQueueListener(_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+    else:
+        _queue = None
+        handler = stream_handler
+
+    _sampler = SamplingFilter(parse_sample_limits(sample_limits))
+    handler.addFilter(_sampler)
+    root.addHandler(handler)
+
+
+def _reconfigure_in_child() -> None:
+    """fork 出的子进程（如 gunicorn 工作进程）没有父进程的写日志线程，需要重建队列和线程"""
+    global _listener
+    if _settings is not None and _settings['use_queue']:
+        _listener = None
+        configure_logging(**_settings)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reconfigure_in_child)
+
+
+def log_stats() -> Dict[str, Any]:
+    """日志系统统计信息"""
+    return {
+        'queued': _queue.qsize() if _queue is not None else 0,
+        'queue_full_dropped': QueueFullSafeHandler.dropped,
+        'sampled_out': dict(_sampler.dropped) if _sampler else {}
+    }
@@ -0,0 +1,207 @@
+"""
+内存诊断模块 - 房间文档与缓存的深度内存占用，以及按需的 tracemalloc 快照对比
+"""
+import os
+import sys
+import time
+import logging
+import tracemalloc
+from collections import deque
+from typing import Dict, List, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 会被展开统计的容器类型
+CONTAINER_TYPES = (dict, list, tuple, set, frozenset, deque)
+
+
+def deep_size(obj: Any, sample_limit: Optional[int] = None, seen: Optional[set] = None) -> int:
+    """
+    对象及其包含的全部元素的内存占用（字节）
+
+    只展开容器；顶层对象如有 __dict__ 则展开其属性，更深层的其他对象只计自身大小，
+    避免顺着引用统计到 Socket.IO 服务器等整个对象图。同一对象只计一次。
+
+    Args:
+        obj: 要统计的对象
+        sample_limit: 容器元素超过该数量时只均匀抽样统计这么多个元素再按比例推算，
+            None 表示精确统计
+        seen: 已统计对象的 id 集合，多次调用间共享时共享对象只计一次
+    """
+    seen = set() if seen is None else seen
+
+    def measure(o: Any) -> int:
+        if id(o) in seen:
+            return 0
+        seen.add(id(o))
+        total = sys.getsizeof(o)
+        if isinstance(o, dict):
+            children = list(o.items())
+        elif isinstance(o, CONTAINER_TYPES):
+            children = list(o)
+        else:
+            return total
+
+        if sample_limit and len(children) > sample_limit:
+            step = len(children) / sample_limit
+            sampled = [children[int(i * step)] for i in range(sample_limit)]
+        else:
+            sampled = children
+        measured = 0
+        for child in sampled:
+            if isinstance(o, dict):
+                measured += measure(child[0]) + measure(child[1])
+            else:
+                measured += measure(child)
+        if sampled:
+            measured = measured * len(children) // len(sampled)
+        return total + measured
+
+    if not isinstance(obj, CONTAINER_TYPES) and hasattr(obj, '__dict__'):
+        seen.add(id(obj))
+        return sys.getsizeof(obj) + measure(vars(obj))
+    return measure(obj)
+
+
+def process_rss() -> Optional[int]:
+    """当前进程的常驻内存（字节），不支持的平台返回 None"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class MemoryInspector:
+    """
+    工作进程内存诊断
+
+    房间文档的深度大小按 (文件名, 版本号) 缓存，文档未变化时不重复遍历；缓存和
+    索引按 sample_limit 抽样估算。tracemalloc 默认关闭，可在启动时或通过接口按需
+    开启，开启后可随时记录基准快照，之后与当前快照对比占用增长最多的代码位置。
+    """
+
+    def __init__(self, sample_limit: int = 2000, trace_frames: int = 0):
+        """
+        Args:
+            sample_limit: 统计缓存时每个容器最多抽样的元素数
+            trace_frames: 大于 0 时立即以该调用栈深度开启 tracemalloc
+        """
+        self.sample_limit = sample_limit
+        self.trace_frames = max(1, trace_frames)
+        # 文件名 -> (版本号, 字节数)
+        self._room_sizes: Dict[str, Tuple[int, int]] = {}
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._baseline_at: Optional[float] = None
+        if trace_frames > 0:
+            self.start_tracing()
+
+    def start_tracing(self) -> None:
+        """开启 tracemalloc"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.trace_frames)
+            logger.info("tracemalloc 已开启，调用栈深度 %d", self.trace_frames)
+
+    def stop_tracing(self) -> None:
+        """关闭 tracemalloc 并丢弃基准快照"""
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.info("tracemalloc 已关闭")
+        self._baseline = None
+        self._baseline_at = None
+
+    @staticmethod
+    def _take_snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<unknown>'),
+        ))
+
+    def snapshot(self) -> float:
+        """记录基准快照（tracemalloc 未开启时先开启），返回快照时间"""
+        self.start_tracing()
+        self._baseline = self._take_snapshot()
+        self._baseline_at = time.time()
+        return self._baseline_at
+
+    def diff(self, top: int = 10) -> Optional[List[Dict[str, Any]]]:
+        """
+        当前快照与基准快照相比增长最多的代码位置
+
+        Returns:
+            [{'location', 'size_diff', 'size', 'count_diff', 'count'}, ...]，没有基准快照时返回 None
+        """
+        if self._baseline is None or not tracemalloc.is_tracing():
+            return None
+        stats = self._take_snapshot().compare_to(self._baseline, 'lineno')
+        return [{
+            'location': f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}',
+            'size_diff': stat.size_diff,
+            'size': stat.size,
+            'count_diff': stat.count_diff,
+            'count': stat.count
+        } for stat in stats[:top]]
+
+    def room_report(self, rooms) -> List[Dict[str, Any]]:
+        """
+        内存中各房间文档的深度大小与成员数（不恢复已转存的房间）
+
+        Args:
+            rooms: RoomManager
+        """
+        report = []
+        current = set()
+        for filename, room in rooms.items():
+            current.add(filename)
+            cached = self._room_sizes.get(filename)
+            if cached is None or cached[0] != room['version']:
+                size = deep_size({key: value for key, value in room.items() if key != 'users'})
+                cached = self._room_sizes[filename] = (room['version'], size)
+            report.append({
+                'filename': filename,
+                'version': room['version'],
+                'rows': len(room['data']),
+                'members': len(room['users']),
+                'bytes': cached[1]
+            })
+        for filename in set(self._room_sizes) - current:
+            del self._room_sizes[filename]
+        report.sort(key=lambda entry: entry['bytes'], reverse=True)
+        return report
+
+    def report(self, rooms, objects: Dict[str, Any], top: int = 0) -> Dict[str, Any]:
+        """
+        完整的内存报告
+
+        Args:
+            rooms: RoomManager
+            objects: 名称 -> 要统计的缓存/索引对象
+            top: 大于 0 且有基准快照时附带 tracemalloc 对比结果
+        """
+        started = time.perf_counter()
+        room_entries = self.room_report(rooms)
+        sizes = {name: deep_size(obj, self.sample_limit) for name, obj in objects.items()}
+        result = {
+            'pid': os.getpid(),
+            'rss': process_rss(),
+            'rooms': {
+                'count': len(room_entries),
+                'bytes': sum(entry['bytes'] for entry in room_entries),
+                'documents': room_entries
+            },
+            'objects': sizes,
+            'sample_limit': self.sample_limit,
+            'tracemalloc': {
+                'tracing': tracemalloc.is_tracing(),
+                'baseline_at': self._baseline_at
+            }
+        }
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            result['tracemalloc'].update(traced=current, peak=peak,
+                                         overhead=tracemalloc.get_tracemalloc_memory())
+            if top > 0:
+                result['tracemalloc']['top'] = self.diff(top)
+        result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        return result
@@ -0,0 +1,143 @@
+"""
+分页文档推送模块 - 按固定行数分页发送初始文档，依靠客户端确认做流量控制
+"""
+import json
+import time
+import logging
+from typing import Dict, List, Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PagedDelivery:
+    """
+    按页发送房间文档
+
+    第一页较小，客户端收到后即可先渲染；之后每页 page_rows 行，同一连接最多有
+    window 页已发出但未确认，收到确认后再发下一页。页在发送时才编码，不会为每个
+    接收者持有完整的编码文档。发送期间文档被整体替换（同步、重新加载）时中止，
+    通知客户端重新同步。
+
+    行更新照常广播，可能早于所在页到达；客户端在第一页到最后一页之间把行更新排队，
+    收齐所有页后按顺序应用（页在发送时才编码，已包含的更新重复应用不会改变结果）。
+    """
+
+    def __init__(self, socketio, page_rows: int = 500, first_page_rows: int = 100, window: int = 2):
+        """
+        Args:
+            socketio: SocketIO 实例
+            page_rows: 每页行数
+            first_page_rows: 第一页行数
+            window: 未确认页数上限
+        """
+        self.socketio = socketio
+        self.page_rows = max(1, page_rows)
+        self.first_page_rows = max(1, min(first_page_rows, self.page_rows))
+        self.window = max(1, window)
+        # sid -> 进行中的推送
+        self._deliveries: Dict[str, Dict[str, Any]] = {}
+        self._next_id = 0
+        self.pages_sent = 0
+        self.completed = 0
+        self.aborted = 0
+
+    def should_page(self, rows: List[Any]) -> bool:
+        """文档是否需要分页发送"""
+        return len(rows) > self.page_rows
+
+    def page_bounds(self, total: int) -> List[int]:
+        """各页起始行（最后附加总行数）"""
+        bounds = [0]
+        position = min(self.first_page_rows, total)
+        while position < total:
+            bounds.append(position)
+            position += self.page_rows
+        bounds.append(total)
+        return bounds
+
+    def start(self, sid: str, filename: str, rows: List[Any], version: int,
+              current_rows: Callable[[], Optional[List[Any]]]) -> None:
+        """
+        开始向连接推送文档（替换该连接进行中的推送）
+
+        Args:
+            sid: 接收者
+            filename: 房间（文件）名
+            rows: 文档数据行
+            version: 开始推送时的文档版本号
+            current_rows: 返回房间当前数据行列表，用于发现文档被整体替换
+        """
+        self._next_id += 1
+        bounds = self.page_bounds(len(rows))
+        delivery = {
+            'id': self._next_id,
+            'sid': sid,
+            'filename': filename,
+            'rows': rows,
+            'version': version,
+            'bounds': bounds,
+            'pages': len(bounds) - 1,
+            'sent': 0,
+            'acked': 0,
+            'current_rows': current_rows,
+            'started': time.perf_counter()
+        }
+        if self._deliveries.pop(sid, None) is not None:
+            self.aborted += 1
+        self._deliveries[sid] = delivery
+        logger.debug("分页推送 %s: %d 行, %d 页", filename, len(rows), delivery['pages'],
+                     extra={'event': 'file_page'})
+        self._pump(delivery)
+
+    def _pump(self, delivery: Dict[str, Any]) -> None:
+        if self._deliveries.get(delivery['sid']) is not delivery:
+            return
+        if delivery['current_rows']() is not delivery['rows']:
+            self.cancel(delivery['sid'])
+            self.socketio.emit('resync_required', {'filename': delivery['filename']}, to=delivery['sid'])
+            return
+
+        while delivery['sent'] < delivery['pages'] and delivery['sent'] - delivery['acked'] < self.window:
+            page = delivery['sent']
+            start, end = delivery['bounds'][page], delivery['bounds'][page + 1]
+            payload = json.dumps(delivery['rows'][start:end], ensure_ascii=False,
+                                 separators=(',', ':')).encode('utf-8')
+            delivery['sent'] += 1
+            self.pages_sent += 1
+            self.socketio.emit('file_page', {
+                'filename': delivery['filename'],
+                'version': delivery['version'],
+                'page': page,
+                'pages': delivery['pages'],
+                'start': start,
+                'total': len(delivery['rows']),
+                'payload': payload
+            }, to=delivery['sid'], callback=lambda *args, page=page: self._on_ack(delivery, page))
+
+    def _on_ack(self, delivery: Dict[str, Any], page: int) -> None:
+        if self._deliveries.get(delivery['sid']) is not delivery:
+            return
+        delivery['acked'] += 1
+        if delivery['acked'] < delivery['pages']:
+            self._pump(delivery)
+            return
+        del self._deliveries[delivery['sid']]
+        self.completed += 1
+        logger.debug("分页推送完成 %s: %d 页, 耗时 %.1fms", delivery['filename'], delivery['pages'],
+                     (time.perf_counter() - delivery['started']) * 1000, extra={'event': 'file_page'})
+
+    def cancel(self, sid: str) -> None:
+        """中止连接进行中的推送（断开连接、切换文件时调用）"""
+        if self._deliveries.pop(sid, None) is not None:
+            self.aborted += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """分页推送统计信息"""
+        return {
+            'page_rows': self.page_rows,
+            'window': self.window,
+            'active': len(self._deliveries),
+            'pages_sent': self.pages_sent,
+            'completed': self.completed,
+            'aborted': self.aborted
+        }
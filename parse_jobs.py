@@ -0,0 +1,245 @@
+"""
+后台解析任务模块 - 在有界线程池中解析上传文件，并通过 Socket.IO 推送进度
+"""
+import os
+import json
+import time
+import uuid
+import logging
+from typing import Dict, List, Any, Callable, Iterable, Optional
+from logging_setup import original_module
+
+logger = logging.getLogger(__name__)
+
+
+class ParseJobError(Exception):
+    """解析任务错误，附带 HTTP 状态码"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+class ParseJobManager:
+    """
+    后台解析任务管理
+
+    解析在 workers 个系统线程中执行，不占用 eventlet 事件循环；进度推送、结果写入
+    缓存等共享状态的修改都在事件循环中的轮询任务里完成。任务状态同时写入磁盘，
+    任意工作进程都可以查询。
+    """
+
+    def __init__(self, status_folder: str, workers: int, max_jobs: int,
+                 ttl: float = 3600, progress_interval: float = 0.5):
+        """
+        Args:
+            status_folder: 任务状态文件目录
+            workers: 同时解析的任务数
+            max_jobs: 排队和解析中的任务总数上限
+            ttl: 已结束的任务保留多少秒
+            progress_interval: 进度推送间隔（秒）
+        """
+        self.status_folder = status_folder
+        self.workers = max(1, workers)
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self.progress_interval = progress_interval
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        # 解析线程的输出，任务 ID -> 数据行，由轮询任务取走
+        self._results: Dict[str, List[List[Any]]] = {}
+        self._queue = None
+        self._threads_started = False
+        self._poller_started = False
+        self._socketio = None
+        self._on_complete = None
+        self._on_failed = None
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def _status_path(self, job_id: str) -> str:
+        return os.path.join(self.status_folder, job_id + '.json')
+
+    @staticmethod
+    def public(job: Dict[str, Any]) -> Dict[str, Any]:
+        """任务的对外状态"""
+        return {key: value for key, value in job.items() if not key.startswith('_')}
+
+    def _persist(self, job: Dict[str, Any]) -> None:
+        os.makedirs(self.status_folder, exist_ok=True)
+        path = self._status_path(job['job_id'])
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.public(job), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def start(self, socketio, on_complete: Callable, on_failed: Callable) -> None:
+        """
+        启动解析线程和进度轮询任务（在工作进程中首次提交任务时调用）
+
+        Args:
+            socketio: SocketIO 实例
+            on_complete: 解析成功后以 (任务, 数据行) 调用，返回值并入任务状态
+            on_failed: 解析失败后以任务调用
+        """
+        self._socketio = socketio
+        self._on_complete = on_complete
+        self._on_failed = on_failed
+        if not self._threads_started:
+            self._threads_started = True
+            self._queue = original_module('queue').Queue()
+            native_threading = original_module('threading')
+            for index in range(self.workers):
+                native_threading.Thread(target=self._worker, name=f'parse-worker-{index}', daemon=True).start()
+        if not self._poller_started:
+            self._poller_started = True
+            self.cleanup_expired()
+            socketio.start_background_task(self._poll)
+
+    def submit(self, filename: str, filepath: str, owner: Optional[str], sid: Optional[str],
+               parse: Callable[[str], Iterable[List[Any]]], description: str = '') -> Dict[str, Any]:
+        """
+        提交解析任务
+
+        Args:
+            filename: 存储文件名
+            filepath: 文件路径
+            owner: 上传用户
+            sid: 接收进度推送的 Socket.IO 连接
+            parse: 逐行返回解析结果的函数
+            description: 文件描述
+
+        Returns:
+            任务状态
+        """
+        active = sum(1 for job in self._jobs.values() if job['status'] in ('queued', 'running'))
+        if active >= self.max_jobs:
+            self.rejected += 1
+            raise ParseJobError(f'解析任务过多（上限 {self.max_jobs}），请稍后重试', 429)
+
+        job = {
+            'job_id': uuid.uuid4().hex,
+            'filename': filename,
+            'owner': owner,
+            'description': description,
+            'status': 'queued',
+            'rows': 0,
+            'size': os.path.getsize(filepath),
+            'error': None,
+            'created_at': time.time(),
+            'finished_at': None,
+            '_filepath': filepath,
+            '_sid': sid,
+            '_parse': parse,
+            '_reported': None
+        }
+        self._jobs[job['job_id']] = job
+        self._persist(job)
+        self._queue.put(job['job_id'])
+        logger.info("提交解析任务 %s: %s", job['job_id'], filename)
+        return self.public(job)
+
+    def _worker(self) -> None:
+        """系统线程：依次解析队列中的任务"""
+        while True:
+            job = self._jobs.get(self._queue.get())
+            if job is None:
+                continue
+            job['status'] = 'running'
+            try:
+                rows = []
+                for row in job['_parse'](job['_filepath']):
+                    rows.append(row)
+                    job['rows'] += 1
+                self._results[job['job_id']] = rows
+            except Exception as e:
+                job['error'] = str(e)
+                job['status'] = 'failing'
+
+    def _poll(self) -> None:
+        """事件循环：推送进度，完成的任务写入缓存并通知上传者"""
+        while True:
+            self._socketio.sleep(self.progress_interval)
+            try:
+                self._tick()
+            except Exception as e:
+                logger.error(f"解析任务轮询失败: {e}")
+
+    def _tick(self) -> None:
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job['status'] in ('done', 'failed'):
+                if now - job['finished_at'] > self.ttl:
+                    del self._jobs[job_id]
+                    try:
+                        os.remove(self._status_path(job_id))
+                    except FileNotFoundError:
+                        pass
+                continue
+
+            rows = self._results.pop(job_id, None)
+            if rows is not None:
+                try:
+                    job.update(self._on_complete(job, rows) or {})
+                    job['status'] = 'done'
+                    self.completed += 1
+                except Exception as e:
+                    job['error'] = str(e)
+                    job['status'] = 'failing'
+            if job['status'] == 'failing':
+                self._on_failed(job)
+                job['status'] = 'failed'
+                self.failed += 1
+                logger.warning("解析任务 %s 失败: %s", job_id, job['error'])
+            if job['status'] in ('done', 'failed'):
+                job['finished_at'] = now
+
+            snapshot = (job['status'], job['rows'])
+            if snapshot == job['_reported']:
+                continue
+            job['_reported'] = snapshot
+            self._persist(job)
+            if job['_sid']:
+                event = 'parse_progress' if job['status'] in ('queued', 'running') else 'parse_complete'
+                self._socketio.emit(event, self.public(job), to=job['_sid'])
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """查询任务状态（其他工作进程的任务从状态文件读取）"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return self.public(job)
+        if not job_id.isalnum():
+            return None
+        try:
+            with open(self._status_path(job_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def cleanup_expired(self) -> None:
+        """删除过期的状态文件"""
+        try:
+            entries = list(os.scandir(self.status_folder))
+        except FileNotFoundError:
+            return
+        cutoff = time.time() - self.ttl
+        for entry in entries:
+            if entry.name.endswith('.json') and entry.stat().st_mtime < cutoff:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    def stats(self) -> Dict[str, Any]:
+        """解析任务统计信息"""
+        states: Dict[str, int] = {}
+        for job in self._jobs.values():
+            states[job['status']] = states.get(job['status'], 0) + 1
+        return {
+            'workers': self.workers,
+            'max_jobs': self.max_jobs,
+            'jobs': states,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected
+        }
@@ -0,0 +1,76 @@
+"""
+广播负载缓存模块 - 房间文档快照只序列化一次
+"""
+import json
+import time
+import logging
+from typing import Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+
+class PayloadCache:
+    """按房间缓存预编码的文档快照，以文档版本号为键"""
+
+    def __init__(self):
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.encode_seconds = 0.0
+        self.saved_seconds = 0.0
+        self.max_encode_seconds = 0.0
+        self.last_encode_seconds = 0.0
+
+    def get(self, filename: str, version: int, data: List[Any]) -> bytes:
+        """
+        获取房间文档的预编码快照
+
+        Args:
+            filename: 房间（文件）名
+            version: 当前文档版本号
+            data: 当前文档数据，仅在缓存未命中时编码
+
+        Returns:
+            UTF-8 编码的 JSON 字节串
+        """
+        entry = self._entries.get(filename)
+        if entry and entry['version'] == version:
+            self.hits += 1
+            self.saved_seconds += entry['encode_seconds']
+            logger.debug("快照缓存命中: %s v%d, 节省编码 %.2fms", filename, version, entry['encode_seconds'] * 1000)
+            return entry['payload']
+
+        start = time.perf_counter()
+        payload = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        elapsed = time.perf_counter() - start
+
+        self.misses += 1
+        self.encode_seconds += elapsed
+        self.last_encode_seconds = elapsed
+        self.max_encode_seconds = max(self.max_encode_seconds, elapsed)
+        self._entries[filename] = {
+            'version': version,
+            'payload': payload,
+            'encode_seconds': elapsed
+        }
+        # 每次行编辑都会使版本号变化，未命中是常态，只在 DEBUG 级别记录，耗时见 /metrics
+        logger.debug("快照缓存编码: %s v%d, %d 字节, 耗时 %.2fms", filename, version, len(payload), elapsed * 1000)
+        return payload
+
+    def invalidate(self, filename: str) -> None:
+        """移除房间的缓存快照"""
+        self._entries.pop(filename, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计信息"""
+        return {
+            'rooms': len(self._entries),
+            'bytes': sum(len(e['payload']) for e in self._entries.values()),
+            'hits': self.hits,
+            'misses': self.misses,
+            'encode_ms': round(self.encode_seconds * 1000, 3),
+            'avg_encode_ms': round(self.encode_seconds * 1000 / self.misses, 3) if self.misses else 0.0,
+            'last_encode_ms': round(self.last_encode_seconds * 1000, 3),
+            'max_encode_ms': round(self.max_encode_seconds * 1000, 3),
+            'saved_encode_ms': round(self.saved_seconds * 1000, 3)
+        }
@@ -0,0 +1,236 @@
+"""
+进度时间序列模块 - 状态变更事件日志与按分钟/小时/天汇总的计数
+"""
+import os
+import json
+import time
+import fcntl
+import hashlib
+import logging
+from typing import Dict, List, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 汇总粒度（秒）
+RESOLUTIONS = {'minute': 60, 'hour': 3600, 'day': 86400}
+# 各粒度的保留时长（秒），None 表示永久保留
+RETENTION = {'minute': 2 * 86400, 'hour': 90 * 86400, 'day': None}
+
+
+class ProgressRollup:
+    """
+    状态变更的追加日志与汇总
+
+    每个工作进程按小时写各自的日志段 events-<YYYYmmddHH>-<pid>.log，每行一个
+    [时间戳, 文件名, 行索引, 原状态, 新状态]。后台任务按记录的偏移量读取新增的
+    事件，累加到每个文件的汇总文件中：{粒度: {桶开始时间: {状态: [转入数, 转出数]}}}。
+    多个工作进程中同一时间只有一个在汇总（非阻塞文件锁）。查询只读取汇总文件。
+    每个汇总文件同时记录已计入的日志偏移量，和计数一起原子替换，中断后重新汇总不会重复计数。
+    """
+
+    def __init__(self, folder: str, interval: float = 30, event_retention_days: int = 30):
+        self.folder = folder
+        self.rollup_folder = os.path.join(folder, 'rollups')
+        self.state_path = os.path.join(folder, 'state.json')
+        self.lock_path = os.path.join(folder, '.lock')
+        self.interval = interval
+        self.event_retention = event_retention_days * 86400
+        self._segment = None
+        self._segment_name = None
+        self._started = False
+        self.recorded = 0
+        self.rolled_up = 0
+
+    def _segment_for(self, ts: float) -> str:
+        return f"events-{time.strftime('%Y%m%d%H', time.gmtime(ts))}-{os.getpid()}.log"
+
+    def record(self, filename: str, row_index: int, old_status: Optional[str], new_status: str,
+               ts: Optional[float] = None) -> None:
+        """追加一条状态变更事件"""
+        self.record_many(filename, [(row_index, old_status, new_status)], ts)
+
+    def record_many(self, filename: str, changes: List[Tuple[int, Optional[str], str]],
+                    ts: Optional[float] = None) -> None:
+        """一次追加同一文件的多条状态变更事件，changes 为 [(行索引, 原状态, 新状态), ...]"""
+        if not changes:
+            return
+        ts = time.time() if ts is None else ts
+        name = self._segment_for(ts)
+        if name != self._segment_name:
+            if self._segment is not None:
+                self._segment.close()
+            os.makedirs(self.folder, exist_ok=True)
+            self._segment = open(os.path.join(self.folder, name), 'a', encoding='utf-8')
+            self._segment_name = name
+        self._segment.write(''.join(
+            json.dumps([int(ts), filename, row_index, old_status, new_status],
+                       ensure_ascii=False, separators=(',', ':')) + '\n'
+            for row_index, old_status, new_status in changes
+        ))
+        self._segment.flush()
+        self.recorded += len(changes)
+
+    def _rollup_path(self, filename: str) -> str:
+        digest = hashlib.blake2b(filename.encode('utf-8'), digest_size=16).hexdigest()
+        return os.path.join(self.rollup_folder, digest + '.json')
+
+    def _load_rollup(self, filename: str) -> Dict[str, Any]:
+        try:
+            with open(self._rollup_path(filename), 'r', encoding='utf-8') as f:
+                rollup = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            rollup = {'filename': filename, 'rolled_up_to': 0, **{resolution: {} for resolution in RESOLUTIONS}}
+        # offsets: 各日志段中已计入本汇总的字节位置
+        rollup.setdefault('offsets', {})
+        return rollup
+
+    @staticmethod
+    def _write_json(path: str, value: Any) -> None:
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(value, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    def roll_up(self) -> int:
+        """
+        汇总新增的事件
+
+        Returns:
+            本次汇总的事件数（其他进程正在汇总时返回 0）
+        """
+        os.makedirs(self.rollup_folder, exist_ok=True)
+        with open(self.lock_path, 'a') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0
+            try:
+                return self._roll_up_locked()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _roll_up_locked(self) -> int:
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                offsets = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            offsets = {}
+
+        rollups: Dict[str, Dict[str, Any]] = {}
+        count = 0
+        segments = sorted(name for name in os.listdir(self.folder) if name.startswith('events-'))
+        for name in segments:
+            path = os.path.join(self.folder, name)
+            start = offsets.get(name, 0)
+            with open(path, 'rb') as f:
+                f.seek(start)
+                chunk = f.read()
+            # 只处理完整的行，写了一半的行留到下次
+            end = chunk.rfind(b'\n') + 1
+            if not end:
+                continue
+            position = start
+            for line in chunk[:end - 1].split(b'\n'):
+                line_start = position
+                position += len(line) + 1
+                try:
+                    ts, filename, _, old_status, new_status = json.loads(line)
+                except (ValueError, TypeError):
+                    continue
+                rollup = rollups.get(filename)
+                if rollup is None:
+                    rollup = rollups[filename] = self._load_rollup(filename)
+                # 汇总文件和它已计入的日志偏移量在同一次替换中写入；状态文件落后于汇总文件时
+                # （上次汇总在两次写入之间中断），跳过已经计入的事件
+                if line_start < rollup['offsets'].get(name, 0):
+                    continue
+                for resolution, seconds in RESOLUTIONS.items():
+                    bucket = rollup[resolution].setdefault(str(ts - ts % seconds), {})
+                    bucket.setdefault(new_status, [0, 0])[0] += 1
+                    if old_status:
+                        bucket.setdefault(old_status, [0, 0])[1] += 1
+                rollup['rolled_up_to'] = max(rollup['rolled_up_to'], ts)
+                count += 1
+            offsets[name] = start + end
+
+        now = time.time()
+        for filename, rollup in rollups.items():
+            for resolution, seconds in RESOLUTIONS.items():
+                if RETENTION[resolution]:
+                    target = rollup[resolution]
+                    cutoff = now - RETENTION[resolution]
+                    for bucket in [b for b in target if int(b) < cutoff]:
+                        del target[bucket]
+            rollup['offsets'] = {name: offsets[name] for name in segments if name in offsets}
+            self._write_json(self._rollup_path(filename), rollup)
+
+        # 删除已汇总完、且超过保留期的旧日志段
+        current = self._segment_for(now)[:len('events-YYYYmmddHH')]
+        for name in segments:
+            path = os.path.join(self.folder, name)
+            if name[:len(current)] < current and offsets.get(name, 0) >= os.path.getsize(path) \
+                    and now - os.path.getmtime(path) > self.event_retention:
+                os.remove(path)
+                offsets.pop(name, None)
+
+        self._write_json(self.state_path, offsets)
+        self.rolled_up += count
+        return count
+
+    def query(self, filename: str, resolution: str, since: Optional[int] = None,
+              until: Optional[int] = None) -> Dict[str, Any]:
+        """
+        读取文件的进度时间序列
+
+        Returns:
+            {'filename', 'resolution', 'rolled_up_to',
+             'buckets': [{'start': 桶开始时间, 'status': {状态: {'in': 转入, 'out': 转出, 'net': 净变化}}}]}
+        """
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f'resolution 应为 {"/".join(RESOLUTIONS)}')
+        rollup = self._load_rollup(filename)
+        buckets = []
+        for start in sorted(int(bucket) for bucket in rollup[resolution]):
+            if (since is not None and start < since) or (until is not None and start > until):
+                continue
+            statuses = rollup[resolution][str(start)]
+            buckets.append({
+                'start': start,
+                'status': {
+                    status: {'in': moved_in, 'out': moved_out, 'net': moved_in - moved_out}
+                    for status, (moved_in, moved_out) in statuses.items()
+                }
+            })
+        return {
+            'filename': filename,
+            'resolution': resolution,
+            'rolled_up_to': rollup['rolled_up_to'],
+            'buckets': buckets
+        }
+
+    def remove(self, filename: str) -> None:
+        """删除文件的汇总（原始事件日志保留到过期）"""
+        try:
+            os.remove(self._rollup_path(filename))
+        except FileNotFoundError:
+            pass
+
+    def start(self, socketio) -> None:
+        """启动后台汇总任务（在工作进程中首次连接时调用）"""
+        if self._started:
+            return
+        self._started = True
+
+        def run():
+            while True:
+                socketio.sleep(self.interval)
+                try:
+                    self.roll_up()
+                except Exception as e:
+                    logger.error(f"进度汇总失败: {e}")
+
+        socketio.start_background_task(run)
+
+    def stats(self) -> Dict[str, Any]:
+        """进度事件统计信息"""
+        return {'recorded': self.recorded, 'rolled_up': self.rolled_up}
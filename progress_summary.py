@@ -0,0 +1,144 @@
+"""
+进度摘要模块 - 每个文件的完成情况摘要，文件列表无需打开文档即可显示进度
+"""
+import os
+import json
+import fcntl
+import logging
+from datetime import datetime
+from contextlib import contextmanager
+from typing import Dict, List, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+COMPLETED_STATUS = '已完成'
+
+
+def summarize_rows(rows: List[List[Any]]) -> Dict[str, Any]:
+    """
+    统计数据行的完成情况
+
+    Returns:
+        {'rows': 行数, 'status': {状态: 行数}, 'completed': 已完成比例,
+         'remaining': 未完成行的 {'quantity', 'boxes', 'groups', 'pieces'} 合计}
+    """
+    status_counts: Dict[str, int] = {}
+    remaining = {'quantity': 0, 'boxes': 0, 'groups': 0, 'pieces': 0}
+    for row in rows:
+        status = row[5] if len(row) > 5 and row[5] else '未完成'
+        status_counts[status] = status_counts.get(status, 0) + 1
+        if status == COMPLETED_STATUS:
+            continue
+        try:
+            remaining['quantity'] += int(row[1])
+            remaining['boxes'] += int(row[2])
+            remaining['groups'] += int(row[3])
+            remaining['pieces'] += int(row[4])
+        except (IndexError, ValueError, TypeError):
+            continue
+    return {
+        'rows': len(rows),
+        'status': status_counts,
+        'completed': round(status_counts.get(COMPLETED_STATUS, 0) / len(rows), 4) if rows else 0,
+        'remaining': remaining
+    }
+
+
+class SummaryCatalog:
+    """
+    所有文件的进度摘要目录
+
+    保存在上传目录下的一个 JSON 文件中（文件名 -> 摘要），在文件锁保护下由多个
+    工作进程共享；读取时按目录文件的修改时间复用已加载的内容。每条摘要记录对应
+    文档的修改时间，文档在摘要之外被改写时视为过期。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock_path = path + '.lock'
+        self._cache: Optional[Dict[str, Dict[str, Any]]] = None
+        self._cache_mtime = None
+
+    @contextmanager
+    def _locked(self, write: bool = False):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.lock_path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX if write else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        # 每次写入都会替换文件，inode 与修改时间一起判断，避免粗粒度时间戳的文件系统上读到旧内容
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return {}
+        mtime = (stat.st_ino, stat.st_mtime_ns)
+        if self._cache is None or mtime != self._cache_mtime:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._cache = json.load(f)
+            except json.JSONDecodeError as e:
+                logger.error(f"读取进度摘要失败: {e}")
+                self._cache = {}
+            self._cache_mtime = mtime
+        return self._cache
+
+    def _write(self, entries: Dict[str, Dict[str, Any]]) -> None:
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+        stat = os.stat(self.path)
+        self._cache = entries
+        self._cache_mtime = (stat.st_ino, stat.st_mtime_ns)
+
+    def update(self, filename: str, filepath: str, rows: List[List[Any]]) -> Dict[str, Any]:
+        """文档保存后更新其摘要"""
+        return self.update_many([(filename, filepath, rows)])[filename]
+
+    def update_many(self, documents: List[Tuple[str, str, List[List[Any]]]]) -> Dict[str, Dict[str, Any]]:
+        """
+        批量更新摘要（只写一次目录文件）
+
+        Args:
+            documents: [(文件名, 文件路径, 数据行), ...]
+        """
+        summaries = {}
+        for filename, filepath, rows in documents:
+            summary = summarize_rows(rows)
+            summary['updated_at'] = datetime.now().isoformat()
+            summary['mtime_ns'] = os.stat(filepath).st_mtime_ns
+            summaries[filename] = summary
+        if summaries:
+            with self._locked(write=True):
+                entries = dict(self._read())
+                entries.update(summaries)
+                self._write(entries)
+        return summaries
+
+    def remove(self, filename: str) -> None:
+        """删除文件的摘要"""
+        with self._locked(write=True):
+            entries = self._read()
+            if filename in entries:
+                entries = dict(entries)
+                del entries[filename]
+                self._write(entries)
+
+    def all(self) -> Dict[str, Dict[str, Any]]:
+        """全部摘要（调用方不得修改返回的数据）"""
+        with self._locked():
+            return self._read()
+
+    @staticmethod
+    def is_current(summary: Optional[Dict[str, Any]], filepath: str) -> bool:
+        """摘要是否与文档当前内容一致"""
+        if not summary:
+            return False
+        try:
+            return os.stat(filepath).st_mtime_ns == summary.get('mtime_ns')
+        except OSError:
+            return False
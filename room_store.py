@@ -0,0 +1,274 @@
+"""
+房间状态管理模块 - 按内存预算和空闲时间将冷房间转存到磁盘
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Any, Callable, Iterator, Optional, Tuple
+from room_sync import RoomSync
+
+logger = logging.getLogger(__name__)
+
+# 估算内存占用时抽样的行数
+SIZE_SAMPLE_ROWS = 32
+# JSON 编码长度换算为 Python 对象内存占用的系数（列表、字符串和整数对象的额外开销）
+OBJECT_OVERHEAD = 4
+
+
+def estimate_size(data: List[Any]) -> int:
+    """按抽样行的 JSON 长度估算文档的内存占用"""
+    if not data:
+        return 0
+    step = max(1, len(data) // SIZE_SAMPLE_ROWS)
+    sample = data[::step][:SIZE_SAMPLE_ROWS]
+    encoded = sum(len(json.dumps(row, ensure_ascii=False)) for row in sample)
+    # 行数据加上每行 16 位十六进制的行哈希
+    return (encoded * len(data) // len(sample) + 16 * len(data)) * OBJECT_OVERHEAD
+
+
+class RoomManager:
+    """
+    活跃房间状态，接口与 dict 相同
+
+    - 没有成员且空闲超过 idle_ttl 秒的房间转存到磁盘
+    - 估算内存超过 memory_budget 时，按最久未访问的顺序转存没有成员的房间
+    - 没有数据的空房间直接丢弃
+    - 访问已转存的房间时自动从磁盘恢复
+
+    每个工作进程的房间各自独立，转存目录按进程号区分。转存文件只是本进程的缓存，
+    进程退出后即被清理：有未保存修改的房间（版本号与 saved_version 不同）在转存前
+    先通过 persist 回调写回文档，转存期间其他读取者看到的也是最新内容。
+    """
+
+    def __init__(self, spill_folder: str, memory_budget: int, idle_ttl: float, sweep_interval: float = 60):
+        self.spill_folder = spill_folder
+        self.memory_budget = memory_budget
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+        # 文件名 -> 房间状态，按访问顺序排列（最久未访问的在前）
+        self._rooms: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._access: Dict[str, float] = {}
+        # 文件名 -> (版本号, 估算字节数)
+        self._sizes: Dict[str, Tuple[int, int]] = {}
+        self._spilled = set()
+        self._started = False
+        # (文件名, 房间) -> 是否已写回文档，由 start 设置
+        self.persist: Optional[Callable[[str, Dict[str, Any]], bool]] = None
+        self.evictions = {'idle': 0, 'budget': 0}
+        self.dropped = 0
+        self.reloads = 0
+
+    # dict 接口
+    def __contains__(self, filename: str) -> bool:
+        return self._load(filename) is not None
+
+    def __getitem__(self, filename: str) -> Dict[str, Any]:
+        room = self._load(filename)
+        if room is None:
+            raise KeyError(filename)
+        return room
+
+    def __setitem__(self, filename: str, room: Dict[str, Any]) -> None:
+        self._discard_spill(filename)
+        self._rooms[filename] = room
+        self._touch(filename)
+
+    def __delitem__(self, filename: str) -> None:
+        if filename not in self._rooms and filename not in self._spilled:
+            raise KeyError(filename)
+        self._rooms.pop(filename, None)
+        self._forget(filename)
+        self._discard_spill(filename)
+
+    def __len__(self) -> int:
+        return len(self._rooms)
+
+    def get(self, filename: str, default: Any = None) -> Any:
+        room = self._load(filename)
+        return default if room is None else room
+
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """内存中的房间（不恢复已转存的房间）"""
+        return iter(list(self._rooms.items()))
+
+    def _touch(self, filename: str) -> None:
+        self._rooms.move_to_end(filename)
+        self._access[filename] = time.monotonic()
+
+    def _forget(self, filename: str) -> None:
+        self._access.pop(filename, None)
+        self._sizes.pop(filename, None)
+
+    # 转存
+    def _spill_path(self, filename: str) -> str:
+        digest = hashlib.blake2b(filename.encode('utf-8'), digest_size=16).hexdigest()
+        return os.path.join(self.spill_folder, str(os.getpid()), digest + '.json')
+
+    def _discard_spill(self, filename: str) -> None:
+        if filename in self._spilled:
+            self._spilled.discard(filename)
+            try:
+                os.remove(self._spill_path(filename))
+            except FileNotFoundError:
+                pass
+
+    def _load(self, filename: str) -> Optional[Dict[str, Any]]:
+        room = self._rooms.get(filename)
+        if room is not None:
+            self._touch(filename)
+            return room
+        if filename not in self._spilled:
+            return None
+
+        path = self._spill_path(filename)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            logger.error("恢复房间 %s 失败: %s", filename, e)
+            self._spilled.discard(filename)
+            return None
+
+        room = {
+            'data': saved['data'],
+            'users': [],
+            'row_hashes': RoomSync.compute_row_hashes(saved['data']),
+            'version': saved['version'],
+            'saved_version': saved.get('saved_version')
+        }
+        self._spilled.discard(filename)
+        os.remove(path)
+        self._rooms[filename] = room
+        self._touch(filename)
+        self.reloads += 1
+        logger.info("房间 %s 已从磁盘恢复（版本 %d, %d 行）", filename, room['version'], len(room['data']))
+        return room
+
+    def _spill(self, filename: str) -> None:
+        """将房间数据写入磁盘后释放内存，空房间直接丢弃"""
+        room = self._rooms.pop(filename)
+        self._forget(filename)
+        if not room['data']:
+            self.dropped += 1
+            return
+
+        if self.persist and room.get('saved_version') != room['version']:
+            try:
+                if self.persist(filename, room):
+                    room['saved_version'] = room['version']
+            except Exception as e:
+                logger.error("转存前写回房间 %s 失败，修改只保存在本进程的转存文件中: %s", filename, e)
+
+        path = self._spill_path(filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'filename': filename, 'version': room['version'],
+                       'saved_version': room.get('saved_version'), 'data': room['data']},
+                      f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+        self._spilled.add(filename)
+
+    def _room_size(self, filename: str, room: Dict[str, Any]) -> int:
+        cached = self._sizes.get(filename)
+        if cached is None or cached[0] != room['version']:
+            cached = self._sizes[filename] = (room['version'], estimate_size(room['data']))
+        return cached[1]
+
+    def memory_usage(self) -> int:
+        """内存中所有房间的估算字节数"""
+        return sum(self._room_size(filename, room) for filename, room in self._rooms.items())
+
+    def sweep(self) -> List[str]:
+        """
+        转存空闲或超出内存预算的无成员房间
+
+        Returns:
+            被移出内存的文件名
+        """
+        evicted = []
+        now = time.monotonic()
+        for filename, room in list(self._rooms.items()):
+            if not room['users'] and now - self._access.get(filename, now) >= self.idle_ttl:
+                self._spill(filename)
+                self.evictions['idle'] += 1
+                evicted.append(filename)
+
+        usage = self.memory_usage()
+        if usage > self.memory_budget:
+            # 按最久未访问的顺序转存
+            for filename, room in list(self._rooms.items()):
+                if usage <= self.memory_budget:
+                    break
+                if room['users']:
+                    continue
+                usage -= self._room_size(filename, room)
+                self._spill(filename)
+                self.evictions['budget'] += 1
+                evicted.append(filename)
+            if usage > self.memory_budget:
+                logger.warning("房间内存估算 %d 字节超过预算 %d 字节，剩余房间均有在线用户", usage, self.memory_budget)
+
+        if evicted:
+            logger.info("转存 %d 个房间到磁盘，当前内存中 %d 个", len(evicted), len(self._rooms))
+        return evicted
+
+    def cleanup_stale(self) -> None:
+        """删除已退出进程遗留的转存目录"""
+        try:
+            entries = os.listdir(self.spill_folder)
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            if not entry.isdigit() or int(entry) == os.getpid():
+                continue
+            try:
+                os.kill(int(entry), 0)
+            except ProcessLookupError:
+                shutil.rmtree(os.path.join(self.spill_folder, entry), ignore_errors=True)
+            except PermissionError:
+                pass
+
+    def start(self, socketio, on_evict=None, persist=None) -> None:
+        """
+        启动后台清理任务（在工作进程中首次连接时调用）
+
+        Args:
+            on_evict: 房间移出内存后以文件名调用
+            persist: 转存有未保存修改的房间前以 (文件名, 房间) 调用，写回文档后返回 True
+        """
+        if self._started:
+            return
+        self._started = True
+        self.persist = persist
+        self.cleanup_stale()
+
+        def run():
+            while True:
+                socketio.sleep(self.sweep_interval)
+                try:
+                    evicted = self.sweep()
+                    if on_evict:
+                        for filename in evicted:
+                            on_evict(filename)
+                except Exception as e:
+                    logger.error(f"房间清理失败: {e}")
+
+        socketio.start_background_task(run)
+
+    def stats(self) -> Dict[str, Any]:
+        """房间状态统计信息"""
+        return {
+            'in_memory': len(self._rooms),
+            'spilled': len(self._spilled),
+            'estimated_bytes': self.memory_usage(),
+            'memory_budget': self.memory_budget,
+            'idle_ttl': self.idle_ttl,
+            'evictions': dict(self.evictions),
+            'dropped_empty': self.dropped,
+            'reloads': self.reloads
+        }
@@ -0,0 +1,41 @@
+"""
+房间文档同步模块 - 基于行哈希的增量差异计算
+"""
+import json
+import hashlib
+from typing import List, Any, Tuple
+
+
+class RoomSync:
+    """房间文档差异计算工具类"""
+
+    @staticmethod
+    def row_hash(row: Any) -> str:
+        """计算单行数据的哈希（跨进程稳定）"""
+        encoded = json.dumps(row, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        return hashlib.blake2b(encoded, digest_size=8).hexdigest()
+
+    @staticmethod
+    def compute_row_hashes(data: List[Any]) -> List[str]:
+        """计算整个文档的逐行哈希"""
+        return [RoomSync.row_hash(row) for row in data]
+
+    @staticmethod
+    def diff_rows(old_hashes: List[str], new_data: List[Any]) -> Tuple[List[List[Any]], List[str]]:
+        """
+        对比房间已有行哈希与新文档
+
+        Args:
+            old_hashes: 房间当前的逐行哈希
+            new_data: 客户端上传的新文档
+
+        Returns:
+            (变更行列表 [[行索引, 行数据], ...], 新文档的逐行哈希)
+        """
+        new_hashes = RoomSync.compute_row_hashes(new_data)
+        changed = [
+            [index, new_data[index]]
+            for index, row_hash in enumerate(new_hashes)
+            if index >= len(old_hashes) or old_hashes[index] != row_hash
+        ]
+        return changed, new_hashes
@@ -0,0 +1,153 @@
+"""
+物品名搜索索引模块 - 基于字符 n-gram 的倒排索引
+"""
+import os
+import time
+import logging
+from typing import Dict, List, Any, Set, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ItemSearchIndex:
+    """跨文件的物品名倒排索引（一元 + 二元字符 n-gram，中英文通用）"""
+
+    def __init__(self):
+        # n-gram -> {文件名: {行索引, ...}}
+        self._postings: Dict[str, Dict[str, Set[int]]] = {}
+        # 文件名 -> [(名称, 数量, 状态), ...]，按行索引存放
+        self._rows: Dict[str, List[tuple]] = {}
+        self.built = False
+
+    @staticmethod
+    def normalize(text: Any) -> str:
+        """统一大小写并去除空白"""
+        return ''.join(str(text).casefold().split())
+
+    @staticmethod
+    def ngrams(text: str) -> Set[str]:
+        """提取一元和二元字符 n-gram"""
+        grams = set(text)
+        grams.update(text[i:i + 2] for i in range(len(text) - 1))
+        return grams
+
+    def build(self, folder: str, loader: Callable[[str], List[List[Any]]],
+              accept: Callable[[str], bool] = lambda name: name.endswith(('.csv', '.sti'))) -> None:
+        """
+        扫描目录建立完整索引
+
+        Args:
+            folder: 上传目录
+            loader: 读取文件数据的函数，参数为文件路径
+            accept: 判断文件名是否需要索引的函数
+        """
+        start = time.perf_counter()
+        self._postings.clear()
+        self._rows.clear()
+        if os.path.exists(folder):
+            for filename in os.listdir(folder):
+                if not accept(filename):
+                    continue
+                try:
+                    self.update_file(filename, loader(os.path.join(folder, filename)))
+                except Exception as e:
+                    logger.warning(f"索引文件 {filename} 失败: {e}")
+        self.built = True
+        logger.info(f"物品搜索索引建立完成: {len(self._rows)} 个文件, {len(self._postings)} 个 n-gram, "
+                    f"耗时 {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    def update_file(self, filename: str, data: List[List[Any]]) -> None:
+        """用新的文件数据替换该文件的索引项"""
+        self.remove_file(filename)
+        rows = []
+        for row_index, row in enumerate(data or []):
+            try:
+                name = str(row[0])
+                quantity = row[1]
+                status = row[5] if len(row) > 5 else "未完成"
+            except (IndexError, TypeError):
+                name, quantity, status = '', 0, ''
+            rows.append((name, quantity, status))
+            for gram in self.ngrams(self.normalize(name)):
+                self._postings.setdefault(gram, {}).setdefault(filename, set()).add(row_index)
+        self._rows[filename] = rows
+
+    def remove_file(self, filename: str) -> None:
+        """移除文件的全部索引项"""
+        rows = self._rows.pop(filename, None)
+        if rows is None:
+            return
+        for name, _, _ in rows:
+            for gram in self.ngrams(self.normalize(name)):
+                files = self._postings.get(gram)
+                if files is None:
+                    continue
+                files.pop(filename, None)
+                if not files:
+                    del self._postings[gram]
+
+    def search(self, query: str, limit: int = 200,
+               live_status: Optional[Callable[[str, int], Optional[str]]] = None) -> List[Dict[str, Any]]:
+        """
+        搜索物品名包含查询串的行
+
+        Args:
+            query: 查询串
+            limit: 最多返回的匹配行数
+            live_status: 可选，返回房间内实时状态的函数 (文件名, 行索引) -> 状态
+
+        Returns:
+            按文件分组的匹配结果
+        """
+        needle = self.normalize(query)
+        if not needle:
+            return []
+
+        grams = {needle} if len(needle) == 1 else {needle[i:i + 2] for i in range(len(needle) - 1)}
+        candidates: Optional[Dict[str, Set[int]]] = None
+        # 从最短的倒排表开始求交集
+        for gram in sorted(grams, key=lambda g: sum(len(r) for r in self._postings.get(g, {}).values())):
+            files = self._postings.get(gram)
+            if not files:
+                return []
+            if candidates is None:
+                candidates = {f: set(rows) for f, rows in files.items()}
+            else:
+                candidates = {f: rows & files[f] for f, rows in candidates.items() if f in files}
+                candidates = {f: rows for f, rows in candidates.items() if rows}
+            if not candidates:
+                return []
+
+        results = []
+        remaining = limit
+        for filename in sorted(candidates or {}):
+            matches = []
+            rows = self._rows[filename]
+            for row_index in sorted(candidates[filename]):
+                name, quantity, status = rows[row_index]
+                # 二元组交集可能产生误报，最终以子串匹配确认
+                if needle not in self.normalize(name):
+                    continue
+                if live_status:
+                    status = live_status(filename, row_index) or status
+                matches.append({'row': row_index, 'name': name, 'quantity': quantity, 'status': status})
+                remaining -= 1
+                if remaining <= 0:
+                    break
+            if matches:
+                results.append({'filename': filename, 'matches': matches})
+            if remaining <= 0:
+                break
+        return results
+
+    def files(self) -> List[str]:
+        """已索引的文件名"""
+        return list(self._rows)
+
+    def stats(self) -> Dict[str, Any]:
+        """索引统计信息"""
+        return {
+            'files': len(self._rows),
+            'rows': sum(len(rows) for rows in self._rows.values()),
+            'ngrams': len(self._postings)
+        }
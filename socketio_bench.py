@@ -0,0 +1,257 @@
+"""
+Socket.IO 基准测试 - 比较 eventlet 与 ASGI 两种部署方式的单进程连接容量和广播延迟
+
+    python socketio_bench.py run [--url http://localhost:5000] [--clients 200] [--messages 500] [--pid 服务器进程号]
+    python socketio_bench.py compare [--clients 200] [--messages 500]
+
+run 对已启动的服务器测试；compare 在临时目录下依次启动单进程的 eventlet 服务器（python app.py）
+和 ASGI 服务器（uvicorn asgi:application），分别测试后汇总。
+
+所有客户端加入同一个临时文件，第一个客户端按固定间隔发送 item_updated，其余客户端记录
+从发送到收到广播的时间。给出服务器进程号时（compare 自动给出）同时报告每个连接占用的内存。
+"""
+import os
+import sys
+import json
+import time
+import socket
+import logging
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional
+
+from event_trace import percentile
+
+logger = logging.getLogger(__name__)
+
+# 测试文档的行数，广播依次更新各行
+DOCUMENT_ROWS = 1000
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def process_rss(pid: int) -> Optional[int]:
+    """进程常驻内存字节数（仅 Linux）"""
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _summary_ms(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'p50': round(percentile(values, 0.5) * 1000, 2),
+        'p95': round(percentile(values, 0.95) * 1000, 2),
+        'p99': round(percentile(values, 0.99) * 1000, 2),
+        'max': round(values[-1] * 1000, 2) if values else 0.0
+    }
+
+
+class SocketIOBenchmark:
+    """
+    连接与广播基准测试
+
+    连接阶段并发建立 clients 个 WebSocket 连接并加入同一文件；广播阶段由第一个连接发送
+    messages 次行状态更新，状态值带序号，接收方据此计算每次投递的延迟。
+    """
+
+    def __init__(self, url: str, clients: int = 200, messages: int = 500, interval: float = 0.01,
+                 timeout: float = 30, server_pid: Optional[int] = None, concurrency: int = 32):
+        self.url = url
+        self.clients = max(2, clients)
+        self.messages = messages
+        self.interval = interval
+        self.timeout = timeout
+        self.server_pid = server_pid
+        self.concurrency = concurrency
+        self.filename = f'bench-{os.getpid()}-{int(time.time())}.sti'
+        self._sent: Dict[int, float] = {}
+        self._latencies: List[float] = []
+        self._lock = threading.Lock()
+        self._received = threading.Condition(self._lock)
+
+    def _on_item_updated(self, data: Dict[str, Any]) -> None:
+        received = time.perf_counter()
+        status = str(data.get('status', ''))
+        if data.get('filename') != self.filename or not status.startswith('bench-'):
+            return
+        with self._received:
+            sent = self._sent.get(int(status[6:]))
+            if sent is not None:
+                self._latencies.append(received - sent)
+                self._received.notify_all()
+
+    def _connect(self, index: int):
+        import socketio
+
+        client = socketio.Client(reconnection=False)
+        client.on('item_updated', self._on_item_updated)
+        began = time.perf_counter()
+        try:
+            client.connect(self.url, transports=['websocket'], wait_timeout=self.timeout)
+            client.call('join_file', {'filename': self.filename, 'username': f'bench{index}'},
+                        timeout=self.timeout)
+        except Exception as e:
+            logger.debug("连接 %d 失败: %s", index, e)
+            if client.connected:
+                client.disconnect()
+            return None, time.perf_counter() - began
+        return client, time.perf_counter() - began
+
+    def run(self) -> Dict[str, Any]:
+        """执行测试并返回报告"""
+        rss_before = process_rss(self.server_pid) if self.server_pid else None
+
+        # 第一个连接创建文档，之后的连接加入时会收到完整文档
+        sender, sender_time = self._connect(0)
+        if sender is None:
+            raise RuntimeError(f'无法连接到 {self.url}')
+        rows = [[f'bench item {i}', '64', 0, 1, 0, '未完成'] for i in range(DOCUMENT_ROWS)]
+        sender.call('file_loaded', {'filename': self.filename, 'data': rows}, timeout=self.timeout)
+
+        began = time.perf_counter()
+        with ThreadPoolExecutor(self.concurrency) as pool:
+            results = list(pool.map(self._connect, range(1, self.clients)))
+        connect_elapsed = time.perf_counter() - began
+        receivers = [client for client, _ in results if client is not None]
+        connect_times = [sender_time] + [elapsed for client, elapsed in results if client is not None]
+        rss_after = process_rss(self.server_pid) if self.server_pid else None
+
+        began = time.perf_counter()
+        for seq in range(self.messages):
+            with self._lock:
+                self._sent[seq] = time.perf_counter()
+            sender.emit('item_updated', {'filename': self.filename, 'rowIndex': seq % DOCUMENT_ROWS,
+                                         'status': f'bench-{seq}', 'username': 'bench0'})
+            if self.interval:
+                time.sleep(self.interval)
+        expected = self.messages * len(receivers)
+        deadline = time.monotonic() + self.timeout
+        with self._received:
+            while len(self._latencies) < expected and time.monotonic() < deadline:
+                self._received.wait(deadline - time.monotonic())
+            latencies = list(self._latencies)
+        broadcast_elapsed = time.perf_counter() - began
+
+        with ThreadPoolExecutor(self.concurrency) as pool:
+            list(pool.map(lambda client: client.disconnect(), receivers + [sender]))
+
+        report = {
+            'url': self.url,
+            'clients': self.clients,
+            'connected': len(receivers) + 1,
+            'connect_errors': self.clients - len(receivers) - 1,
+            'connect_rate': round(len(receivers) / connect_elapsed, 1) if connect_elapsed > 0 else 0,
+            'connect_ms': _summary_ms(connect_times),
+            'messages': self.messages,
+            'deliveries': len(latencies),
+            'lost': expected - len(latencies),
+            'delivery_rate': round(len(latencies) / broadcast_elapsed, 1) if broadcast_elapsed > 0 else 0,
+            'broadcast_latency_ms': _summary_ms(latencies)
+        }
+        if rss_before is not None and rss_after is not None:
+            report['server_rss_mb'] = round(rss_after / 1024 / 1024, 1)
+            report['rss_per_connection_kb'] = round((rss_after - rss_before) / 1024 / (len(receivers) + 1), 1)
+        return report
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(url: str, process: subprocess.Popen, timeout: float) -> bool:
+    import requests
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and process.poll() is None:
+        try:
+            if requests.get(url + '/health', timeout=1).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def start_server(mode: str, port: int, folder: str) -> subprocess.Popen:
+    """在临时目录下启动单进程服务器（eventlet 或 asgi）"""
+    env = dict(os.environ, HOST='127.0.0.1', PORT=str(port), FLASK_ENV='production', LOG_LEVEL='WARNING',
+               UPLOAD_FOLDER=os.path.join(folder, 'uploads'), USERS_FOLDER=os.path.join(folder, 'users'),
+               TRACE_ENABLED='false', PRELOAD_DOCUMENTS='0')
+    if mode == 'eventlet':
+        command = [sys.executable, 'app.py']
+    else:
+        command = [sys.executable, '-m', 'uvicorn', 'asgi:application', '--host', '127.0.0.1',
+                   '--port', str(port), '--log-level', 'warning']
+    return subprocess.Popen(command, cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def compare(modes: List[str], **options) -> Dict[str, Any]:
+    """依次启动各模式的服务器并测试"""
+    reports = {}
+    for mode in modes:
+        port = _free_port()
+        url = f'http://127.0.0.1:{port}'
+        with tempfile.TemporaryDirectory(prefix=f'bench-{mode}-') as folder:
+            process = start_server(mode, port, folder)
+            try:
+                if not _wait_ready(url, process, 30):
+                    reports[mode] = {'error': '服务器启动失败'}
+                    continue
+                logger.info("测试 %s 模式: %s", mode, url)
+                reports[mode] = SocketIOBenchmark(url, server_pid=process.pid, **options).run()
+            except Exception as e:
+                reports[mode] = {'error': str(e)}
+            finally:
+                process.terminate()
+                try:
+                    process.wait(10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+    return reports
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Socket.IO 连接与广播基准测试')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run = subparsers.add_parser('run', help='测试已启动的服务器')
+    run.add_argument('--url', default='http://localhost:5000')
+    run.add_argument('--pid', type=int, help='服务器进程号，用于统计每个连接占用的内存')
+    both = subparsers.add_parser('compare', help='分别启动 eventlet 和 ASGI 服务器并对比')
+    both.add_argument('--modes', default='eventlet,asgi')
+    for command in (run, both):
+        command.add_argument('--clients', type=int, default=200, help='连接数（含发送者）')
+        command.add_argument('--messages', type=int, default=500, help='广播次数')
+        command.add_argument('--interval', type=float, default=0.01, help='发送间隔秒数')
+        command.add_argument('--timeout', type=float, default=30)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    try:
+        import socketio  # noqa: F401
+        import requests  # noqa: F401
+    except ImportError:
+        print('基准测试需要 Socket.IO 客户端: pip install "python-socketio[client]"', file=sys.stderr)
+        return 2
+
+    options = {'clients': args.clients, 'messages': args.messages, 'interval': args.interval,
+               'timeout': args.timeout}
+    if args.command == 'run':
+        report = SocketIOBenchmark(args.url, server_pid=args.pid, **options).run()
+        failed = report['connect_errors'] or report['lost']
+    else:
+        report = compare([mode.strip() for mode in args.modes.split(',') if mode.strip()], **options)
+        failed = any('error' in entry or entry['connect_errors'] or entry['lost'] for entry in report.values())
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
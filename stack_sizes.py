@@ -0,0 +1,207 @@
+"""
+堆叠数量模块 - 按物品名的最大堆叠数注册表与盒/组/个的批量重算
+"""
+import os
+import json
+import hashlib
+import logging
+import functools
+from typing import Dict, List, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 每盒（潜影盒）的格数
+SLOTS_PER_BOX = 27
+
+# 内置的非 64 堆叠物品（精确名称）
+DEFAULT_STACK_SIZES = {
+    '末影珍珠': 16, 'ender_pearl': 16,
+    '雪球': 16, 'snowball': 16,
+    '鸡蛋': 16, 'egg': 16,
+    '桶': 16, 'bucket': 16,
+    '盔甲架': 16, 'armor_stand': 16,
+    '蜂蜜瓶': 16, 'honey_bottle': 16,
+    '书与笔': 1, 'writable_book': 1,
+    '鞍': 1, 'saddle': 1,
+    '蛋糕': 1, 'cake': 1,
+    '图腾': 1, 'totem_of_undying': 1,
+    '三叉戟': 1, 'trident': 1,
+    '弓': 1, 'bow': 1,
+    '弩': 1, 'crossbow': 1,
+    '盾牌': 1, 'shield': 1,
+    '鞘翅': 1, 'elytra': 1,
+    '矿车': 1, 'minecart': 1,
+    # 装有东西的桶（“木桶”是可堆叠 64 的方块，不能按“桶”后缀匹配）
+    '水桶': 1, '岩浆桶': 1, '牛奶桶': 1, '奶桶': 1, '细雪桶': 1, '粉雪桶': 1,
+    '鳕鱼桶': 1, '鲑鱼桶': 1, '河豚桶': 1, '热带鱼桶': 1, '美西螈桶': 1, '蝌蚪桶': 1,
+}
+
+# 后缀规则匹配结果的缓存条目数上限
+SUFFIX_CACHE_SIZE = 4096
+
+# 按名称后缀匹配的规则（中文名与英文 ID 各一份）
+SUFFIX_STACK_SIZES = (
+    ('告示牌', 16), ('_sign', 16),
+    ('旗帜', 16), ('_banner', 16),
+    ('床', 1), ('_bed', 1),
+    ('潜影盒', 1), ('shulker_box', 1),
+    ('_bucket', 1),
+    ('药水', 1), ('potion', 1),
+    ('船', 1), ('_boat', 1),
+    ('唱片', 1), ('music_disc', 1),
+    ('剑', 1), ('_sword', 1),
+    ('镐', 1), ('_pickaxe', 1),
+    ('斧', 1), ('_axe', 1),
+    ('锹', 1), ('_shovel', 1),
+    ('锄', 1), ('_hoe', 1),
+    ('头盔', 1), ('_helmet', 1),
+    ('胸甲', 1), ('_chestplate', 1),
+    ('护腿', 1), ('_leggings', 1),
+    ('靴子', 1), ('_boots', 1),
+)
+
+
+class StackSizeRegistry:
+    """物品最大堆叠数注册表：内置表 + 全局自定义 + 每个文件的覆盖值"""
+
+    def __init__(self, path: str, default_stack: int = 64, slots_per_box: int = SLOTS_PER_BOX):
+        self.path = path
+        self.default_stack = default_stack
+        self.slots_per_box = slots_per_box
+        self.custom: Dict[str, int] = {}
+        # 物品名 -> 堆叠数，加载时由内置表和全局自定义展开
+        self._lookup: Dict[str, int] = {}
+        # 后缀规则只依赖物品名，结果放在有界的 LRU 缓存中
+        self._suffix_size = functools.lru_cache(maxsize=SUFFIX_CACHE_SIZE)(self._match_suffix)
+        self.version = 0
+        self.load()
+
+    @staticmethod
+    def validate(items: Any) -> Dict[str, int]:
+        """校验 {物品名: 堆叠数} 映射"""
+        if not isinstance(items, dict):
+            raise ValueError('堆叠数量必须是 {物品名: 数量} 格式')
+        result = {}
+        for name, size in items.items():
+            name = str(name).strip()
+            try:
+                size = int(size)
+            except (TypeError, ValueError):
+                raise ValueError(f'物品 {name} 的堆叠数量无效')
+            if not name or not 1 <= size <= 99:
+                raise ValueError(f'物品 {name} 的堆叠数量必须在 1-99 之间')
+            result[name] = size
+        return result
+
+    def load(self) -> None:
+        """加载全局自定义堆叠数"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.custom = self.validate(json.load(f))
+        except FileNotFoundError:
+            self.custom = {}
+        except (ValueError, json.JSONDecodeError) as e:
+            logger.error(f"加载堆叠数量配置失败: {e}")
+            self.custom = {}
+        self._lookup = dict(DEFAULT_STACK_SIZES)
+        self._lookup.update(self.custom)
+        self.version += 1
+
+    def update(self, items: Dict[str, int]) -> None:
+        """更新并保存全局自定义堆叠数"""
+        self.custom.update(self.validate(items))
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.custom, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+        self.load()
+        logger.info(f"更新堆叠数量配置: {len(items)} 项")
+
+    def stack_size(self, name: str, overrides: Optional[Dict[str, int]] = None) -> int:
+        """查询物品的最大堆叠数"""
+        if overrides and name in overrides:
+            return overrides[name]
+        size = self._lookup.get(name)
+        return size if size is not None else self._suffix_size(name)
+
+    def _match_suffix(self, name: str) -> int:
+        for suffix, suffix_size in SUFFIX_STACK_SIZES:
+            if name.endswith(suffix):
+                return suffix_size
+        return self.default_stack
+
+    def calculate(self, name: str, quantity: Any, overrides: Optional[Dict[str, int]] = None) -> Tuple[int, int, int]:
+        """按物品的堆叠数计算盒数、组数和个数"""
+        try:
+            quantity = int(quantity)
+        except (ValueError, TypeError):
+            return 0, 0, 0
+        items_per_group = self.stack_size(name, overrides)
+        total_boxes = quantity // (items_per_group * self.slots_per_box)
+        total_groups = (quantity // items_per_group) - (total_boxes * self.slots_per_box)
+        pieces = quantity - ((total_boxes * self.slots_per_box + total_groups) * items_per_group)
+        return total_boxes, total_groups, pieces
+
+    def recompute(self, rows: List[List[Any]], overrides: Optional[Dict[str, int]] = None) -> List[List[Any]]:
+        """
+        批量重算整个文档的盒/组/个（不修改传入的数据）
+
+        Returns:
+            发生变化的行 [[行索引, 新行数据], ...]
+        """
+        changed = []
+        for index, row in enumerate(rows):
+            if len(row) < 5:
+                continue
+            derived = list(self.calculate(str(row[0]), row[1], overrides))
+            if list(row[2:5]) != derived:
+                changed.append([index, [row[0], row[1]] + derived + list(row[5:])])
+        return changed
+
+    @staticmethod
+    def apply(rows: List[List[Any]], changed: List[List[Any]]) -> List[List[Any]]:
+        """返回应用了变更行的新列表"""
+        if not changed:
+            return rows
+        rows = list(rows)
+        for index, row in changed:
+            rows[index] = row
+        return rows
+
+    def overrides_key(self, document_path: str) -> str:
+        """解析结果依赖的堆叠数配置标识（全局配置版本 + 文件级覆盖值的摘要）"""
+        overrides = self.load_overrides(document_path)
+        if not overrides:
+            return f'{self.version}:-'
+        encoded = json.dumps(overrides, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        return f'{self.version}:{hashlib.sha1(encoded).hexdigest()[:16]}'
+
+    @staticmethod
+    def overrides_path(document_path: str) -> str:
+        """文件级覆盖值的存放路径（与文档同目录）"""
+        return document_path + '.stacks.json'
+
+    def load_overrides(self, document_path: str) -> Dict[str, int]:
+        """读取文件级覆盖值"""
+        try:
+            with open(self.overrides_path(document_path), 'r', encoding='utf-8') as f:
+                return self.validate(json.load(f))
+        except FileNotFoundError:
+            return {}
+        except (ValueError, json.JSONDecodeError) as e:
+            logger.error(f"读取文件堆叠数量覆盖失败 {document_path}: {e}")
+            return {}
+
+    def save_overrides(self, document_path: str, overrides: Dict[str, int]) -> None:
+        """保存文件级覆盖值，为空时删除覆盖文件"""
+        path = self.overrides_path(document_path)
+        if not overrides:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.validate(overrides), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
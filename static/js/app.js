@@ -8,7 +8,15 @@ const CONFIG = {
     AUTO_SAVE_INTERVAL: 30000,
     DOUBLE_CLICK_DELAY: 500,
     MIN_TOUCH_TARGET: 44,
-    NOTIFICATION_DURATION: 5000
+    NOTIFICATION_DURATION: 5000,
+    CHUNK_UPLOAD_THRESHOLD: 8 * 1024 * 1024,
+    CHUNK_UPLOAD_SIZE: 4 * 1024 * 1024,
+    CHUNK_UPLOAD_RETRIES: 5,
+    ASYNC_PARSE_THRESHOLD: 2 * 1024 * 1024,
+    PARSE_JOB_POLL_INTERVAL: 3000,
+    VIRTUAL_TABLE_THRESHOLD: 200,
+    TABLE_ROW_HEIGHT: 49,
+    TABLE_OVERSCAN: 20
 };
 
 // 全局状态管理
@@ -21,6 +29,11 @@ const AppState = {
     autoSaveInterval: null,
     lastSavedData: null,
     mobileSelectedRow: null,
+    statusCounts: {},
+    // 分页接收文档期间到达的行更新，最后一页到达后按顺序应用
+    pendingUpdates: null,
+    rowHeight: 0,
+    renderedRange: [0, 0],
     isIOS: /iPad|iPhone|iPod/.test(navigator.userAgent) && !window.MSStream,
     isMobile: /Android|webOS|iPhone|iPad|iPod|BlackBerry|IEMobile|Opera Mini/i.test(navigator.userAgent)
 };
@@ -95,6 +108,37 @@ const Utils = {
         };
     },
 
+    // 计算文件 SHA-256（仅在安全上下文可用，否则返回 null 由服务器跳过校验）
+    async sha256(file) {
+        if (!window.crypto || !window.crypto.subtle) return null;
+        const digest = await window.crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+        return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+    },
+
+    // 批量更新选中行的解码：游程 [[起始行, 行数], ...] 或 base64 位图
+    decodeSelection(data) {
+        const indexes = [];
+        if (data.runs) {
+            data.runs.forEach(([start, length]) => {
+                for (let i = start; i < start + length; i++) indexes.push(i);
+            });
+            return indexes;
+        }
+        const bitmap = atob(data.bitmap);
+        for (let i = 0; i < data.total; i++) {
+            if ((bitmap.charCodeAt(i >> 3) >> (i & 7)) & 1) indexes.push(i);
+        }
+        return indexes;
+    },
+
+    // 解析服务器下发的文档（预编码的二进制快照或普通 JSON）
+    decodeDocument(data) {
+        if (data.payload) {
+            return JSON.parse(new TextDecoder('utf-8').decode(data.payload));
+        }
+        return data.data || [];
+    },
+
     // 安全的 DOM 元素获取
     getElement(id) {
         const element = document.getElementById(id);
@@ -135,6 +179,8 @@ class MaterialsApp {
         this.setupAutoSave();
         this.setupMobileFeatures();
         this.setupContextMenu();
+        this.setupTableEvents();
+        this.setupVirtualScroll();
     }
 
     initializeDOM() {
@@ -144,6 +190,7 @@ class MaterialsApp {
             appContainer: Utils.getElement('appContainer'),
             fileInput: Utils.getElement('fileInput'),
             tableBody: Utils.getElement('tableBody'),
+            tableWrapper: document.querySelector('.table-wrapper'),
             statsBar: Utils.getElement('statsBar'),
             totalItems: Utils.getElement('totalItems'),
             completedItems: Utils.getElement('completedItems'),
@@ -367,38 +414,45 @@ class MaterialsApp {
     if (!file) return;
 
     // 验证文件类型
-    const allowedTypes = ['.csv', '.sti', 'text/csv', 'application/octet-stream'];
-    const fileExtension = file.name.toLowerCase().slice(-4);
+    const allowedTypes = ['.csv', '.sti', '.litematic', 'text/csv', 'application/octet-stream'];
+    const fileExtension = file.name.toLowerCase().slice(file.name.lastIndexOf('.'));
     
     if (!allowedTypes.includes(fileExtension) && !allowedTypes.includes(file.type)) {
-        Utils.showNotification('请选择 CSV 或 STI 格式的文件', 'error');
+        Utils.showNotification('请选择 CSV、STI 或 Litematic 格式的文件', 'error');
         event.target.value = '';
         return;
     }
 
-    // 文件大小限制 (10MB)
-    const maxSize = 10 * 1024 * 1024;
-    if (file.size > maxSize) {
-        Utils.showNotification('文件大小不能超过 10MB', 'error');
-        event.target.value = '';
-        return;
-    }
-
-    const formData = new FormData();
-    formData.append('file', file);
-
     try {
         Utils.showNotification('正在上传文件...', 'info');
         
-        const response = await fetch('/upload', {
-            method: 'POST',
-            body: formData
-        });
+        let data;
+        if (file.size > CONFIG.CHUNK_UPLOAD_THRESHOLD) {
+            // 大文件分块上传，断线后可续传
+            data = await this.uploadInChunks(file);
+        } else {
+            const formData = new FormData();
+            formData.append('file', file);
+            if (file.size > CONFIG.ASYNC_PARSE_THRESHOLD && AppState.socket && AppState.socket.connected) {
+                // 较大的文件在服务器后台解析，进度通过 Socket.IO 推送
+                formData.append('async', '1');
+                formData.append('sid', AppState.socket.id);
+            }
+            
+            const response = await fetch('/upload', {
+                method: 'POST',
+                body: formData
+            });
 
-        const data = await response.json();
+            data = await response.json();
 
-        if (!response.ok) {
-            throw new Error(data.error || data.message || `上传失败: ${response.status}`);
+            if (!response.ok) {
+                throw new Error(data.error || data.message || `上传失败: ${response.status}`);
+            }
+        }
+
+        if (data.job_id) {
+            data = await this.waitForParseJob(data.job_id);
         }
 
         // 检查服务器返回的数据结构
@@ -445,6 +499,134 @@ class MaterialsApp {
     }
 }
 
+async uploadInChunks(file) {
+    const resumeKey = `chunkedUpload:${file.name}:${file.size}:${file.lastModified}`;
+    let uploadId = localStorage.getItem(resumeKey);
+    let offset = 0;
+    let chunkSize = CONFIG.CHUNK_UPLOAD_SIZE;
+    
+    // 尝试恢复之前中断的上传
+    if (uploadId) {
+        const response = await fetch(`/upload/chunked/${uploadId}`);
+        if (response.ok) {
+            offset = (await response.json()).offset;
+            console.log(`恢复分块上传 ${uploadId}，已上传 ${offset} 字节`);
+        } else {
+            uploadId = null;
+        }
+    }
+    
+    if (!uploadId) {
+        const response = await fetch('/upload/chunked/init', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                filename: file.name,
+                size: file.size,
+                sha256: await Utils.sha256(file)
+            })
+        });
+        const data = await response.json();
+        if (!response.ok) {
+            throw new Error(data.error || `上传失败: ${response.status}`);
+        }
+        uploadId = data.upload_id;
+        chunkSize = data.chunk_size || chunkSize;
+        localStorage.setItem(resumeKey, uploadId);
+    }
+    
+    let retries = 0;
+    while (offset < file.size) {
+        try {
+            const response = await fetch(`/upload/chunked/${uploadId}?offset=${offset}`, {
+                method: 'PUT',
+                headers: { 'Content-Type': 'application/octet-stream' },
+                body: file.slice(offset, offset + chunkSize)
+            });
+            const data = await response.json();
+            
+            // 409 表示偏移量不一致，按服务器记录的位置继续
+            if (!response.ok && response.status !== 409) {
+                throw new Error(data.error || `上传失败: ${response.status}`);
+            }
+            offset = data.offset;
+            retries = 0;
+            Utils.showNotification(`正在上传文件... ${Math.floor(offset * 100 / file.size)}%`, 'info');
+        } catch (error) {
+            if (++retries > CONFIG.CHUNK_UPLOAD_RETRIES) {
+                throw error;
+            }
+            console.warn(`分块上传失败，第 ${retries} 次重试:`, error);
+            await new Promise(resolve => setTimeout(resolve, 1000 * retries));
+        }
+    }
+    
+    const socketConnected = AppState.socket && AppState.socket.connected;
+    const response = await fetch(`/upload/chunked/${uploadId}/finalize`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(socketConnected ? { async: true, sid: AppState.socket.id } : {})
+    });
+    const data = await response.json();
+    if (response.status !== 409) {
+        localStorage.removeItem(resumeKey);
+    }
+    if (!response.ok) {
+        throw new Error(data.error || `上传失败: ${response.status}`);
+    }
+    return data;
+}
+
+waitForParseJob(jobId) {
+    // 等待后台解析完成：优先使用 Socket.IO 推送，同时定时轮询以防推送丢失
+    return new Promise((resolve, reject) => {
+        const socket = AppState.socket;
+        let timer = null;
+        
+        const finish = (job) => {
+            if (job.job_id !== jobId || (job.status !== 'done' && job.status !== 'failed')) {
+                return false;
+            }
+            clearInterval(timer);
+            if (socket) {
+                socket.off('parse_progress', onProgress);
+                socket.off('parse_complete', finish);
+            }
+            if (job.status === 'done') {
+                resolve({ success: true, filename: job.filename, version: job.version });
+            } else {
+                reject(new Error(`文件解析失败: ${job.error}`));
+            }
+            return true;
+        };
+        
+        const onProgress = (job) => {
+            if (job.job_id === jobId) {
+                Utils.showNotification(`正在解析文件... 已解析 ${job.rows} 行`, 'info');
+            }
+        };
+        
+        if (socket) {
+            socket.on('parse_progress', onProgress);
+            socket.on('parse_complete', finish);
+        }
+        
+        timer = setInterval(async () => {
+            try {
+                const response = await fetch(`/jobs/${jobId}`);
+                if (response.ok) {
+                    const job = await response.json();
+                    if (!finish(job)) {
+                        onProgress(job);
+                    }
+                }
+            } catch (error) {
+                console.warn('查询解析任务失败:', error);
+            }
+        }, CONFIG.PARSE_JOB_POLL_INTERVAL);
+    });
+}
+
 async restoreLastSession() {
     try {
         const lastFile = localStorage.getItem('lastOpenedFile');
@@ -484,12 +666,49 @@ async restoreLastSession() {
                 </td>
             </tr>
         `;
+        AppState.renderedRange = [0, 0];
         return;
     }
 
-    DOM.tableBody.innerHTML = AppState.currentData.map((row, index) => {
-        const status = row[5];
-        const statusConfig = this.getStatusConfig(status);
+    // 只渲染可见区域及上下预留的行，其余行用等高的占位行代替
+    const total = AppState.currentData.length;
+    const rowHeight = AppState.rowHeight || CONFIG.TABLE_ROW_HEIGHT;
+    const [start, end] = this.visibleRange(CONFIG.TABLE_OVERSCAN);
+    const parts = [];
+    if (start > 0) parts.push(this.renderSpacer(start * rowHeight));
+    for (let index = start; index < end; index++) {
+        parts.push(this.renderRow(index));
+    }
+    if (end < total) parts.push(this.renderSpacer((total - end) * rowHeight));
+    DOM.tableBody.innerHTML = parts.join('');
+    AppState.renderedRange = [start, end];
+
+    // 按实际渲染的行高修正估算值
+    if (!AppState.rowHeight) {
+        const firstRow = DOM.tableBody.querySelector('tr[data-index]');
+        if (firstRow && firstRow.offsetHeight) {
+            AppState.rowHeight = firstRow.offsetHeight;
+        }
+    }
+}
+
+    // 可见行的索引范围 [start, end)，两端各加 overscan 行
+    visibleRange(overscan) {
+        const total = AppState.currentData.length;
+        if (!DOM.tableWrapper || total <= CONFIG.VIRTUAL_TABLE_THRESHOLD) {
+            return [0, total];
+        }
+        const rowHeight = AppState.rowHeight || CONFIG.TABLE_ROW_HEIGHT;
+        const head = DOM.tableBody.parentElement.tHead;
+        const offset = Math.max(0, DOM.tableWrapper.scrollTop - (head ? head.offsetHeight : 0));
+        const first = Math.min(total, Math.floor(offset / rowHeight));
+        const last = Math.min(total, Math.ceil((offset + DOM.tableWrapper.clientHeight) / rowHeight));
+        return [Math.max(0, first - overscan), Math.min(total, last + overscan)];
+    }
+
+    renderRow(index) {
+        const row = AppState.currentData[index];
+        const statusConfig = this.getStatusConfig(row[5]);
         const isSelected = index === AppState.selectedRow;
         
         return `
@@ -499,10 +718,39 @@ async restoreLastSession() {
                 ).join('')}
             </tr>
         `;
-    }).join('');
+    }
 
-    this.attachTableEventListeners();
-}
+    renderSpacer(height) {
+        return `<tr class="virtual-spacer" aria-hidden="true"><td colspan="6" style="height: ${height}px;"></td></tr>`;
+    }
+
+    // 只替换一行的 DOM，行不在渲染范围内时无需处理
+    updateRow(index) {
+        if (!DOM.tableBody) return;
+        const element = DOM.tableBody.querySelector(`tr[data-index="${index}"]`);
+        if (element) {
+            element.outerHTML = this.renderRow(index);
+        }
+    }
+
+    // 滚动时可见区域超出已渲染的范围才重新渲染
+    setupVirtualScroll() {
+        if (!DOM.tableWrapper) return;
+        const onScroll = () => {
+            if (this.scrollPending) return;
+            this.scrollPending = true;
+            requestAnimationFrame(() => {
+                this.scrollPending = false;
+                const [start, end] = this.visibleRange(0);
+                const [renderedStart, renderedEnd] = AppState.renderedRange;
+                if (start < renderedStart || end > renderedEnd) {
+                    this.renderTable();
+                }
+            });
+        };
+        DOM.tableWrapper.addEventListener('scroll', onScroll, { passive: true });
+        window.addEventListener('resize', onScroll);
+    }
 
     getStatusConfig(status) {
         const configs = {
@@ -520,36 +768,45 @@ async restoreLastSession() {
         return `${emoji} ${cell}`;
     }
 
-    attachTableEventListeners() {
+    // 表格行事件委托到 tbody，重新渲染行时无需重新绑定
+    setupTableEvents() {
     if (!DOM.tableBody) return;
     
-    const rows = DOM.tableBody.querySelectorAll('tr');
-    rows.forEach(row => {
-        if (!AppState.isMobile) {
-            // 桌面端右键菜单
-            row.addEventListener('contextmenu', (e) => {
-                e.preventDefault();
-                AppState.selectedRow = parseInt(row.dataset.index);
-                this.showContextMenu(e);
-            });
-            
-            // 桌面端左键点击也可以选中行（可选功能）
-            row.addEventListener('click', (e) => {
-                if (!e.ctrlKey && !e.metaKey) {
-                    // 清除其他行的选中状态
-                    rows.forEach(r => r.classList.remove('selected-row'));
-                }
-                row.classList.add('selected-row');
-                AppState.selectedRow = parseInt(row.dataset.index);
-            });
-        } else {
-            // 移动端点击事件
-            row.addEventListener('click', (e) => {
-                AppState.mobileSelectedRow = parseInt(row.dataset.index);
-                this.showMobileStatusModal();
-            });
-        }
-    });
+    const rowFromEvent = (e) => {
+        const row = e.target.closest('tr[data-index]');
+        return row && DOM.tableBody.contains(row) ? row : null;
+    };
+    
+    if (!AppState.isMobile) {
+        // 桌面端右键菜单
+        DOM.tableBody.addEventListener('contextmenu', (e) => {
+            const row = rowFromEvent(e);
+            if (!row) return;
+            e.preventDefault();
+            AppState.selectedRow = parseInt(row.dataset.index);
+            this.showContextMenu(e);
+        });
+        
+        // 桌面端左键点击也可以选中行（可选功能）
+        DOM.tableBody.addEventListener('click', (e) => {
+            const row = rowFromEvent(e);
+            if (!row) return;
+            if (!e.ctrlKey && !e.metaKey) {
+                // 清除其他行的选中状态
+                DOM.tableBody.querySelectorAll('tr.selected-row').forEach(r => r.classList.remove('selected-row'));
+            }
+            row.classList.add('selected-row');
+            AppState.selectedRow = parseInt(row.dataset.index);
+        });
+    } else {
+        // 移动端点击事件
+        DOM.tableBody.addEventListener('click', (e) => {
+            const row = rowFromEvent(e);
+            if (!row) return;
+            AppState.mobileSelectedRow = parseInt(row.dataset.index);
+            this.showMobileStatusModal();
+        });
+    }
 }
 
     showContextMenu(e) {
@@ -655,8 +912,8 @@ handleContextMenuAction(action) {
     AppState.currentData[rowIndex][5] = newStatus;
     
     // 更新UI
-    this.renderTable();
-    this.updateStats();
+    this.updateRow(rowIndex);
+    this.adjustStats(oldStatus, newStatus);
     
     // 发送Socket通知 - 只有在状态真正改变时发送
     if (AppState.socket && AppState.socket.connected && AppState.currentFilename && oldStatus !== newStatus) {
@@ -682,28 +939,35 @@ handleContextMenuAction(action) {
     Utils.showNotification(`✅ 已更新状态为: ${newStatus}`, 'success');
 }
 
+    // 整体重新统计（文档被替换后调用），单次遍历
     updateStats() {
+        const counts = {};
+        AppState.currentData.forEach(row => {
+            counts[row[5]] = (counts[row[5]] || 0) + 1;
+        });
+        AppState.statusCounts = counts;
+        this.displayStats();
+    }
+
+    // 单行状态变化时按增量更新统计
+    adjustStats(oldStatus, newStatus) {
+        if (oldStatus === newStatus) return;
+        const counts = AppState.statusCounts;
+        counts[oldStatus] = (counts[oldStatus] || 0) - 1;
+        counts[newStatus] = (counts[newStatus] || 0) + 1;
+        this.displayStats();
+    }
+
+    displayStats() {
         if (!DOM.totalItems || !DOM.completedItems || !DOM.inProgressItems || !DOM.notCompletedItems) {
             return;
         }
         
-        if (!AppState.currentData.length) {
-            DOM.totalItems.textContent = '0';
-            DOM.completedItems.textContent = '0';
-            DOM.inProgressItems.textContent = '0';
-            DOM.notCompletedItems.textContent = '0';
-            return;
-        }
-        
-        const total = AppState.currentData.length;
-        const completed = AppState.currentData.filter(row => row[5] === '已完成').length;
-        const inProgress = AppState.currentData.filter(row => row[5] === '进行中').length;
-        const notCompleted = AppState.currentData.filter(row => row[5] === '未完成').length;
-        
-        DOM.totalItems.textContent = total;
-        DOM.completedItems.textContent = completed;
-        DOM.inProgressItems.textContent = inProgress;
-        DOM.notCompletedItems.textContent = notCompleted;
+        const counts = AppState.statusCounts;
+        DOM.totalItems.textContent = AppState.currentData.length;
+        DOM.completedItems.textContent = counts['已完成'] || 0;
+        DOM.inProgressItems.textContent = counts['进行中'] || 0;
+        DOM.notCompletedItems.textContent = counts['未完成'] || 0;
     }
 
     async loadFileList() {
@@ -733,10 +997,10 @@ handleContextMenuAction(action) {
     const errors = [];
     
     // 检查文件类型
-    const allowedExtensions = ['.csv', '.sti'];
-    const fileExtension = file.name.toLowerCase().slice(-4);
+    const allowedExtensions = ['.csv', '.sti', '.litematic'];
+    const fileExtension = file.name.toLowerCase().slice(file.name.lastIndexOf('.'));
     if (!allowedExtensions.includes(fileExtension)) {
-        errors.push('只支持 CSV 和 STI 格式的文件');
+        errors.push('只支持 CSV、STI 和 Litematic 格式的文件');
     }
     
     // 检查文件大小 (10MB)
@@ -797,6 +1061,9 @@ handleContextMenuAction(action) {
                 <span>${Utils.formatFileSize(file.size)}</span>
                 <span>${Utils.formatDate(file.created_at)}</span>
             </div>
+            ${file.summary ? `<div style="margin-top: 8px; color: #64748b; font-size: 12px;">
+                完成 ${Math.round(file.summary.completed * 100)}% (${file.summary.status['已完成'] || 0}/${file.summary.rows} 项) · 剩余 ${file.summary.remaining.boxes} 盒 ${file.summary.remaining.groups} 组 ${file.summary.remaining.pieces} 个
+            </div>` : ''}
             ${file.description ? `<div style="margin-top: 8px; color: #64748b; font-size: 13px;">${file.description}</div>` : ''}
             ${showAll ? `<div style="margin-top: 8px; color: #94a3b8; font-size: 12px;">所有者: ${file.owner}</div>` : ''}
             <div class="file-actions">
@@ -837,6 +1104,7 @@ handleContextMenuAction(action) {
         // 成功打开文件
         AppState.currentFilename = filename;
         AppState.currentData = data.data || [];
+        if (DOM.tableWrapper) DOM.tableWrapper.scrollTop = 0;
         this.renderTable();
         this.updateStats();
         
@@ -997,37 +1265,90 @@ handleContextMenuAction(action) {
         });
         
         // 处理项目更新事件 - 修复重复更新问题
-        AppState.socket.on('item_updated', (data) => {
-            console.log('收到项目更新:', data);
-            if (data.filename === AppState.currentFilename) {
-                // 确保行索引有效
-                if (data.rowIndex >= 0 && data.rowIndex < AppState.currentData.length) {
-                    // 只有状态不同时才更新，避免循环更新
-                    if (AppState.currentData[data.rowIndex][5] !== data.status) {
-                        AppState.currentData[data.rowIndex][5] = data.status;
-                        this.renderTable();
-                        this.updateStats();
-                        
-                        // 显示通知，但不显示自己的操作
-                        if (data.username !== AppState.currentUser) {
-                            Utils.showNotification(`🔄 ${data.username} 更新了项目状态`, 'info');
-                        }
+        const applyItemUpdate = (data) => {
+            // 确保行索引有效
+            if (data.rowIndex >= 0 && data.rowIndex < AppState.currentData.length) {
+                // 只有状态不同时才更新，避免循环更新
+                const oldStatus = AppState.currentData[data.rowIndex][5];
+                if (oldStatus !== data.status) {
+                    AppState.currentData[data.rowIndex][5] = data.status;
+                    this.updateRow(data.rowIndex);
+                    this.adjustStats(oldStatus, data.status);
+                    
+                    // 显示通知，但不显示自己的操作
+                    if (data.username !== AppState.currentUser) {
+                        Utils.showNotification(`🔄 ${data.username} 更新了项目状态`, 'info');
                     }
                 }
             }
-        });
+        };
+        
+        // 服务器按条件批量更新的行
+        const applyBulkUpdate = (data) => {
+            const counts = AppState.statusCounts;
+            Utils.decodeSelection(data).forEach(index => {
+                if (index < AppState.currentData.length) {
+                    const oldStatus = AppState.currentData[index][5];
+                    counts[oldStatus] = (counts[oldStatus] || 0) - 1;
+                    counts[data.status] = (counts[data.status] || 0) + 1;
+                    AppState.currentData[index][5] = data.status;
+                }
+            });
+            this.renderTable();
+            this.displayStats();
+            
+            // 显示通知，但不显示自己的操作
+            if (data.username !== AppState.currentUser) {
+                Utils.showNotification(`🔄 ${data.username} 将 ${data.count} 项标记为${data.status}`, 'info');
+            }
+        };
+        
+        // 文档还在分页接收时，更新涉及的行可能尚未到达，先排队
+        const deferWhilePaging = (apply) => (data) => {
+            if (data.filename !== AppState.currentFilename) return;
+            if (AppState.pendingUpdates) {
+                AppState.pendingUpdates.push(() => apply(data));
+            } else {
+                apply(data);
+            }
+        };
+        
+        AppState.socket.on('item_updated', deferWhilePaging(applyItemUpdate));
+        AppState.socket.on('bulk_updated', deferWhilePaging(applyBulkUpdate));
         
         // 处理文件数据更新事件
         AppState.socket.on('file_data_updated', (data) => {
             console.log('收到文件数据更新:', data);
             if (data.filename === AppState.currentFilename) {
-                AppState.currentData = data.data || [];
+                AppState.pendingUpdates = null;
+                AppState.currentData = Utils.decodeDocument(data);
                 this.renderTable();
                 this.updateStats();
                 Utils.showNotification(`🔄 文件数据已同步更新`, 'info');
             }
         });
         
+        // 处理增量数据更新事件
+        // 分页接收期间同样排队，避免之后到达的页覆盖或截断补丁写入的行
+        AppState.socket.on('file_data_patch', deferWhilePaging((data) => {
+            console.log(`收到增量更新: ${data.rows.length} 行`);
+            AppState.currentData.length = Math.min(AppState.currentData.length, data.length);
+            data.rows.forEach(([index, row]) => {
+                AppState.currentData[index] = row;
+            });
+            this.renderTable();
+            this.updateStats();
+            Utils.showNotification(`🔄 文件数据已同步更新`, 'info');
+        }));
+        
+        // 连接积压时服务器丢弃了中间推送，需要重新获取完整文档
+        AppState.socket.on('resync_required', (data) => {
+            if (data.filename === AppState.currentFilename) {
+                console.log('服务器要求重新同步文件数据');
+                AppState.socket.emit('resync_file', { filename: data.filename });
+            }
+        });
+        
         AppState.socket.on('user_joined', (data) => {
             if (data.username !== AppState.currentUser) {
                 Utils.showNotification(`👥 ${data.username} 加入了文件编辑`, 'info');
@@ -1041,12 +1362,41 @@ handleContextMenuAction(action) {
         AppState.socket.on('file_data', (data) => {
             console.log('收到初始文件数据:', data);
             if (data.filename === AppState.currentFilename) {
-                AppState.currentData = data.data || [];
+                AppState.pendingUpdates = null;
+                AppState.currentData = Utils.decodeDocument(data);
                 this.renderTable();
                 this.updateStats();
             }
         });
         
+        // 大文档按页推送：第一页到达即渲染，其余页追加后合并渲染，处理完每页再确认；
+        // 接收期间的行更新排队，最后一页到达后再应用
+        AppState.socket.on('file_page', (data, ack) => {
+            if (data.filename === AppState.currentFilename) {
+                const rows = Utils.decodeDocument(data);
+                if (data.page === 0) {
+                    AppState.currentData = rows;
+                    AppState.pendingUpdates = data.pages > 1 ? [] : null;
+                } else {
+                    AppState.currentData.length = data.start;
+                    rows.forEach(row => AppState.currentData.push(row));
+                }
+                if (data.page === 0 || data.page === data.pages - 1) {
+                    this.renderTable();
+                    this.updateStats();
+                } else {
+                    this.scheduleRender();
+                }
+                if (data.page === data.pages - 1) {
+                    const pending = AppState.pendingUpdates || [];
+                    AppState.pendingUpdates = null;
+                    pending.forEach(apply => apply());
+                    console.log(`文件数据接收完成: ${data.total} 行, ${data.pages} 页, 随后应用 ${pending.length} 个更新`);
+                }
+            }
+            if (typeof ack === 'function') ack();
+        });
+        
     } catch (error) {
         console.error('Socket.IO 初始化失败:', error);
         if (DOM.connectionStatus) {
@@ -1055,49 +1405,57 @@ handleContextMenuAction(action) {
     }
 }
 
-// 加入文件编辑功能
-joinFileEditing(filename) {
-    if (AppState.socket && AppState.socket.connected && AppState.currentUser) {
-        console.log(`加入文件编辑: ${filename}, 用户: ${AppState.currentUser}`);
-        AppState.socket.emit('join_file', {
-            filename: filename,
-            username: AppState.currentUser
+    // 按条件批量更新状态，predicate 如 { name: '石头', status: '未完成', min_quantity: 64 }
+    bulkUpdate(predicate, status) {
+        return new Promise((resolve, reject) => {
+            if (!Utils.checkConnection() || !AppState.currentFilename) {
+                reject(new Error('Socket 未连接或未打开文件'));
+                return;
+            }
+            AppState.socket.emit('bulk_update', {
+                filename: AppState.currentFilename,
+                status: status,
+                predicate: predicate,
+                username: AppState.currentUser
+            }, (result) => {
+                if (result && result.error) {
+                    Utils.showNotification(`❌ 批量更新失败: ${result.error}`, 'error');
+                    reject(new Error(result.error));
+                } else {
+                    resolve(result);
+                }
+            });
+        });
+    }
+
+    // 同一帧内的多次更新只渲染一次
+    scheduleRender() {
+        if (this.renderPending) return;
+        this.renderPending = true;
+        requestAnimationFrame(() => {
+            this.renderPending = false;
+            this.renderTable();
+            this.updateStats();
         });
-        
-        // 发送文件数据到服务器进行同步
-        if (AppState.currentData.length > 0) {
-            setTimeout(() => {
-                AppState.socket.emit('file_loaded', {
-                    filename: filename,
-                    data: AppState.currentData
-                });
-                
-                // 同时发送同步请求
-                AppState.socket.emit('sync_file_data', {
-                    filename: filename,
-                    data: AppState.currentData
-                });
-            }, 500);
-        }
-    } else {
-        console.warn('无法加入文件编辑: Socket 未连接或用户未登录');
     }
-}
 
     joinFileEditing(filename) {
     if (AppState.socket && AppState.socket.connected && AppState.currentUser) {
         console.log(`加入文件编辑: ${filename}, 用户: ${AppState.currentUser}`);
         AppState.socket.emit('join_file', {
             filename: filename,
-            username: AppState.currentUser
+            username: AppState.currentUser,
+            paged: true
         });
         
-        // 发送文件数据到服务器
-        if (AppState.currentData.length > 0) {
+        // 发送文件数据到服务器，服务器只向其他用户广播变化的行
+        // （发送加入时本地已加载的数据，期间按页到达的房间数据可能还不完整）
+        const localData = AppState.currentData;
+        if (localData.length > 0) {
             setTimeout(() => {
-                AppState.socket.emit('file_loaded', {
+                AppState.socket.emit('sync_file_data', {
                     filename: filename,
-                    data: AppState.currentData
+                    data: localData
                 });
             }, 1000);
         }
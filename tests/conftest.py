@@ -0,0 +1,50 @@
+"""
+测试公共配置 - 应用使用临时的上传和用户目录，不触及仓库中的 uploads/ 和 users/
+"""
+import os
+import sys
+import json
+import tempfile
+
+import pytest
+
+# 必须在导入 app 之前设置，Config 在导入时读取环境变量
+_DATA_DIR = tempfile.mkdtemp(prefix='material-viewer-test-')
+os.environ.setdefault('UPLOAD_FOLDER', os.path.join(_DATA_DIR, 'uploads'))
+os.environ.setdefault('USERS_FOLDER', os.path.join(_DATA_DIR, 'users'))
+os.environ.setdefault('LOG_QUEUE', 'false')
+os.environ.setdefault('PRELOAD_DOCUMENTS', '0')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+
+os.makedirs(app_module.Config.UPLOAD_FOLDER, exist_ok=True)
+os.makedirs(app_module.Config.USERS_FOLDER, exist_ok=True)
+
+
+@pytest.fixture
+def client():
+    """已登录的测试客户端"""
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session['username'] = 'tester'
+        session['logged_in'] = True
+    return client
+
+
+@pytest.fixture
+def store_document():
+    """写入上传目录中的文档，测试结束后删除"""
+    created = []
+
+    def store(filename, rows):
+        path = os.path.join(app_module.Config.UPLOAD_FOLDER, filename)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, ensure_ascii=False)
+        created.append(path)
+        return path
+
+    yield store
+    for path in created:
+        if os.path.exists(path):
+            os.remove(path)
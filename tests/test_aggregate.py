@@ -0,0 +1,31 @@
+"""
+/aggregate 材料汇总
+"""
+import json
+
+
+def _read_lines(response):
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines() if line.strip()]
+    return lines[:-1], lines[-1]['summary']
+
+
+def test_summary_sums_per_item_breakdowns_with_mixed_stack_sizes(client, store_document):
+    # 石头堆叠 64，末影珍珠 16，水桶 1
+    store_document('mixed_stacks.csv', [
+        ['石头', '1000', 0, 0, 0, '未完成'],
+        ['末影珍珠', '100', 0, 0, 0, '未完成'],
+        ['水桶', '30', 0, 0, 0, '未完成'],
+    ])
+
+    response = client.get('/aggregate?files=mixed_stacks.csv')
+    assert response.status_code == 200
+    items, summary = _read_lines(response)
+
+    by_name = {item['name']: item for item in items}
+    assert (by_name['石头']['boxes'], by_name['石头']['groups'], by_name['石头']['pieces']) == (0, 15, 40)
+    assert (by_name['末影珍珠']['boxes'], by_name['末影珍珠']['groups'], by_name['末影珍珠']['pieces']) == (0, 6, 4)
+    assert (by_name['水桶']['boxes'], by_name['水桶']['groups'], by_name['水桶']['pieces']) == (1, 3, 0)
+
+    for field in ('quantity', 'boxes', 'groups', 'pieces'):
+        assert summary[field] == sum(item[field] for item in items)
+    assert (summary['quantity'], summary['boxes'], summary['groups'], summary['pieces']) == (1130, 1, 24, 44)
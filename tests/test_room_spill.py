@@ -0,0 +1,71 @@
+"""
+房间转存 - 转存前只写回确有修改的房间
+"""
+import io
+import os
+import json
+
+import pytest
+
+import app as app_module
+
+
+def _upload(client, filename, rows):
+    body = io.BytesIO(json.dumps(rows, ensure_ascii=False).encode('utf-8'))
+    response = client.post('/upload', data={'file': (body, filename)}, content_type='multipart/form-data')
+    assert response.status_code == 200, response.get_json()
+    return os.path.join(app_module.Config.UPLOAD_FOLDER, filename), response.get_json()['data']
+
+
+def _stored_state(filename, filepath):
+    with open(filepath, 'rb') as f:
+        content = f.read()
+    return (content, app_module.blob_store.content_hash(filename, filepath),
+            len(app_module.version_history.list_versions(filename)))
+
+
+@pytest.fixture
+def spill_now():
+    """立即转存所有无成员的房间"""
+    rooms = app_module.active_files
+    idle_ttl = rooms.idle_ttl
+
+    def spill():
+        rooms.idle_ttl = 0
+        return rooms.sweep()
+
+    yield spill
+    rooms.idle_ttl = idle_ttl
+
+
+@pytest.mark.parametrize('filename', ['spill_unedited.sti', 'spill_unedited.csv'])
+def test_spilling_unedited_room_leaves_document_untouched(client, spill_now, filename):
+    filepath, rows = _upload(client, filename, [['石头', 64, 0, 1, 0, '未完成'], ['玻璃', 10, 0, 0, 10, '已完成']])
+    before = _stored_state(filename, filepath)
+    assert before[1] is not None
+
+    # 客户端打开文件时以 sync_file_data 填充房间（没有 file_loaded，房间没有 saved_version）
+    socket = app_module.socketio.test_client(app_module.app)
+    socket.emit('sync_file_data', {'filename': filename, 'data': rows})
+    socket.disconnect()
+    assert 'saved_version' not in app_module.active_files[filename]
+
+    assert filename in spill_now()
+    assert _stored_state(filename, filepath) == before
+
+
+def test_spilling_edited_room_writes_document_back(client, spill_now):
+    filename = 'spill_edited.sti'
+    filepath, rows = _upload(client, filename, [['石头', 64, 0, 1, 0, '未完成']])
+    before = _stored_state(filename, filepath)
+
+    socket = app_module.socketio.test_client(app_module.app)
+    socket.emit('sync_file_data', {'filename': filename, 'data': rows})
+    socket.emit('sync_file_data', {'filename': filename, 'data': [['石头', 64, 0, 1, 0, '已完成']]})
+    socket.disconnect()
+
+    assert filename in spill_now()
+    content, _, versions = _stored_state(filename, filepath)
+    assert content != before[0]
+    assert versions == before[2] + 1
+    assert app_module.FileUtils.load_file_data(filepath) == [['石头', 64, 0, 1, 0, '已完成']]
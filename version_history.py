@@ -0,0 +1,184 @@
+"""
+版本历史模块 - 以行级增量链保存材料清单的历史版本
+"""
+import os
+import json
+import fcntl
+import shutil
+import logging
+from datetime import datetime
+from contextlib import contextmanager
+from typing import Dict, List, Any, Optional
+from room_sync import RoomSync
+
+logger = logging.getLogger(__name__)
+
+
+class VersionHistory:
+    """
+    按文件保存的版本链
+
+    每个文件一个目录：
+    - head.json: 最新版本号、最近的关键帧版本号与逐行哈希（用于计算下一次增量）
+    - versions.jsonl: 每个版本一行的元数据
+    - <版本号>.json: 关键帧保存完整数据行，增量只保存变更行和新的总行数
+
+    距上一个关键帧满 keyframe_interval 个版本（或变更行超过一半）时写入关键帧，
+    因此还原任意版本最多读取 keyframe_interval 个版本文件。
+    """
+
+    def __init__(self, root: str, keyframe_interval: int = 20):
+        self.root = root
+        self.keyframe_interval = max(1, keyframe_interval)
+
+    def _dir(self, filename: str) -> str:
+        return os.path.join(self.root, filename)
+
+    def _version_path(self, filename: str, version: int) -> str:
+        return os.path.join(self._dir(filename), f'{version}.json')
+
+    @contextmanager
+    def _locked(self, filename: str, write: bool = False):
+        """在文件锁保护下访问某个文件的版本目录，多个工作进程共享"""
+        directory = self._dir(filename)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX if write else fcntl.LOCK_SH)
+            try:
+                yield directory
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _read_json(path: str) -> Any:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    @staticmethod
+    def _write_json(path: str, value: Any) -> None:
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(value, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    def record(self, filename: str, rows: List[List[Any]], username: Optional[str] = None) -> int:
+        """
+        记录一次保存
+
+        Args:
+            filename: 存储文件名
+            rows: 保存后的完整数据行
+            username: 保存者
+
+        Returns:
+            保存后的版本号（内容没有变化时返回当前版本号，不产生新版本）
+        """
+        with self._locked(filename, write=True) as directory:
+            head_path = os.path.join(directory, 'head.json')
+            try:
+                head = self._read_json(head_path)
+            except (FileNotFoundError, json.JSONDecodeError):
+                head = {'version': 0, 'keyframe': 0, 'hashes': []}
+
+            changed, new_hashes = RoomSync.diff_rows(head['hashes'], rows)
+            if head['version'] and not changed and len(rows) == len(head['hashes']):
+                return head['version']
+
+            version = head['version'] + 1
+            keyframe = (
+                not head['version']
+                or version - head['keyframe'] >= self.keyframe_interval
+                or len(changed) * 2 >= len(rows)
+            )
+            if keyframe:
+                self._write_json(self._version_path(filename, version), {'type': 'keyframe', 'rows': rows})
+                head['keyframe'] = version
+            else:
+                self._write_json(self._version_path(filename, version), {
+                    'type': 'delta',
+                    'length': len(rows),
+                    'rows': changed
+                })
+
+            entry = {
+                'version': version,
+                'type': 'keyframe' if keyframe else 'delta',
+                'changed': len(rows) if keyframe else len(changed),
+                'length': len(rows),
+                'user': username,
+                'saved_at': datetime.now().isoformat()
+            }
+            with open(os.path.join(directory, 'versions.jsonl'), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+            head.update(version=version, hashes=new_hashes)
+            self._write_json(head_path, head)
+
+        logger.info("文件 %s 保存为版本 %d（%s, %d 行变更）", filename, version, entry['type'], entry['changed'])
+        return version
+
+    def list_versions(self, filename: str) -> List[Dict[str, Any]]:
+        """列出所有版本的元数据（最新的在前）"""
+        if not os.path.isdir(self._dir(filename)):
+            return []
+        with self._locked(filename) as directory:
+            try:
+                with open(os.path.join(directory, 'versions.jsonl'), 'r', encoding='utf-8') as f:
+                    entries = [json.loads(line) for line in f if line.strip()]
+            except FileNotFoundError:
+                return []
+        entries.reverse()
+        return entries
+
+    def load_version(self, filename: str, version: int) -> Optional[List[List[Any]]]:
+        """
+        还原指定版本的数据行
+
+        从该版本向前找到最近的关键帧，再依次应用之后的增量。
+
+        Returns:
+            数据行，版本不存在时返回 None
+        """
+        if not os.path.isdir(self._dir(filename)):
+            return None
+        with self._locked(filename):
+            chain = []
+            current = version
+            while current > 0:
+                try:
+                    entry = self._read_json(self._version_path(filename, current))
+                except FileNotFoundError:
+                    return None
+                chain.append(entry)
+                if entry['type'] == 'keyframe':
+                    break
+                current -= 1
+            else:
+                return None
+
+        rows = chain.pop()['rows']
+        for delta in reversed(chain):
+            rows = rows[:delta['length']]
+            for index, row in delta['rows']:
+                if index < len(rows):
+                    rows[index] = row
+                else:
+                    rows.append(row)
+        return rows
+
+    def remove(self, filename: str) -> None:
+        """删除文件的全部历史"""
+        shutil.rmtree(self._dir(filename), ignore_errors=True)
+
+    def stats(self, filename: str) -> Dict[str, Any]:
+        """某个文件的历史存储统计"""
+        directory = self._dir(filename)
+        if not os.path.isdir(directory):
+            return {'versions': 0, 'bytes': 0}
+        size = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+        versions = self.list_versions(filename)
+        return {
+            'versions': len(versions),
+            'keyframes': sum(1 for v in versions if v['type'] == 'keyframe'),
+            'bytes': size
+        }